@@ -0,0 +1,98 @@
+# Concurrency benchmark for /def/<term>
+# /def/<term> waits for Twitter (including a 1 second rate limit sleep) and DWDS, so with sync
+# workers one dyno can only answer about one such request per worker and second.
+# This benchmark sends /def/<term> requests at increasing concurrency to the app running with each
+# gunicorn worker class and reports the highest concurrency that is still sustained, i.e. every
+# request succeeds and p95 latency stays below a limit.
+# Run from the repository root: python benchmarks/concurrency.py --worker-classes sync gevent
+
+import argparse
+import json
+import os
+from datetime import datetime
+
+import stubs
+from load import RESULTS_DIR, ROOT, git_commit, run_route, sample_paths, start_app, summarize
+
+
+def measure(worker_class, paths, servers, env, args):
+    """Runs all concurrency levels against one worker class.
+
+    Args:
+        worker_class (str): Gunicorn worker class, e.g. "sync" or "gevent".
+        paths (list(str)): /def/<term> paths to request.
+        servers, env: Stand-ins from stubs.start_all().
+        args (argparse.Namespace): Command line arguments.
+
+    Returns:
+        dict: Results per concurrency level and the highest sustained concurrency.
+    """
+
+    print(f"Starting app with {args.workers} {worker_class} worker(s)...")
+    github = servers["github"].RequestHandlerClass
+    github.reads.clear()
+    app = start_app(env, args.port, args.workers, worker_class,
+                    booted=lambda: github.reads["tweeted_terms.txt"])
+    result = {"levels": {}, "sustained": 0}
+    try:
+        for concurrency in args.concurrency:
+            requests = max(args.min_requests, concurrency * args.requests_per_client)
+            r = summarize(*run_route(args.port, paths, requests, concurrency))
+            result["levels"][concurrency] = r
+            ok = not r["errors"] and r["p95_ms"] is not None and r["p95_ms"] <= args.max_p95
+            print(f"  concurrency {concurrency:>4}: p50 {r['p50_ms']:8.0f} ms, "
+                  f"p95 {r['p95_ms']:8.0f} ms, {r['rps']:6.1f} req/s, {r['errors']} errors"
+                  + ("" if ok else "  (not sustained)"))
+            if not ok:
+                break
+            result["sustained"] = concurrency
+    finally:
+        app.terminate()
+        app.wait()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent /def/<term> requests per worker class")
+    parser.add_argument("--worker-classes", nargs="+", default=["sync", "gevent"],
+                        help="gunicorn worker classes to compare")
+    parser.add_argument("--concurrency", type=int, nargs="+",
+                        default=[1, 2, 4, 8, 16, 32, 64, 128],
+                        help="concurrency levels, stops at the first one that is not sustained")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="gunicorn workers (Heroku's default for one standard dyno is 2)")
+    parser.add_argument("--requests-per-client", type=int, default=3,
+                        help="requests per concurrent client and level")
+    parser.add_argument("--min-requests", type=int, default=10, help="minimum requests per level")
+    parser.add_argument("--max-p95", type=float, default=5000,
+                        help="p95 latency limit in ms for a level to count as sustained")
+    parser.add_argument("--port", type=int, default=8125, help="port for the app")
+    parser.add_argument("--latency", type=float, default=100, help="upstream latency in ms")
+    parser.add_argument("--jitter", type=float, default=50, help="max. extra upstream latency in ms")
+    parser.add_argument("--glossary", default=os.path.join(ROOT, "klimadiskurs", "static", "data",
+                                                           "glossary.json"))
+    args = parser.parse_args()
+
+    paths = sample_paths(args.glossary)["/def/<term>"]
+    servers, env = stubs.start_all(args.latency/1000, args.jitter/1000)
+    results = {"commit": git_commit(), "date": datetime.now().isoformat(timespec="seconds"),
+               "settings": vars(args), "worker_classes": {}}
+    for worker_class in args.worker_classes:
+        results["worker_classes"][worker_class] = measure(worker_class, paths, servers, env, args)
+
+    print(f"\nSustained concurrent /def/<term> requests with {args.workers} workers "
+          f"(no errors, p95 <= {args.max_p95:.0f} ms):")
+    for worker_class, r in results["worker_classes"].items():
+        best = r["levels"].get(r["sustained"])
+        rps = f", {best['rps']:.1f} req/s" if best else ""
+        print(f"  {worker_class:<10}{r['sustained']:>5}{rps}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = os.path.join(RESULTS_DIR, f"concurrency-{results['commit']}.json")
+    with open(output, mode="w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved results to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# Synthetic data generator for scale benchmarks
+# Generates a glossary.json that follows tools/glossary.schema.json, a matching word list and
+# master text files for the pro and contra groups (same format as create_master_text_file.py)
+# Compounds are built from the heads of the real glossary ("Klima" + head, "Klima" + head + head),
+# their frequency in the corpus follows a Zipf distribution like real word frequencies do.
+# Example: python generate.py --scale 10 --out /tmp/glossary_x10
+
+import argparse
+import json
+import os
+import random
+import sys
+from itertools import product
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# normalization.py doesn't import the app, so it can be loaded on its own
+sys.path.insert(0, os.path.join(ROOT, "klimadiskurs"))
+from normalization import BINNEN_I, GENDER_MARKER, PREFIX, SEPARATORS
+
+GLOSSARY_PATH = os.path.join(ROOT, "klimadiskurs", "static", "data", "glossary.json")
+
+# the shipped glossary has 248 entries, scale factors are relative to that
+BASE_SIZE = 248
+
+# share of entries that were filled in manually in the shipped glossary
+DEFINITION_RATE = 19/248
+RELATED_RATE = 13/248
+# association distribution in the shipped glossary: contra only, both, pro only
+ASSOCIATIONS = (([0], 200), ([0, 1], 35), ([1], 13))
+
+FILLERS = ["Die", "Debatte", "um", "den", "die", "das", "zeigt", "wieder", "einmal", "dass",
+           "wir", "nicht", "mehr", "über", "sprechen", "sollten", "Politik", "Medien", "sagen",
+           "heute", "immer", "noch", "viele", "Menschen", "glauben", "an", "eine", "neue", "Studie",
+           "belegt", "angebliche", "echte", "Regierung", "Wissenschaft", "Zukunft", "Kinder",
+           "Sommer", "Winter", "Energie", "Strom", "Preise", "Deutschland", "Welt", "jetzt"]
+
+
+def read_heads(glossary_path=GLOSSARY_PATH):
+    """Reads the second parts of all compounds in the real glossary, e.g. "leugner".
+    Hyphens, spaces and gender markers are removed like in normalize() (normalization.py), so
+    "Klima-Alarmist*innen" has the head "alarmist". Umlauts are kept.
+
+    Args:
+        glossary_path (str, optional): Path to the shipped glossary.json.
+
+    Returns:
+        list(str): Compound heads in lower case.
+    """
+
+    heads = set()
+    with open(glossary_path, encoding="utf-8", errors="replace") as f:
+        for term in json.load(f):
+            word = SEPARATORS.sub("", GENDER_MARKER.sub("", BINNEN_I.sub("", term).lower()))
+            if word.startswith(PREFIX) and len(word) > len(PREFIX) + 1:
+                heads.add(word[len(PREFIX):])
+    return sorted(heads)
+
+
+def make_terms(n, heads, rng):
+    """Builds n distinct compounds. Two-part compounds first, then three-part compounds,
+    then random four-part compounds.
+
+    Args:
+        n (int): Number of terms.
+        heads (list(str)): Compound heads from read_heads().
+        rng (random.Random): Random number generator.
+
+    Returns:
+        list(str): Terms, e.g. ["Klimaleugner", "Klimaschutzleugner", ...]
+    """
+
+    terms = ["Klima" + h for h in heads]
+    rng.shuffle(terms)
+    if n > len(terms):
+        longer = ["Klima" + a + b for a, b in product(heads, heads) if a != b]
+        rng.shuffle(longer)
+        terms += longer
+    if n > len(terms):
+        # there are too many four-part compounds to list them all, so draw them at random
+        seen = set(terms)
+        if len(heads) < 3:
+            raise ValueError(f"Can generate at most {len(terms)} terms")
+        while len(terms) < n:
+            term = "Klima" + "".join(rng.sample(heads, 3))
+            if term not in seen:
+                seen.add(term)
+                terms.append(term)
+    return terms[:n]
+
+
+def make_sentence(term, rng, hyphenated=False):
+    """Generates a sentence of 6-20 words that contains term once."""
+
+    words = rng.choices(FILLERS, k=rng.randint(5, 19))
+    if hyphenated:
+        term = "Klima-" + term[5:].capitalize()
+    words.insert(rng.randrange(len(words) + 1), term)
+    return " ".join(words) + rng.choice([".", "!", "?"])
+
+
+def generate(scale, out_dir, sentences_per_term=20, seed=1):
+    """Generates glossary.json, wordlist.txt, texts_pro.txt and texts_contra.txt in out_dir.
+
+    Args:
+        scale (float): Size relative to the shipped glossary (248 entries).
+        out_dir (str): Output directory, created if necessary.
+        sentences_per_term (int, optional): Average number of corpus sentences per term.
+            The actual number per term follows a Zipf distribution. Defaults to 20.
+        seed (int, optional): Random seed, the same seed generates the same data. Defaults to 1.
+
+    Returns:
+        dict(str, str): Paths to the generated files.
+    """
+
+    rng = random.Random(seed)
+    n = max(1, round(BASE_SIZE * scale))
+    terms = make_terms(n, read_heads(), rng)
+    associations = [a for a, count in ASSOCIATIONS for _ in range(count)]
+
+    # corpus: each term appears in a number of sentences proportional to 1/rank (Zipf)
+    # that is distributed over the groups the term is associated with
+    total_sentences = n * sentences_per_term
+    harmonic = sum(1/rank for rank in range(1, n+1))
+    texts = ([], [])    # contra, pro
+    glossary = dict()
+    for rank, term in enumerate(terms, start=1):
+        association = rng.choice(associations)
+        count = max(1, round(total_sentences / (rank * harmonic)))
+        examples = ([], [])
+        for i in range(count):
+            group = rng.choice(association)
+            # about a quarter of all occurrences is spelled with a hyphen
+            sentence = make_sentence(term, rng, hyphenated=rng.random() < 0.25)
+            texts[group].append(sentence)
+            if len(examples[group]) < 2 and sentence not in examples[group]:
+                examples[group].append(sentence)
+
+        entry = {"term": term, "id": rank, "definition": "", "sources": [], "related": [],
+                 "spellings": [term, "Klima-" + term[5:].capitalize()],
+                 "examples": list(dict.fromkeys(examples[0] + examples[1])),
+                 "association": [g for g in (0, 1) if examples[g]]}
+        if rng.random() < DEFINITION_RATE:
+            entry["definition"] = " ".join(rng.choices(FILLERS, k=rng.randint(20, 80))) \
+                                  + f" {term}."
+            entry["sources"] = [f"https://example.org/{term.lower()}/{i}"
+                                for i in range(rng.randint(1, 3))]
+        if rng.random() < RELATED_RATE:
+            entry["related"] = sorted(set(rng.sample(terms, min(3, n))) - {term})
+        glossary[term] = entry
+
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {name: os.path.join(out_dir, name) for name in
+             ("glossary.json", "wordlist.txt", "texts_contra.txt", "texts_pro.txt")}
+    with open(paths["glossary.json"], mode="w", encoding="utf-8") as f:
+        f.write(json.dumps(glossary, indent=2, ensure_ascii=False))
+    with open(paths["wordlist.txt"], mode="w", encoding="utf-8") as f:
+        f.write("\n".join(sorted(terms)) + "\n")
+    # master text files have the same format as the ones from create_master_text_file.py
+    # 50 sentences per "file", shuffled so a term's sentences are spread over the corpus
+    for group, name in enumerate(("texts_contra.txt", "texts_pro.txt")):
+        sentences = texts[group]
+        rng.shuffle(sentences)
+        with open(paths[name], mode="w", encoding="utf-8") as f:
+            for c, i in enumerate(range(0, len(sentences), 50), start=1):
+                f.write(f"*** FILE {c} *** synthetic/{c}.txt \n")
+                f.write(" ".join(sentences[i:i+50]) + "\n\n")
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic glossary and corpus")
+    parser.add_argument("--scale", type=float, default=10,
+                        help="size relative to the shipped glossary (248 entries)")
+    parser.add_argument("--sentences-per-term", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", required=True, help="output directory")
+    args = parser.parse_args()
+
+    for name, path in generate(args.scale, args.out, args.sentences_per_term, args.seed).items():
+        print(f"Wrote {path}")
@@ -0,0 +1,267 @@
+# End-to-end HTTP load benchmark
+# Starts local stand-ins for Twitter, GitHub and DWDS (see stubs.py), then starts the app from
+# run.py with gunicorn (like the Procfile) and points it at the stand-ins.
+# Each route is requested at a fixed concurrency and p50/p95/p99 latency and requests/s are reported.
+# Results are saved to benchmarks/results/<commit>.json so they can be compared between commits.
+# Run from the repository root: python benchmarks/load.py --compare benchmarks/results/abc1234.json
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.client import HTTPConnection
+from itertools import cycle
+from time import perf_counter, sleep
+from urllib.parse import quote, urlsplit
+
+import stubs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# route name -> URL template, {q} is replaced by a search query, {term} by a glossary term
+ROUTES = {
+    "/": "/",
+    "/api": "/api?query={q}",
+    "/search/<query>": "/search/{q}",
+    "/def/<term>": "/def/{term}",
+    "/about": "/about",
+    "/download/json": "/download/json",
+}
+
+
+def start_app(env, port, workers, worker_class="sync", timeout=30, booted=None):
+    """Starts the app from run.py with gunicorn and waits until it answers requests.
+
+    Args:
+        env (dict): Additional environment variables, e.g. stand-in URLs from stubs.start_all().
+        port (int): Port to bind to.
+        workers (int): Number of gunicorn workers.
+        worker_class (str, optional): Gunicorn worker class. Defaults to "sync".
+        timeout (int, optional): Seconds to wait for the app to boot. Defaults to 30.
+        booted (callable, optional): Returns the number of workers that have finished booting.
+            If given, waits for all workers, otherwise only until the first one answers.
+
+    Returns:
+        subprocess.Popen: The gunicorn process.
+    """
+
+    # tweets are not cached, so every /def/<term> request waits for the Twitter stand-in
+    app_env = dict(os.environ, APP_SECRET_KEY="benchmark", ENABLE_SUBMISSIONS="0",
+                   DEBUG_MODE="0", TWEETS_CACHE_SECONDS="0", **env)
+    cmd = [sys.executable, "-m", "gunicorn", "run:app", "--bind", f"127.0.0.1:{port}",
+           "--workers", str(workers), "--worker-class", worker_class, "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=app_env)
+
+    t0 = perf_counter()
+    while perf_counter() - t0 < timeout:
+        if proc.poll() is not None:
+            raise RuntimeError("The app exited during startup, see output above")
+        try:
+            conn = HTTPConnection("127.0.0.1", port, timeout=timeout)
+            conn.request("GET", "/download")
+            conn.getresponse().read()
+            if booted is None or booted() >= workers:
+                return proc
+        except OSError:
+            pass
+        sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"The app did not answer within {timeout} seconds")
+
+
+def run_route(port, paths, requests_per_route, concurrency):
+    """Requests paths round-robin at a fixed concurrency.
+
+    Args:
+        port (int): Port of the app.
+        paths (list(str)): Concrete URL paths for one route.
+        requests_per_route (int): Total number of requests.
+        concurrency (int): Number of concurrent clients, each with a keep-alive connection.
+
+    Returns:
+        list(float): Latency of each successful request in seconds.
+        int: Number of failed requests (connection errors and status codes >= 500).
+        float: Wall time for all requests in seconds.
+    """
+
+    paths = cycle(paths)
+    lock = threading.Lock()
+    latencies, errors = [], 0
+    remaining = [requests_per_route]
+
+    def client():
+        nonlocal errors
+        conn = HTTPConnection("127.0.0.1", port, timeout=120)
+        while True:
+            with lock:
+                if not remaining[0]:
+                    break
+                remaining[0] -= 1
+                path = next(paths)
+            t0 = perf_counter()
+            try:
+                # follow redirects like a browser, e.g. /def/<term> -> /def/<term>/
+                for _ in range(3):
+                    conn.request("GET", path)
+                    response = conn.getresponse()
+                    response.read()
+                    if response.status not in (301, 302, 307, 308):
+                        break
+                    path = urlsplit(response.getheader("Location")).path
+                failed = response.status >= 500
+            except OSError:
+                conn.close()
+                conn = HTTPConnection("127.0.0.1", port, timeout=120)
+                failed = True
+            elapsed = perf_counter() - t0
+            with lock:
+                if failed:
+                    errors += 1
+                else:
+                    latencies.append(elapsed)
+        conn.close()
+
+    t0 = perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(client)
+    return latencies, errors, perf_counter() - t0
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a list of numbers, None for an empty list."""
+
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))]
+
+
+def summarize(latencies, errors, wall):
+    """Turns the raw measurements of one route into a result dict with times in milliseconds."""
+
+    ms = [t * 1000 for t in latencies]
+    return {"requests": len(latencies) + errors, "errors": errors,
+            "p50_ms": percentile(ms, 50), "p95_ms": percentile(ms, 95),
+            "p99_ms": percentile(ms, 99),
+            "rps": round((len(latencies) + errors) / wall, 2) if wall else None}
+
+
+def sample_paths(glossary_path, n=20):
+    """Picks search queries and terms from the glossary so requests aren't all identical.
+
+    Args:
+        glossary_path (str): Path to glossary.json.
+        n (int, optional): Number of different terms per route. Defaults to 20.
+
+    Returns:
+        dict(str, list(str)): URL paths per route name.
+    """
+
+    with open(glossary_path, encoding="utf-8") as f:
+        terms = sorted(json.load(f))
+    step = max(1, len(terms) // n)
+    terms = terms[::step][:n]
+    # searches use the first letters after "klima", like the alphabet buttons in search.js
+    queries = sorted({t[:6].lower() for t in terms})
+    return {name: [template.format(q=quote(q), term=quote(t))
+                   for q, t in zip(cycle(queries), terms)]
+            for name, template in ROUTES.items()}
+
+
+def git_commit():
+    """Short hash of the checked out commit, "unknown" outside of a git repository."""
+
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results, baseline=None):
+    """Prints a result table. If a baseline is given, p50 and requests/s are compared to it."""
+
+    header = f"{'route':<18}{'req':>6}{'err':>5}" \
+             f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}"
+    if baseline:
+        header += f"{'Δp50':>9}{'Δreq/s':>9}"
+    print(header)
+    fmt = lambda v: f"{v:9.1f}" if v is not None else f"{'-':>9}"
+    for route, r in results["routes"].items():
+        line = f"{route:<18}{r['requests']:>6}{r['errors']:>5}" \
+               + fmt(r["p50_ms"]) + fmt(r["p95_ms"]) + fmt(r["p99_ms"]) + fmt(r["rps"])
+        old = (baseline or {}).get("routes", {}).get(route)
+        if old:
+            for key in ("p50_ms", "rps"):
+                if r[key] and old[key]:
+                    line += f"{(r[key] - old[key]) / old[key]:+9.0%}"
+                else:
+                    line += f"{'-':>9}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP load benchmark with local upstreams")
+    parser.add_argument("--routes", nargs="+", choices=ROUTES, default=list(ROUTES),
+                        help="routes to benchmark (default: all)")
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--worker-class", default="sync", help="gunicorn worker class")
+    parser.add_argument("--port", type=int, default=8123, help="port for the app")
+    parser.add_argument("--latency", type=float, default=50, help="upstream latency in ms")
+    parser.add_argument("--jitter", type=float, default=20, help="max. extra upstream latency in ms")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of upstream errors")
+    parser.add_argument("--glossary", default=os.path.join(ROOT, "klimadiskurs", "static", "data",
+                                                           "glossary.json"))
+    parser.add_argument("--output", help="result file (default: results/<commit>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    paths = sample_paths(args.glossary)
+    # every third sampled term counts as tweeted so /def and the glossary views get both cases
+    tweeted = [p.split("/")[-1] for p in paths["/def/<term>"][::3]]
+    servers, env = stubs.start_all(args.latency/1000, args.jitter/1000, 0, tweeted)
+
+    print(f"Starting app with {args.workers} {args.worker_class} worker(s)...")
+    github = servers["github"].RequestHandlerClass
+    app = start_app(env, args.port, args.workers, args.worker_class,
+                    booted=lambda: github.reads["tweeted_terms.txt"])
+    # the app reads tweeted_terms.txt from GitHub at startup, so only fail requests after that
+    for server in servers.values():
+        server.RequestHandlerClass.error_rate = args.error_rate
+    results = {"commit": git_commit(), "date": datetime.now().isoformat(timespec="seconds"),
+               "settings": {k: v for k, v in vars(args).items()
+                            if k not in ("output", "compare", "routes")},
+               "routes": {}}
+    try:
+        for route in args.routes:
+            print(f"Benchmarking {route}...")
+            results["routes"][route] = summarize(*run_route(args.port, paths[route],
+                                                            args.requests, args.concurrency))
+    finally:
+        app.terminate()
+        app.wait()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, mode="w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Compared to commit {baseline['commit']} ({baseline['date']}):")
+    print_results(results, baseline)
+    print(f"Saved results to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+# Scale benchmark
+# Runs the app-side and tool-side hot paths against synthetic glossaries and corpora of increasing
+# size (see generate.py) and plots how their run time grows with the glossary size.
+# Each size is measured in a fresh Python process because the glossary is loaded at import time.
+# Run from the repository root: python benchmarks/scale.py --scales 1 10 100
+# With --snapshot, the app memory-maps a glossary snapshot (tools/create_snapshot.py) instead.
+# Plotting needs matplotlib (pip install matplotlib), otherwise only a table is printed.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from statistics import median
+from time import perf_counter
+
+import generate
+from load import RESULTS_DIR, ROOT, git_commit
+
+# app-side queries: alphabet button, typical user input, no results
+QUERIES = ["klimaa", "leugner", "xyz"]
+# full-text queries: one word, several frequent words, no results
+FULLTEXT_QUERIES = ["Debatte", "Energie Strom Preise Deutschland", "xyz"]
+# tool-side: number of terms to find example sentences for (per-term time is reported)
+EXAMPLE_TERMS = 20
+
+
+def timeit(fn, repeat):
+    """Median run time of fn() over repeat runs in milliseconds."""
+
+    times = []
+    for _ in range(repeat):
+        t0 = perf_counter()
+        fn()
+        times.append(perf_counter() - t0)
+    return median(times) * 1000
+
+
+def rss_mb():
+    """Current resident set size of this process in MB (Linux only, 0 elsewhere)."""
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return 0
+
+
+def measure(data_dir, repeat, snapshot=False):
+    """Measures the hot paths for one glossary size. Runs in its own process, see main().
+
+    Args:
+        data_dir (str): Directory with files from generate.generate().
+        repeat (int): Number of repetitions per measurement.
+        snapshot (bool, optional): Whether to use glossary.snapshot in data_dir. Defaults to False.
+
+    Returns:
+        dict(str, float): Run times in ms, RSS in MB.
+    """
+
+    import stubs
+    _, env = stubs.start_all()
+    os.environ.update(env, GLOSSARY_PATH=os.path.join(data_dir, "glossary.json"),
+                      APP_SECRET_KEY="benchmark", ENABLE_SUBMISSIONS="0", DEBUG_MODE="0")
+    if snapshot:
+        os.environ["GLOSSARY_SNAPSHOT"] = os.path.join(data_dir, "glossary.snapshot")
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+    # import the app's dependencies first so only the glossary loading is measured
+    import dotenv, flask, flask_wtf, github, tweepy
+    results = dict()
+    rss_before = rss_mb()
+    t0 = perf_counter()
+    from klimadiskurs import create_app, db
+    results["load glossary"] = (perf_counter() - t0) * 1000
+    results["glossary RSS (MB)"] = rss_mb() - rss_before
+
+    # the app validates glossary.json while loading it (VALIDATE_GLOSSARY), this is the share
+    # of the validation (not measured with --snapshot, snapshots are validated when built)
+    if not snapshot:
+        from klimadiskurs.glossary import load_glossary
+        path = os.environ["GLOSSARY_PATH"]
+        results["schema validation"] = max(0, timeit(lambda: load_glossary(path, True), repeat)
+                                           - timeit(lambda: load_glossary(path), repeat))
+
+    app = create_app()
+    from flask import render_template
+    from klimadiskurs.app.utils import query_db
+    client = app.test_client()
+
+    results["query_db"] = median(timeit(lambda: query_db(q), repeat) for q in QUERIES)
+    from klimadiskurs.app.fulltext import FulltextIndex
+    t0 = perf_counter()
+    index = FulltextIndex(db)
+    results["build fulltext index"] = (perf_counter() - t0) * 1000
+    results["fulltext search"] = median(timeit(lambda: index.search(q), repeat)
+                                        for q in FULLTEXT_QUERIES)
+    for name, path in (("GET /", "/"), ("GET /search/<query>", f"/search/{QUERIES[0]}"),
+                       ("GET /api", f"/api?query={QUERIES[0]}"), ("GET /about", "/about")):
+        results[name] = timeit(lambda: client.get(path, follow_redirects=True), repeat)
+
+    # /def/<term> without the upstream calls and the 1 second sleep, same steps as define()
+    term = next((t for t in db if db[t]["definition"]), next(iter(db)))
+    def render_definition():
+        render_template("definitions.html", term=term, entry=db[term], dwds=None,
+                        defined=db.defined, tweets=[])
+    with app.test_request_context(f"/def/{term}"):
+        results["render definitions.html"] = timeit(render_definition, repeat)
+
+    # tool-side: the private helpers of create_json.py are module-level, so getattr works
+    import create_json
+    tokenize = getattr(create_json, "__tokenize_file")
+    get_examples = getattr(create_json, "__get_examples")
+    t0 = perf_counter()
+    groups_texts = [tokenize(os.path.join(data_dir, fn))
+                    for fn in ("texts_contra.txt", "texts_pro.txt")]
+    results["tokenize corpus"] = (perf_counter() - t0) * 1000
+    terms = list(db)[::max(1, len(db) // EXAMPLE_TERMS)][:EXAMPLE_TERMS]
+    t0 = perf_counter()
+    for t in terms:
+        get_examples(t, groups_texts, [t, "Klima-" + t[5:].capitalize()])
+    results["get_examples per term"] = (perf_counter() - t0) * 1000 / len(terms)
+    return results
+
+
+def plot(results, path):
+    """Plots run time over glossary size for each measurement (log-log). Needs matplotlib.
+
+    Args:
+        results (dict): Results from main().
+        path (str): Path to the PNG file.
+
+    Returns:
+        bool: Whether the plot was written.
+    """
+
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib is not installed, skipping the plot")
+        return False
+
+    sizes = [r["entries"] for r in results["runs"]]
+    fig, ax = plt.subplots(figsize=(9, 6))
+    for name in results["runs"][0]["times"]:
+        if name.endswith("(MB)"):
+            continue
+        ax.plot(sizes, [r["times"][name] for r in results["runs"]], marker="o", label=name)
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    ax.set_xlabel("glossary entries")
+    ax.set_ylabel("ms")
+    ax.set_title(f"Scaling at commit {results['commit']}")
+    ax.legend(fontsize="small")
+    fig.savefig(path, dpi=100, bbox_inches="tight")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scale benchmark with synthetic glossaries")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100],
+                        help="glossary sizes relative to the shipped glossary")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions per measurement")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(),
+                                                           "klimadiskurs-bench"),
+                        help="where generated data is cached")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="memory-map a glossary snapshot instead of loading glossary.json")
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # child process: measure one size and report back as JSON
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.repeat, args.snapshot)))
+        return
+
+    if args.snapshot:
+        sys.path.insert(0, os.path.join(ROOT, "tools"))
+        from create_snapshot import create_snapshot
+    results = {"commit": git_commit(), "snapshot": args.snapshot, "runs": []}
+    for scale in args.scales:
+        data_dir = os.path.join(args.data_dir, f"x{scale:g}")
+        if not os.path.isfile(os.path.join(data_dir, "glossary.json")):
+            print(f"Generating data for scale {scale:g}...")
+            generate.generate(scale, data_dir)
+        if args.snapshot:
+            create_snapshot(os.path.join(data_dir, "glossary.json"),
+                            os.path.join(data_dir, "glossary.snapshot"))
+        print(f"Measuring scale {scale:g}...")
+        out = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                       "--measure", data_dir, "--repeat", str(args.repeat)]
+                                      + ["--snapshot"] * args.snapshot, cwd=ROOT, text=True)
+        times = json.loads(out.splitlines()[-1])
+        results["runs"].append({"scale": scale, "entries": round(generate.BASE_SIZE * scale),
+                                "times": times})
+
+    names = list(results["runs"][0]["times"])
+    print(f"{'':<26}" + "".join(f"{r['entries']:>12}" for r in results["runs"]))
+    for name in names:
+        print(f"{name:<26}" + "".join(f"{r['times'][name]:>12.2f}" for r in results["runs"]))
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = os.path.join(RESULTS_DIR, f"scale-{results['commit']}" + "-snapshot" * args.snapshot)
+    with open(output + ".json", mode="w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved results to {output}.json")
+    if plot(results, output + ".png"):
+        print(f"Saved plot to {output}.png")
+
+
+if __name__ == "__main__":
+    main()
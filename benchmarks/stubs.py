@@ -0,0 +1,252 @@
+# Local stand-ins for the external APIs the app depends on: Twitter, GitHub and DWDS
+# Each stand-in answers the few endpoints the app actually calls with plausible fake data
+# Latency and error rate can be configured so the app can be benchmarked under degraded upstreams
+# Run stand-alone with: python stubs.py --latency 50 --error-rate 0.05
+# Then start the app with the printed environment variables
+
+import argparse
+import base64
+import hashlib
+import json
+import random
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+from urllib.parse import parse_qs, urlparse
+
+REPO_NAME = "noelsimmel/klimadiskurs-files"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Base handler. Adds configurable latency and errors to every response.
+    Subclasses implement route() and return a (status, payload) tuple."""
+
+    # set per server in start_stub()
+    latency = 0.0       # seconds
+    jitter = 0.0        # seconds, uniformly distributed
+    error_rate = 0.0    # share of requests answered with HTTP 503
+
+    # HTTP/1.1 so clients can reuse connections
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.__respond("GET")
+
+    def do_PUT(self):
+        self.__respond("PUT")
+
+    def log_message(self, format, *args):
+        """Keep benchmark output readable, don't log every request."""
+
+        pass
+
+    def read_body(self):
+        """Returns the decoded JSON request body, or an empty dict."""
+
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def route(self, method, path, params):
+        raise NotImplementedError
+
+    def __respond(self, method):
+        sleep(self.latency + random.uniform(0, self.jitter))
+        if random.random() < self.error_rate:
+            status, payload = 503, {"message": "Service unavailable (stub)"}
+        else:
+            url = urlparse(self.path)
+            status, payload = self.route(method, url.path, parse_qs(url.query))
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TwitterStub(StubHandler):
+    """Twitter API v2: tweet lookup (used to verify credentials), full-archive search and
+    tweet counts."""
+
+    def route(self, method, path, params):
+        if path.startswith("/2/tweets/counts/"):
+            return 200, fake_counts(params["query"][0], params["start_time"][0],
+                                    params["end_time"][0])
+        if path.startswith("/2/tweets/search/"):
+            query = params.get("query", ["Klima"])[0].split()[0]
+            count = int(params.get("max_results", ["10"])[0])
+            return 200, fake_tweets(query, count)
+        if path.startswith("/2/tweets/"):
+            return 200, {"data": {"id": "20", "text": "just setting up my twttr"}}
+        return 404, {"title": "Not Found Error"}
+
+
+class GitHubStub(StubHandler):
+    """GitHub REST API: repository lookup, reading and updating files in one repository.
+    Files are kept in memory and start with an empty submissions.tsv and tweeted_terms.txt.
+    Reads are counted per file, e.g. every app worker reads tweeted_terms.txt once at startup."""
+
+    files = {}
+    reads = Counter()
+    lock = threading.Lock()
+
+    def route(self, method, path, params):
+        prefix = f"/repos/{REPO_NAME}"
+        if path == prefix:
+            return 200, {"id": 1, "name": REPO_NAME.split("/")[1], "full_name": REPO_NAME,
+                         "url": self.__base_url() + prefix}
+        if path.startswith(prefix + "/contents/"):
+            fn = path[len(prefix + "/contents/"):]
+            with self.lock:
+                if method == "PUT":
+                    content = base64.b64decode(self.read_body()["content"])
+                    self.files[fn] = content
+                    return 200, {"content": self.__content_file(fn),
+                                 "commit": {"sha": hashlib.sha1(content).hexdigest()}}
+                if fn not in self.files:
+                    return 404, {"message": "Not Found"}
+                self.reads[fn] += 1
+                return 200, self.__content_file(fn)
+        return 404, {"message": "Not Found"}
+
+    def __base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __content_file(self, fn):
+        content = self.files[fn]
+        return {"type": "file", "encoding": "base64", "name": fn.split("/")[-1], "path": fn,
+                "content": base64.b64encode(content).decode("ascii"),
+                "sha": hashlib.sha1(content).hexdigest(), "size": len(content),
+                "url": f"{self.__base_url()}/repos/{REPO_NAME}/contents/{fn}"}
+
+
+class DWDSStub(StubHandler):
+    """DWDS snippet API. Every term whose length is even "exists" in the dictionary."""
+
+    def route(self, method, path, params):
+        if path.startswith("/api/wb/snippet"):
+            term = params.get("q", [""])[0]
+            if len(term) % 2:
+                return 200, []
+            return 200, [{"wortart": "Substantiv", "url": f"https://www.dwds.de/wb/{term}",
+                          "input": term, "lemma": term}]
+        return 404, {}
+
+
+def fake_tweets(query, count):
+    """Generates a Twitter API v2 search response with count tweets that mention query.
+    Every fourth tweet quotes the previous one, like a manual retweet.
+
+    Args:
+        query (str): The term that every tweet should contain.
+        count (int): Number of tweets.
+
+    Returns:
+        dict: JSON payload with "data" and "includes" like the real API.
+    """
+
+    now = datetime.now(timezone.utc)
+    users = [{"id": str(1000 + i), "name": f"User {i}", "username": f"user{i}"}
+             for i in range(5)]
+    data = []
+    for i in range(count):
+        text = f"Tweet Nummer {i} über {query}, siehe https://t.co/abc{i}"
+        if i % 4 == 3:
+            text = f"Genau so! \"{data[-1]['text']}\" via @{users[(i-1) % len(users)]['username']}"
+        data.append({"id": str(1500000000000000000 + i),
+                     "author_id": users[i % len(users)]["id"],
+                     "created_at": (now - timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                     "text": text})
+    return {"data": data, "includes": {"users": users}, "meta": {"result_count": count}}
+
+
+def fake_counts(query, start_time, end_time):
+    """Generates a Twitter API v2 tweet counts response with one count per day.
+    Counts are random but the same for the same query and day.
+
+    Args:
+        query (str): The search query.
+        start_time (str): ISO 8601 start time, e.g. "2022-02-07T00:00:00Z".
+        end_time (str): ISO 8601 end time, exclusive.
+
+    Returns:
+        dict: JSON payload with "data" and "meta" like the real API.
+    """
+
+    parse = lambda t: datetime.fromisoformat(t.replace("Z", "+00:00"))
+    start, end = parse(start_time), parse(end_time)
+    data = []
+    day = start
+    while day < end:
+        count = random.Random(f"{query} {day.date()}").choice((0, 0, 1, 2, 5, 20))
+        data.append({"start": day.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                     "end": (day + timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                     "tweet_count": count})
+        day += timedelta(days=1)
+    return {"data": data, "meta": {"total_tweet_count": sum(d["tweet_count"] for d in data)}}
+
+
+def start_stub(handler, port=0, latency=0.0, jitter=0.0, error_rate=0.0):
+    """Starts a stand-in server in a daemon thread.
+
+    Args:
+        handler (StubHandler): Handler class, e.g. TwitterStub.
+        port (int, optional): Port to listen on. Defaults to 0 = any free port.
+        latency (float, optional): Added delay per request in seconds. Defaults to 0.
+        jitter (float, optional): Maximum additional random delay in seconds. Defaults to 0.
+        error_rate (float, optional): Share of requests that fail with 503. Defaults to 0.
+
+    Returns:
+        ThreadingHTTPServer: The running server. Its base URL is http://127.0.0.1:<port>.
+    """
+
+    # each server gets its own handler subclass so settings don't leak between stand-ins
+    attrs = {"latency": latency, "jitter": jitter, "error_rate": error_rate}
+    if issubclass(handler, GitHubStub):
+        attrs["files"] = {"submissions.tsv": b"", "tweeted_terms.txt": b"",
+                          "tweeted_terms_temp.txt": b""}
+        attrs["reads"] = Counter()
+    configured = type(handler.__name__, (handler,), attrs)
+    server = ThreadingHTTPServer(("127.0.0.1", port), configured)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_all(latency=0.0, jitter=0.0, error_rate=0.0, tweeted_terms=()):
+    """Starts all three stand-ins with the same settings.
+
+    Args:
+        latency, jitter, error_rate: see start_stub().
+        tweeted_terms (iterable(str), optional): Initial content of tweeted_terms.txt.
+
+    Returns:
+        dict(str, ThreadingHTTPServer): Servers by name ("twitter", "github", "dwds").
+        dict(str, str): Environment variables that point the app at the stand-ins.
+    """
+
+    servers = {name: start_stub(handler, latency=latency, jitter=jitter, error_rate=error_rate)
+               for name, handler in (("twitter", TwitterStub), ("github", GitHubStub),
+                                     ("dwds", DWDSStub))}
+    servers["github"].RequestHandlerClass.files["tweeted_terms.txt"] = \
+        "\n".join(tweeted_terms).encode("utf-8")
+    urls = {name: "http://127.0.0.1:%d" % s.server_address[1] for name, s in servers.items()}
+    env = {"TWITTER_API_URL": urls["twitter"], "GITHUB_API_URL": urls["github"],
+           "DWDS_API_URL": urls["dwds"], "TW_BEARER_TOKEN": "stub", "GH_ACCESS_TOKEN": "stub"}
+    return servers, env
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run local stand-ins for Twitter, GitHub, DWDS")
+    parser.add_argument("--latency", type=float, default=0, help="added latency in ms")
+    parser.add_argument("--jitter", type=float, default=0, help="max. random extra latency in ms")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of 503 responses")
+    args = parser.parse_args()
+
+    _, env = start_all(args.latency/1000, args.jitter/1000, args.error_rate)
+    for k, v in env.items():
+        print(f"{k}={v}")
+    threading.Event().wait()
@@ -0,0 +1,39 @@
+# Gunicorn config file
+# Gunicorn loads this file automatically when started from the root directory (see Procfile)
+# Settings can still be overridden on the command line, e.g. gunicorn run:app --workers 4
+
+from glob import glob
+import os
+import tempfile
+
+# metrics: every worker writes its metrics to this directory, /metrics aggregates them
+# must be set before the workers import prometheus_client, i.e. here in the master process
+metrics_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR",
+                                    os.path.join(tempfile.gettempdir(), "klimadiskurs-metrics"))
+os.makedirs(metrics_dir, exist_ok=True)
+# remove metrics of previous runs
+for fn in glob(os.path.join(metrics_dir, "*.db")):
+    os.remove(fn)
+
+# circuit breakers: the workers share the state of the breakers through files in this directory,
+# see klimadiskurs/app/breakers.py. A restart starts with all breakers closed
+breaker_dir = os.environ.setdefault("BREAKER_DIR",
+                                    os.path.join(tempfile.gettempdir(), "klimadiskurs-breakers"))
+os.makedirs(breaker_dir, exist_ok=True)
+for fn in glob(os.path.join(breaker_dir, "*.breaker")):
+    os.remove(fn)
+
+# serving mode, see "Deployment" in the README
+# "sync": every worker handles one request at a time, a /def/<term> request blocks it for >1 second
+# "gevent": a worker switches to another request whenever one waits for Twitter, DWDS or GitHub
+#           (gunicorn patches sockets, sleep and threading in the workers before loading the app)
+worker_class = os.environ.get("WORKER_CLASS", "sync")
+# gevent only: maximum number of requests a worker handles at the same time
+worker_connections = int(os.environ.get("WORKER_CONNECTIONS", 100))
+
+def child_exit(server, worker):
+    """Gunicorn server hook. Tells prometheus_client that a worker has stopped,
+    as required in multiprocess mode."""
+
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
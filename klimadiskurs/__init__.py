@@ -1,14 +1,18 @@
 # Init file
 # Used to initalize the database and create app instances
 
-from flask import Flask, json
+from flask import Flask
 from flask_wtf.csrf import CSRFProtect
-from klimadiskurs.config import Config
+from klimadiskurs.config import Config, GLOSSARY_PATH, GLOSSARY_SNAPSHOT, VALIDATE_GLOSSARY
+from klimadiskurs.glossary import GlossaryJSONEncoder, GlossaryProxy, open_glossary
 # from logging.config import dictConfig     # see below
 
 # glossary database
-with open("klimadiskurs/static/data/glossary.json", encoding="utf-8", errors="replace") as f:
-    db = json.load(f)
+# read-only mapping of terms to Entry objects, either loaded from glossary.json or
+# memory-mapped from a snapshot, see glossary.py
+# the proxy stays the same object when the glossary is reloaded (see app/reloader.py),
+# so modules can keep importing it with "from klimadiskurs import db"
+db = GlossaryProxy(open_glossary(GLOSSARY_PATH, GLOSSARY_SNAPSHOT, VALIDATE_GLOSSARY))
 
 # CSRF for form security
 csrf = CSRFProtect()
@@ -25,6 +29,8 @@ def create_app(config_class=Config):
 
     app = Flask(__name__)
     app.config.from_object(config_class)
+    # glossary entries are not dicts, so JSON responses need a custom encoder
+    app.json_encoder = GlossaryJSONEncoder
     app.logger.debug("Configured app")
 
     csrf.init_app(app)
@@ -34,6 +40,19 @@ def create_app(config_class=Config):
     # this is done in base.html in case a user leaves the page open that long
     app.config['WTF_CSRF_TIME_LIMIT'] = 86400
 
+    # request, template and external API timings for /metrics
+    from klimadiskurs.app import metrics
+    metrics.init_app(app)
+    app.logger.debug("Initialized metrics")
+
+    # opt-in per-request profiling, does nothing unless enabled in the config
+    from klimadiskurs.app import profiler
+    profiler.init_app(app)
+
+    # reloads the glossary when glossary.json changes, does nothing if disabled in the config
+    from klimadiskurs.app import reloader
+    reloader.init_app(app)
+
     # example on how to register blueprints
     # currently, the app is so simple it doesn't need blueprints
     # when expanding the functionality, they may be a good idea
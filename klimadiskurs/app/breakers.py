@@ -0,0 +1,233 @@
+# Breakers file
+# Circuit breakers for the external APIs that requests wait for: Twitter, DWDS and GitHub.
+# Calls to an API go through its breaker ("with breakers.DWDS, upstream("dwds"): ..."), which
+# counts the calls and the failed ones (exceptions, including timeouts, see config.py) in windows
+# of BREAKER_WINDOW seconds. Once at least BREAKER_MIN_CALLS calls of a window were made and at
+# least BREAKER_FAILURE_RATE of them failed, the breaker opens: for BREAKER_OPEN_SECONDS every call
+# fails at once with CircuitOpenError instead of waiting for the API, and e.g. /def/<term> is shown
+# without tweets or the DWDS link. Then it is half-open and lets one call through as a probe. If
+# the probe succeeds, the breaker closes again, otherwise it stays open for another period.
+# Client errors (4xx except 429 Too Many Requests) don't count as failures, the API is up then.
+# The state is shared by all gunicorn workers: each breaker is a small file in BREAKER_DIR that
+# the workers read and update under a file lock (a few microseconds per call), so once the API
+# failed for some requests, the other workers stop waiting for it as well.
+# /breakers shows the state of all breakers, /metrics has it as klimadiskurs_breaker_state.
+
+import fcntl
+import os
+import struct
+from datetime import datetime
+from time import time
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from klimadiskurs.app.metrics import BREAKER_REJECTIONS, register_collector
+from klimadiskurs.config import BREAKER_DIR, BREAKER_FAILURE_RATE, BREAKER_MIN_CALLS, \
+                                BREAKER_OPEN_SECONDS, BREAKER_WINDOW
+
+CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+STATE_NAMES = {CLOSED: "closed", OPEN: "open", HALF_OPEN: "half-open"}
+# state file: state, start of the current window, when the breaker opened, when the last probe
+# started, calls and failures in the current window, number of times the breaker opened
+STATE = struct.Struct("<BdddIII")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an API whose breaker is open."""
+
+    def __init__(self, name):
+        self.name = name
+        super().__init__(f"Circuit breaker {name} is open")
+
+
+class Breaker():
+    """Circuit breaker of one API, see the description above. Use it as a context manager around
+    the call, it raises CircuitOpenError if the call must not be made and records the result."""
+
+    def __init__(self, name, directory=BREAKER_DIR, failure_rate=BREAKER_FAILURE_RATE,
+                 min_calls=BREAKER_MIN_CALLS, window=BREAKER_WINDOW,
+                 open_seconds=BREAKER_OPEN_SECONDS):
+        """Constructor.
+
+        Args:
+            name (str): Name of the API, e.g. "dwds". Also the name of the state file.
+            directory (str, optional): Directory of the state files. Defaults to BREAKER_DIR.
+            failure_rate (float, optional): Share of failed calls that opens the breaker.
+                Defaults to BREAKER_FAILURE_RATE.
+            min_calls (int, optional): Calls in a window before the breaker can open.
+                Defaults to BREAKER_MIN_CALLS.
+            window (float, optional): Seconds per window. Defaults to BREAKER_WINDOW.
+            open_seconds (float, optional): Seconds the breaker stays open before a probe, and
+                before another probe if a probe never returned. Defaults to BREAKER_OPEN_SECONDS.
+        """
+
+        self.name = name
+        self.path = os.path.join(directory, f"{name}.breaker")
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        # file descriptor and the process it was opened in, gunicorn workers are forked and
+        # must not share it, file locks of a shared descriptor don't exclude each other
+        self.__fd = None
+        self.__pid = None
+
+    def __enter__(self):
+        if not self.allow():
+            BREAKER_REJECTIONS.labels(self.name).inc()
+            raise CircuitOpenError(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.record(exc is None or not failed(exc))
+        return False
+
+    def allow(self):
+        """Whether a call may be made now. If the breaker is open and the wait is over, the
+        caller becomes the probe (half-open), and the others have to wait for its result.
+
+        Returns:
+            bool: True if the call may be made.
+        """
+
+        def update(state, now):
+            if state[0] == CLOSED:
+                return True, None
+            if state[0] == OPEN and now - state[2] >= self.open_seconds \
+               or state[0] == HALF_OPEN and now - state[3] >= self.open_seconds:
+                # the probe, also if the last probe never returned (e.g. its worker died)
+                return True, (HALF_OPEN, state[1], state[2], now, *state[4:])
+            return False, None
+
+        return self.__update(update, True)
+
+    def record(self, ok):
+        """Records the result of a call.
+
+        Args:
+            ok (bool): Whether the call succeeded.
+        """
+
+        def update(state, now):
+            status, window_start, opened, probe, calls, failures, opens = state
+            if status == HALF_OPEN:
+                if ok:
+                    return None, (CLOSED, now, opened, probe, 0, 0, opens)
+                return None, (OPEN, now, now, probe, 0, 0, opens + 1)
+            if status == OPEN:
+                # a call that started before the breaker opened
+                return None, None
+            if now - window_start >= self.window:
+                window_start, calls, failures = now, 0, 0
+            calls += 1
+            failures += not ok
+            if calls >= self.min_calls and failures >= self.failure_rate * calls:
+                return None, (OPEN, now, now, probe, 0, 0, opens + 1)
+            return None, (CLOSED, window_start, opened, probe, calls, failures, opens)
+
+        self.__update(update, None)
+
+    def status(self):
+        """State of the breaker, for /breakers.
+
+        Returns:
+            dict: state ("closed", "open" or "half-open"), calls and failures in the current
+            window, when the breaker last opened and how often it opened.
+        """
+
+        state = self.__update(lambda state, now: (state, None), None)
+        if state is None:
+            return {"state": "unknown"}
+        status, _, opened, _, calls, failures, opens = state
+        return {"state": STATE_NAMES[status], "calls": calls, "failures": failures,
+                "opened": datetime.fromtimestamp(opened).isoformat(timespec="seconds")
+                          if opens else None,
+                "opens": opens}
+
+    def __update(self, update, default):
+        """Reads the state under the lock, calls update(state, now) and writes the new state
+        it returns. Without a usable state file, e.g. a read-only file system, the breaker
+        stays closed.
+
+        Args:
+            update (function): Returns (result, new state or None to keep the state).
+            default: Result if the state file can't be used.
+
+        Returns:
+            The result of update.
+        """
+
+        try:
+            fd = self.__file()
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                data = os.pread(fd, STATE.size, 0)
+                state = STATE.unpack(data) if len(data) == STATE.size \
+                        else (CLOSED, 0.0, 0.0, 0.0, 0, 0, 0)
+                result, new_state = update(state, time())
+                if new_state is not None and new_state != state:
+                    os.pwrite(fd, STATE.pack(*new_state), 0)
+                return result
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        except OSError:
+            return default
+
+    def __file(self):
+        # the state file of this process, see __init__
+        if self.__pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.__fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self.__pid = os.getpid()
+        return self.__fd
+
+
+class BreakerCollector():
+    """Prometheus collector with the shared state of the breakers, read when /metrics is
+    requested. The state is not kept in metrics, every worker would report its own view."""
+
+    def collect(self):
+        states = GaugeMetricFamily("klimadiskurs_breaker_state",
+                                   "Circuit breaker state (0 closed, 1 open, 2 half-open)",
+                                   labels=["upstream"])
+        opens = CounterMetricFamily("klimadiskurs_breaker_opens",
+                                    "Times a circuit breaker opened", labels=["upstream"])
+        codes = {name: code for code, name in STATE_NAMES.items()}
+        for breaker in BREAKERS:
+            status = breaker.status()
+            if status["state"] in codes:
+                states.add_metric([breaker.name], codes[status["state"]])
+                opens.add_metric([breaker.name], status["opens"])
+        yield states
+        yield opens
+
+
+def failed(exc):
+    """Whether an exception means that the API failed. Client errors (HTTP 4xx, except 429 Too
+    Many Requests) mean the request was wrong, e.g. a file that doesn't exist on GitHub.
+
+    Args:
+        exc (Exception): Exception raised by the call.
+
+    Returns:
+        bool: True if it counts as a failure of the API.
+    """
+
+    # requests and tweepy exceptions have the response, PyGithub exceptions the status
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None) or getattr(exc, "status", None)
+    return not (isinstance(status, int) and 400 <= status < 500 and status != 429)
+
+def status():
+    """State of all breakers, for /breakers.
+
+    Returns:
+        dict: API name -> state, see Breaker.status().
+    """
+
+    return {breaker.name: breaker.status() for breaker in BREAKERS}
+
+
+TWITTER = Breaker("twitter")
+DWDS = Breaker("dwds")
+GITHUB = Breaker("github")
+BREAKERS = (TWITTER, DWDS, GITHUB)
+register_collector(BreakerCollector())
@@ -0,0 +1,144 @@
+# Caching file
+# HTTP validators (ETag, Last-Modified) and Cache-Control for the dynamic routes
+# (/, /search/<query>, /api, /def/<term>, /about).
+# Their responses only change with the data they are made of: the glossary version (db.version),
+# the tweeted terms (loaded at startup), the corpus statistics and for /def/<term> the cached
+# tweets (see utils_twitter.py). A route computes the ETag from these versions before doing any
+# work, and if the client already has that response (If-None-Match or If-Modified-Since), it is
+# answered with 304 right away, without querying the glossary or rendering a template.
+# Pages contain the CSRF token of the visitor's session (base.html), so they may only be cached by
+# the browser (private) and are revalidated on every visit (no-cache). Their ETag includes the
+# session's CSRF secret and the date, because tokens expire after a day (see __init__.py). The
+# secret is created before the ETag on a first visit, so the next visit can already match. Flash
+# messages that wait to be shown (e.g. after a submission redirected to /) are part of the ETag too,
+# so the page that shows them is rendered, and so is the next one without them. Pages
+# have no Last-Modified, a client that only sends If-Modified-Since would get a 304 for a page
+# with another session's token or an expired one.
+# /api responses contain no token and may be cached by proxies for API_MAX_AGE seconds.
+# Every worker logs the share of 304 responses per route every LOG_EVERY requests, the totals
+# over all workers are in /metrics (klimadiskurs_cache_requests_total{cache="http:<route>"}).
+
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from hashlib import sha1
+from os import path
+from flask import current_app, make_response, request, session
+from flask_wtf.csrf import generate_csrf
+from werkzeug.http import is_resource_modified
+from klimadiskurs.app.metrics import count_cache
+
+# seconds proxies and browsers may cache /api responses without revalidating
+API_MAX_AGE = 60
+# requests per route and worker between two log lines with the share of 304 responses
+LOG_EVERY = 100
+
+
+class Validators():
+    """ETag and Last-Modified of a dynamic response, computed from the versions of the data the
+    response is made of, before the response itself.
+
+    Example:
+        validators = Validators(db.version, tweeted_version)
+        return validators.not_modified() or validators.apply(render_template(...))
+    """
+
+    # route -> [requests answered with 304, requests], per worker since the last log line
+    counts = defaultdict(lambda: [0, 0])
+
+    def __init__(self, *versions, modified=(), page=True, max_age=0):
+        """Constructor.
+
+        Args:
+            *versions: Everything the response depends on besides the URL, e.g. db.version.
+            modified (iterable(float), optional): Modification times of the data in seconds since
+                the epoch, the latest one is sent as Last-Modified. None values are ignored.
+                Not used for pages, see the description above. Defaults to ().
+            page (bool, optional): Whether the response is a page with the visitor's CSRF token,
+                see the description above. Defaults to True.
+            max_age (int, optional): Seconds a response that is not a page may be cached.
+                Defaults to 0.
+        """
+
+        self.page = page
+        self.max_age = max_age
+        key = (request.full_path, *versions)
+        if page:
+            # creates the session's CSRF secret if it has none yet, the page will contain it
+            generate_csrf()
+            key += (session.get("csrf_token"), date.today(), session.get("_flashes"))
+            modified = ()
+        self.etag = sha1(repr(key).encode("utf-8")).hexdigest()[:20]
+        times = [t for t in modified if t is not None]
+        # HTTP dates have whole seconds
+        self.last_modified = datetime.fromtimestamp(int(max(times)), timezone.utc) if times \
+                             else None
+
+    def not_modified(self):
+        """Checks the request's If-None-Match and If-Modified-Since headers.
+        Only GET and HEAD requests are checked, e.g. a submission (POST to /) is always handled.
+
+        Returns:
+            Response: 304 response if the client has the current response, otherwise None.
+        """
+
+        if request.method not in ("GET", "HEAD"):
+            return None
+        hit = not is_resource_modified(request.environ, etag=self.etag,
+                                       last_modified=self.last_modified)
+        self.__count(hit)
+        if hit:
+            return self.apply(current_app.response_class(status=304))
+        return None
+
+    def apply(self, response):
+        """Adds ETag, Last-Modified and Cache-Control to a response of a GET or HEAD request.
+
+        Args:
+            response: Return value of a view, e.g. a rendered template or a dict.
+
+        Returns:
+            Response: The response.
+        """
+
+        response = make_response(response)
+        if request.method not in ("GET", "HEAD") or response.status_code not in (200, 304):
+            return response
+        response.set_etag(self.etag)
+        # werkzeug sends the current time for None
+        if self.last_modified is not None:
+            response.last_modified = self.last_modified
+        if self.page:
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+        else:
+            response.cache_control.public = True
+            response.cache_control.max_age = self.max_age
+        return response
+
+    def __count(self, hit):
+        # label by URL rule, like the request times in metrics.py
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        count_cache(f"http:{route}", hit)
+        counts = Validators.counts[route]
+        counts[0] += hit
+        counts[1] += 1
+        if counts[1] >= LOG_EVERY:
+            current_app.logger.info(f"HTTP cache {route}: {counts[0]}/{counts[1]} requests "
+                                    f"({100 * counts[0] / counts[1]:.0f}%) answered with 304")
+            counts[:] = [0, 0]
+
+
+def file_mtime(filename):
+    """Modification time of a file, e.g. as a version of data read from it.
+
+    Args:
+        filename (str): Path to the file.
+
+    Returns:
+        float: Seconds since the epoch, None if the file doesn't exist.
+    """
+
+    try:
+        return path.getmtime(filename)
+    except OSError:
+        return None
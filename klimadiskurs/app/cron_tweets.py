@@ -1,15 +1,24 @@
 # Cron job script
-# Queries the Twitter API for each term in the glossary
-# Writes terms that have been tweeted to GitHub repo
+# Counts the German tweets per week for each term in the glossary with Twitter's tweet counts
+# endpoint and stores them in the trends database (see trends.py), which is kept on GitHub
+# Terms that have been tweeted are added to tweeted_terms.txt in the GitHub repo
 # Used to determine which glossary entries to link in the app
 # Scheduled to run every Sunday at 1:30 am UTC
 
-from datetime import datetime
+import tweepy
+from datetime import datetime, timedelta, timezone
 from github import Github
 from time import sleep
 from klimadiskurs import db
-from klimadiskurs.config import GITHUB_TOKEN
+from klimadiskurs.app import trends
+from klimadiskurs.config import GITHUB_TOKEN, GITHUB_API_URL
 from klimadiskurs.app.utils_twitter import connect_to_twitter
+from klimadiskurs.normalization import spellings
+
+# number of past weeks counted per run, weeks missed by earlier runs are filled in
+WEEKS_PER_RUN = 4
+# the database is uploaded after this many terms, so an interrupted run can continue from there
+UPLOAD_EVERY = 500
 
 # script should run only once a week
 # workaround since Heroku Scheduler can only schedule daily tasks
@@ -18,80 +27,79 @@ if datetime.today().weekday() != 6:
     print("Today is not Sunday. Trying again tomorrow.")
     exit()
 
-def get_file(filename):
-    """Gets a file from GitHub and decodes it.
+def count_tweets(term, start, end):
+    """Counts the German tweets (without retweets) that contain a term in any spelling.
 
     Args:
-        fn (str): Path to the file.
+        term (str): The term.
+        start (datetime): First day, Monday 0:00 UTC.
+        end (datetime): Day after the last day, Monday 0:00 UTC.
 
     Returns:
-        tuple(str): The GitHub file [0] and the decoded contents of the file [1].
-    """
-
-    return (repo.get_contents(filename), 
-            repo.get_contents(filename).decoded_content.decode("UTF-8"))
-
-def write_to_file(term):
-    """
-    Adds a term to tweeted_terms_temp.txt on GitHub and commits it.
-
-    Args:
-        term (str): The term.
+        dict(str, int): Number of tweets per ISO week, 0 for weeks without tweets.
     """
 
-    tweets_file, content = get_file("tweeted_terms_temp.txt") 
-    content += "\n" + term
-
-    try:
-        repo.update_file(tweets_file.path, "new term", content, tweets_file.sha)
-        sleep(9)   # avoid GitHub API error 409 (occurs when too many requests)
-    except Exception as e:
-        print("GitHub API Error:", e)
-
-
-print(f"Searching recent tweets for {len(db)} terms")
-api = connect_to_twitter()
-github = Github(GITHUB_TOKEN)
+    query = "(" + " OR ".join(spellings(term)) + ") lang:de -is:retweet"
+    # the full-archive counts endpoint returns up to 31 days per page
+    response = api.get_all_tweets_count(query, granularity="day", start_time=start, end_time=end)
+    sleep(1)  # to avoid rate limiting
+    counts = {trends.week_of((start + timedelta(weeks=i)).date()): 0 
+              for i in range((end - start).days // 7)}
+    for day in response.data or ():
+        week = trends.week_of(datetime.fromisoformat(day["start"].replace("Z", "+00:00")).date())
+        counts[week] += day["tweet_count"]
+    return counts
+
+
+print(f"Counting tweets for {len(db)} terms")
+# the cron job has time to wait for the rate limit, unlike a page
+api = connect_to_twitter(wait_on_rate_limit=True)
+github = Github(GITHUB_TOKEN, base_url=GITHUB_API_URL)
 repo = github.get_repo("noelsimmel/klimadiskurs-files")
 
-# if tweeted_terms_temp.txt is empty, search full database
-# otherwise start from last tweeted term (used if this task timed out or was interrupted)
-terms_list = list(db.keys())
-_, content = get_file("tweeted_terms_temp.txt")
-try:
-    last_idx = terms_list.index(content.split()[-1])
-    terms_list = terms_list[last_idx+1:]
-except IndexError:
-    last_idx = 0
-    terms_list = list(db.keys())
+# the last WEEKS_PER_RUN complete weeks (Monday to Sunday) before today
+today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+end = today - timedelta(days=today.weekday())
+start = end - timedelta(weeks=WEEKS_PER_RUN)
+last_week = trends.week_of((end - timedelta(days=1)).date())
+
+# continue with the counts of earlier runs
+# terms that already have counts for the last week were done by an interrupted run of this week
+trends.download(repo)
+connection = trends.connect(readonly=False)
+done = {term for term, in connection.execute(
+    "SELECT term FROM weekly_counts WHERE week = ?", (last_week,))}
+# the terms of the list stay tweeted, also the ones tweeted before the weekly counts were stored
+tweeted_file = repo.get_contents("tweeted_terms.txt")
+tweeted = set(tweeted_file.decoded_content.decode("UTF-8").split())
 
 # Twitter sadly doesn't allow * in API calls, so ignore gendered terms
 # * raises a tweepy.errors.BadRequest 400 (wildcard character cannot appear in a term)
-terms_list = [t for t in terms_list if "*" not in t]
+terms_list = [t for t in db.keys() if "*" not in t and t not in done]
+print(f"{len(done)} terms were already counted this week")
 
-# query API and write to GitHub file
+# query API and store the counts
 for idx, term in enumerate(terms_list):
-    if idx+last_idx in range(0, len(db), 100):
-        print(f"Querying term {idx}/{len(db)}")
-    tweets = []
-    for variant in (term, "Klima-" + term[5:]):
-        try:
-            response = api.search_all_tweets(variant + " lang:de -is:retweet", 
-                                             max_results=10, since_id=20)
-            sleep(1)  # to avoid rate limiting
-            tweets += [t for t in response.data if not t.text.startswith("RT") 
-                       and variant.lower() in t.text.lower()]
-            if tweets:
-                write_to_file(term)
-                break
-        # if no tweets were found for a term
-        except TypeError: continue
+    if idx % 100 == 0:
+        print(f"Querying term {idx}/{len(terms_list)}")
+    try:
+        counts = count_tweets(term, start, end)
+    except tweepy.errors.TweepyException as e:
+        print(f"Twitter API Error for {term}:", e)
+        continue
+    trends.add_counts(connection, term, counts)
+    if (idx + 1) % UPLOAD_EVERY == 0:
+        trends.upload(repo)
 
 # after processing the whole db
-# save the list to tweeted_terms.txt and empty the temp file
-tweets_file, content = get_file("tweeted_terms_temp.txt")
-backup_file, _ = get_file("tweeted_terms.txt")
-repo.update_file(backup_file.path, "backup", content, backup_file.sha)
-print("Copied all terms to final file")
-repo.update_file(tweets_file.path, "emptied", "", tweets_file.sha)  # update with empty string
-print("Emptied temp file")
+# a term counts as tweeted once it has been tweeted in any week. The list is read from the
+# database, which also has the terms counted by an interrupted run of this week
+tweeted.update(term for term, in connection.execute(
+    "SELECT DISTINCT term FROM weekly_counts WHERE count > 0"))
+# upload the counts and save the list of tweeted terms to tweeted_terms.txt
+connection.close()
+trends.upload(repo)
+print("Uploaded weekly counts")
+tweeted = [t for t in db.keys() if t in tweeted]
+repo.update_file(tweeted_file.path, "tweeted terms", "\n".join(tweeted), tweeted_file.sha)
+print(f"Saved {len(tweeted)} tweeted terms")
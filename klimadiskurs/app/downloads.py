@@ -0,0 +1,71 @@
+# Downloads file
+# Sends the files from the download page in the smallest encoding the client accepts
+# The minified and compressed variants are prepared by tools/create_downloads.py and listed in
+# DOWNLOADS_DIR/manifest.json with a content-based ETag per variant. Responses support
+# conditional requests (If-None-Match/If-Modified-Since -> 304) and byte ranges (206), so mirrors
+# can poll cheaply and interrupted downloads can be resumed.
+# If the manifest is missing or older than the source file, the source file is sent as before.
+
+import json
+import os
+from os import path
+from flask import request, send_file
+from klimadiskurs.config import DOWNLOADS_DIR
+from klimadiskurs.app.metrics import count_cache
+
+# preferred order if the client accepts several encodings equally
+ENCODINGS = ("br", "gzip", "identity")
+
+# parsed manifest.json and its mtime, reloaded when the file changes
+__manifest = {"mtime_ns": None, "data": dict()}
+
+
+def send_download(name, source_path):
+    """Sends a download file, see the module description.
+
+    Args:
+        name (str): Name in the manifest, e.g. "json" or "wordlist".
+        source_path (str): Path to the uncompressed source file, e.g. GLOSSARY_PATH.
+
+    Returns:
+        Response: 200, 206 or 304 response.
+    """
+
+    entry = __load_manifest().get(name)
+    source = path.abspath(source_path)
+    if entry is None or not __is_current(entry, source):
+        return send_file(source, conditional=True)
+
+    variants = entry["variants"]
+    encoding = request.accept_encodings.best_match([e for e in ENCODINGS if e in variants],
+                                                   default="identity")
+    variant = variants[encoding]
+    response = send_file(path.abspath(path.join(DOWNLOADS_DIR, variant["file"])),
+                         mimetype=entry["mimetype"], etag=variant["etag"], conditional=True)
+    if encoding != "identity":
+        response.content_encoding = encoding
+    response.vary.add("Accept-Encoding")
+    count_cache("download", response.status_code == 304)
+    return response
+
+def __load_manifest():
+    """Returns the parsed manifest, or an empty dict if there is none."""
+
+    manifest_path = path.join(DOWNLOADS_DIR, "manifest.json")
+    try:
+        mtime_ns = os.stat(manifest_path).st_mtime_ns
+        if mtime_ns != __manifest["mtime_ns"]:
+            with open(manifest_path, encoding="utf-8") as f:
+                __manifest.update(mtime_ns=mtime_ns, data=json.load(f))
+    except (OSError, ValueError):
+        __manifest.update(mtime_ns=None, data=dict())
+    return __manifest["data"]
+
+def __is_current(entry, source):
+    """Whether the variants were built from the current source file."""
+
+    try:
+        stat = os.stat(source)
+    except OSError:
+        return False
+    return (entry["source_size"], entry["source_mtime_ns"]) == (stat.st_size, stat.st_mtime_ns)
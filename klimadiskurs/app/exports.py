@@ -0,0 +1,108 @@
+# Exports file
+# Bulk exports of the glossary as TSV, CSV or NDJSON (one JSON object per line) for /download/<format>
+# TSV and CSV use the column layout of submissions.tsv (EntrySubmitForm.fieldnames), with lists
+# written like in submissions: words separated by spaces, example sentences separated by █.
+# So an exported TSV can be edited and fed back into tools/add_new_entries.py.
+# Responses are streamed in chunks while they are generated. The finished output is kept in memory
+# per glossary version, format and query, so repeated downloads are sent from the cache.
+# The stream is generated after the request context is gone, so it reads the glossary the request
+# was pinned to (see GlossaryProxy in glossary.py), not one that was reloaded in the meantime.
+
+import csv
+import json
+from collections import OrderedDict
+from hashlib import sha1
+from io import StringIO
+from flask import Response, request
+from klimadiskurs import db
+from klimadiskurs.app.forms import EntrySubmitForm
+from klimadiskurs.app.metrics import count_cache
+from klimadiskurs.app.utils import query_db
+
+# mimetypes, Flask adds "; charset=utf-8" to text/* types
+FORMATS = {"tsv": "text/tab-separated-values", "csv": "text/csv", "ndjson": "application/x-ndjson"}
+# entries per streamed chunk
+CHUNK_SIZE = 100
+# number of finished exports kept in memory per worker
+CACHE_SIZE = 16
+
+# (glossary version, format, query) -> bytes, least recently used first
+__cache = OrderedDict()
+
+
+def send_export(format, query=None):
+    """Sends the glossary or the search results for query in one of FORMATS.
+
+    Args:
+        format (str): "tsv", "csv" or "ndjson".
+        query (str, optional): Search query, same as in /api. Defaults to None = all entries.
+
+    Returns:
+        Response: Streamed 200 response, or 304 if the client has the current version.
+    """
+
+    glossary = db.pinned()
+    key = (glossary.version, format, query)
+    cached = __cache.get(key)
+    count_cache("export", cached is not None)
+    if cached is not None:
+        __cache.move_to_end(key)
+        response = Response(cached, mimetype=FORMATS[format])
+    else:
+        terms = sorted(query_db(query) if query else glossary)
+        response = Response(__stream(key, glossary, terms), mimetype=FORMATS[format])
+    response.set_etag(sha1(repr(key).encode("utf-8")).hexdigest()[:20])
+    response.headers["Content-Disposition"] = f"attachment; filename=glossary.{format}"
+
+    if cached is not None:
+        # also answers range requests
+        return response.make_conditional(request, accept_ranges=True,
+                                         complete_length=len(cached))
+    # make_conditional() would read the whole stream to set Content-Length, so a stream
+    # is only checked for If-None-Match and otherwise sent with chunked transfer encoding
+    if request.if_none_match.contains(response.get_etag()[0]):
+        response.response = []
+        response.status_code = 304
+    return response
+
+def __stream(key, glossary, terms):
+    """Generates the export of terms in chunks and caches it once it is complete."""
+
+    format = key[1]
+    chunks = []
+    if format != "ndjson":
+        chunks.append(__serialize(format, [EntrySubmitForm.fieldnames]))
+        yield chunks[-1]
+    for start in range(0, len(terms), CHUNK_SIZE):
+        chunks.append(__serialize(format, [glossary[t] for t in terms[start:start + CHUNK_SIZE]]))
+        yield chunks[-1]
+
+    # only complete exports are cached, e.g. not if the client disconnected
+    __cache[key] = b"".join(chunks)
+    while len(__cache) > CACHE_SIZE:
+        __cache.popitem(last=False)
+
+def __serialize(format, entries):
+    """Serializes entries (or a list of column names for the header row) to UTF-8 bytes."""
+
+    if format == "ndjson":
+        return "".join(json.dumps(e.to_dict(), ensure_ascii=False) + "\n"
+                       for e in entries).encode("utf-8")
+
+    out = StringIO()
+    writer = csv.writer(out, delimiter="\t" if format == "tsv" else ",", lineterminator="\n")
+    writer.writerows(e if isinstance(e, list) else __to_row(e) for e in entries)
+    return out.getvalue().encode("utf-8")
+
+def __to_row(entry):
+    """Converts an entry to a row of strings in the order of EntrySubmitForm.fieldnames."""
+
+    row = []
+    for field in EntrySubmitForm.fieldnames:
+        value = entry[field]
+        if field == "examples":
+            value = "█".join(value)
+        elif isinstance(value, tuple):
+            value = " ".join(str(v) for v in value)
+        row.append(value)
+    return row
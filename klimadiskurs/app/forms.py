@@ -53,6 +53,5 @@ class EntrySubmitForm(FlaskForm):
     def __term_in_db(self, term):
         """Helper function. Checks if the term is in db and has a definition."""
 
-        result = (term in db and db[term]["definition"]) or \
-                 (term.lower() in db and db[term.lower()]["definition"])
-        return result
+        term = db.term_index.lookup(term)
+        return term is not None and bool(db[term]["definition"])
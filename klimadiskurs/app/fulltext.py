@@ -0,0 +1,241 @@
+# Full-text search file
+# Ranked search over the definitions, example sentences and sources of all entries (/api/fulltext)
+# query_db() only matches terms. This module finds entries whose texts contain the query words,
+# e.g. "Rebellion" -> Klimaaktivismus, ranked with BM25.
+# Texts and queries are normalized like terms (normalize_text() in normalization.py: lowercase,
+# "Gelände" and "Gelaende" -> "gelaende", no gender markers) and inflection suffixes are removed
+# with the rules of step 1 and 2 of the Snowball German stemmer ("Aktivist", "Aktivisten" ->
+# "aktivist"), so inflected forms match. Suffixes are only removed after the first syllable and
+# at least 3 letters (R1), so short words and roots stay intact ("Test", "Gelände" -> "gelaend").
+# The index maps each stem to its postings (entry, BM25 score of the stem in that entry), sorted by
+# score. Scores are computed when the index is built, so a query only adds up precomputed numbers.
+# Very common stems only keep their best MAX_POSTINGS postings (champion lists), which bounds the
+# query time independently of the glossary size. Entries further down such a list score low for
+# that stem anyway.
+
+import re
+from collections import Counter, defaultdict
+from heapq import nlargest
+from math import log
+from markupsafe import Markup, escape
+from klimadiskurs import db
+from klimadiskurs.normalization import UMLAUTS, normalize_text
+
+# BM25 parameters, common defaults
+K1 = 1.2
+B = 0.75
+# number of results
+TOP_K = 10
+# maximum number of postings per stem, see above
+MAX_POSTINGS = 2000
+# maximum k for /api/fulltext
+MAX_K = 50
+# length of a snippet in characters (about)
+SNIPPET_LENGTH = 160
+
+WORD_PATTERN = re.compile(r"\w+")
+# frequent German words and URL parts (from sources) that say nothing about an entry
+STOPWORDS = frozenset(word.translate(UMLAUTS) for word in """
+    aber als am an auch auf aus bei bin bis bist da dadurch daher darum das dass dein deine dem den
+    der des dessen deshalb die dies diese dieser dieses doch dort du durch ein eine einem einen
+    einer eines er es euer eure für hatte hatten hätte hätten hättest hättet hier hinter ich ihr
+    ihre im in ist ja jede jedem jeden jeder jedes jener jenes jetzt kann kannst können könnt
+    machen mein meine mit muss musst müssen nach nachdem nein nicht nun oder seid sein seine sich
+    sie sind soll sollen sollst sollt sonst soweit sowie und unser unsere unter vom von vor wann
+    warum was weiter weitere wenn wer werde werden werdet weshalb wie wieder wieso wir wird wirst
+    wo woher wohin zu zum zur über
+    http https www de com org net html htm php
+    """.split())
+# Snowball stemmer: vowels (umlauts are already transliterated) and the letters that may precede
+# a removed -s or -st
+VOWELS = frozenset("aeiouy")
+S_ENDINGS = frozenset("bdfghklmnrt")
+ST_ENDINGS = frozenset("bdfghklmnt")
+# minimum length of the part of a word that is never removed, see r1()
+MIN_ROOT = 3
+
+
+class FulltextIndex():
+    """Inverted index with precomputed BM25 scores, see the module description."""
+
+    def __init__(self, glossary):
+        """Constructor. Builds the index.
+
+        Args:
+            glossary (Mapping): The glossary, e.g. db.
+        """
+
+        self.version = glossary.version
+        self.terms = list(glossary)
+        # stem -> {entry index: frequency}, lengths in stems per entry
+        frequencies = defaultdict(dict)
+        lengths = []
+        stems = dict()      # word -> stem, most words occur many times
+        for i, term in enumerate(self.terms):
+            words = Counter(WORD_PATTERN.findall(normalize_text("\n".join(texts(glossary[term])))))
+            length = 0
+            for word, count in words.items():
+                stem = stems.get(word)
+                if stem is None:
+                    stem = stems[word] = analyze(word)
+                if stem:
+                    postings = frequencies[stem]
+                    postings[i] = postings.get(i, 0) + count
+                    length += count
+            lengths.append(length)
+
+        n = len(self.terms)
+        # 1 if no entry has any text, all lengths are 0 then
+        average = (sum(lengths) / n if n else 0) or 1
+        # length normalization of BM25 per entry
+        norms = [K1 * (1 - B + B * length / average) for length in lengths]
+        # stem -> [(score, entry index)], best first
+        self.postings = dict()
+        for stem, postings in frequencies.items():
+            idf = log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            scores = [(idf * f * (K1 + 1) / (f + norms[i]), i) for i, f in postings.items()]
+            scores.sort(reverse=True)
+            self.postings[stem] = scores[:MAX_POSTINGS]
+
+    def search(self, query, k=TOP_K):
+        """Returns the k entries that match query best.
+
+        Args:
+            query (str): User input, one or more words.
+            k (int, optional): Maximum number of results. Defaults to TOP_K.
+
+        Returns:
+            list(tuple(float, str)): (score, term), best first.
+        """
+
+        scores = defaultdict(float)
+        for stem in set(analyze_text(query)):
+            for score, i in self.postings.get(stem, ()):
+                scores[i] += score
+        return [(score, self.terms[i])
+                for i, score in nlargest(k, scores.items(), key=lambda item: item[1])]
+
+
+def analyze(word):
+    """Stem of a normalized word, or "" for stopwords.
+
+    Args:
+        word (str): Word normalized with normalize_text(), e.g. "aktivisten".
+
+    Returns:
+        str: Stem, e.g. "aktivist".
+    """
+
+    if word in STOPWORDS:
+        return ""
+    start = r1(word)
+    # step 1: inflection endings of nouns and adjectives, the longest one that is in R1
+    # -s only after a consonant that can end a stem ("Tests" but not "Haus")
+    for suffixes in (("ern", "em", "er"), ("en", "es", "e"), ("s",)):
+        suffix = next((s for s in suffixes if word.endswith(s)), None)
+        if suffix is None:
+            continue
+        if len(word) - len(suffix) >= start \
+           and (suffix != "s" or word[-2:-1] in S_ENDINGS):
+            word = word[:-len(suffix)]
+            # "Ergebnisse" -> "ergebniss" -> "ergebnis"
+            if suffixes[0] == "en" and word.endswith("niss"):
+                word = word[:-1]
+        break
+    # step 2: endings of adjectives and verbs ("wärmsten" -> "waermst" -> "waerm")
+    for suffix in ("en", "er", "est", "st"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= start:
+            if suffix != "st" or (word[-3:-2] in ST_ENDINGS and len(word) - 3 >= MIN_ROOT):
+                word = word[:-len(suffix)]
+            break
+    return word
+
+def r1(word):
+    """Start of the region R1 of the Snowball stemmer: after the first consonant that follows a
+    vowel, but at least MIN_ROOT letters into the word. Suffixes are only removed inside R1.
+
+    Args:
+        word (str): Normalized word, e.g. "gelaende".
+
+    Returns:
+        int: Index where R1 starts, e.g. 3 ("aende"); len(word) if there is no R1.
+    """
+
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i-1] in VOWELS:
+            return max(i + 1, MIN_ROOT)
+    return len(word)
+
+def analyze_text(text):
+    """Stems of all words in text, without stopwords."""
+
+    return [stem for stem in map(analyze, WORD_PATTERN.findall(normalize_text(text))) if stem]
+
+def texts(entry):
+    """Searchable texts of an entry: definition, example sentences, sources."""
+
+    return (entry["definition"], *entry["examples"], *entry["sources"])
+
+def snippet(entry, query, length=SNIPPET_LENGTH):
+    """Excerpt of the text of entry that contains most query words, with these words in <mark>.
+
+    Args:
+        entry (Entry): Glossary entry.
+        query (str): User input.
+        length (int, optional): Approximate snippet length in characters.
+            Defaults to SNIPPET_LENGTH.
+
+    Returns:
+        Markup: HTML-escaped snippet, "" if no text contains a query word.
+    """
+
+    wanted = set(analyze_text(query))
+    best, best_matches = "", []
+    for text in texts(entry):
+        matches = [m for m in WORD_PATTERN.finditer(text)
+                   if analyze(normalize_text(m.group())) in wanted]
+        if len(matches) > len(best_matches):
+            best, best_matches = text, matches
+    if not best_matches:
+        return Markup("")
+
+    # window around the first match, extended to word boundaries
+    start = max(0, best_matches[0].start() - length // 4)
+    end = min(len(best), start + length)
+    if start > 0:
+        space = best.find(" ", start, best_matches[0].start())
+        if space != -1:
+            start = space + 1
+    if end < len(best):
+        space = best.rfind(" ", start, end)
+        if space > best_matches[0].end():
+            end = space
+
+    parts = [Markup("… ") if start > 0 else Markup("")]
+    position = start
+    for m in best_matches:
+        if m.start() < start or m.end() > end:
+            continue
+        parts.append(escape(best[position:m.start()]))
+        parts.append(Markup("<mark>%s</mark>") % m.group())
+        position = m.end()
+    parts.append(escape(best[position:end]))
+    if end < len(best):
+        parts.append(Markup(" …"))
+    return Markup("").join(parts)
+
+def search(query, k=TOP_K):
+    """Full-text search with snippets.
+
+    Args:
+        query (str): User input.
+        k (int, optional): Maximum number of results. Defaults to TOP_K.
+
+    Returns:
+        list(dict): {"term": ..., "score": ..., "snippet": ...} per result, best first.
+    """
+
+    # built on first use, see GlossaryViews.index()
+    index = db.index("fulltext", FulltextIndex)
+    return [{"term": term, "score": round(score, 3), "snippet": snippet(db[term], query)}
+            for score, term in index.search(query, k)]
@@ -0,0 +1,141 @@
+# Metrics file
+# Collects request, template and external API timings and serves them at /metrics
+# in the Prometheus text format: https://prometheus.io/docs/instrumenting/exposition_formats/
+# With gunicorn, every worker writes its metrics to files in PROMETHEUS_MULTIPROC_DIR
+# (see gunicorn.conf.py) and /metrics adds them up over all workers
+
+from contextlib import contextmanager
+from os import environ
+from time import perf_counter
+from flask import g, request, Response
+from jinja2 import Template
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest, multiprocess
+from klimadiskurs.app import profiler
+
+# buckets in seconds, from fast static pages to Twitter API calls including the rate limit sleep
+BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 1.5, 2, 3, 5, 10, 30)
+
+REQUEST_TIME = Histogram("klimadiskurs_request_duration_seconds",
+                         "Time to answer a request", ["route", "method", "status"],
+                         buckets=BUCKETS)
+RENDER_TIME = Histogram("klimadiskurs_template_render_duration_seconds",
+                        "Time to render a Jinja template", ["template"], buckets=BUCKETS)
+UPSTREAM_TIME = Histogram("klimadiskurs_upstream_duration_seconds",
+                          "Time spent waiting for an external API", ["call"], buckets=BUCKETS)
+UPSTREAM_ERRORS = Counter("klimadiskurs_upstream_errors_total",
+                          "Failed calls to an external API", ["call"])
+SLEEP_TIME = Histogram("klimadiskurs_twitter_sleep_duration_seconds",
+                       "Time spent sleeping to avoid the Twitter rate limit", buckets=BUCKETS)
+CACHE_REQUESTS = Counter("klimadiskurs_cache_requests_total",
+                         "Cache lookups by cache and result (hit/miss)", ["cache", "result"])
+# 1 for the glossary version a worker currently serves, one series per worker (pid label)
+GLOSSARY_VERSION = Gauge("klimadiskurs_glossary_version_info",
+                         "Glossary version served by a worker", ["version"],
+                         multiprocess_mode="liveall")
+GLOSSARY_RELOADS = Counter("klimadiskurs_glossary_reloads_total",
+                           "Glossary reloads by result (ok/failed)", ["result"])
+BREAKER_REJECTIONS = Counter("klimadiskurs_breaker_rejections_total",
+                             "Calls not made because the API's circuit breaker was open",
+                             ["upstream"])
+
+# collectors of state that is kept outside of the metrics, e.g. the circuit breakers
+__collectors = []
+
+
+class TimedTemplate(Template):
+    """Jinja template that records its render time. Included templates are part of the
+    template that includes them, e.g. glossary.html is counted as home.html."""
+
+    def render(self, *args, **kwargs):
+        t0 = perf_counter()
+        try:
+            with profiler.phase(f"render:{self.name}"):
+                return super().render(*args, **kwargs)
+        finally:
+            RENDER_TIME.labels(self.name).observe(perf_counter() - t0)
+
+
+def init_app(app):
+    """Registers request timing and template timing with a Flask app.
+
+    Args:
+        app (Flask): The app.
+    """
+
+    app.jinja_env.template_class = TimedTemplate
+    app.before_request(__start_timer)
+    app.after_request(__record_request)
+
+def __start_timer():
+    g.request_start = perf_counter()
+
+def __record_request(response):
+    # label by URL rule instead of URL so /def/<term> is one time series, not one per term
+    route = request.url_rule.rule if request.url_rule else "<unmatched>"
+    if "request_start" in g:
+        REQUEST_TIME.labels(route, request.method, response.status_code) \
+                    .observe(perf_counter() - g.request_start)
+    return response
+
+@contextmanager
+def upstream(call):
+    """Context manager that times a call to an external API and counts it if it raises.
+    Exceptions are passed on, so existing error handling works as before.
+
+    Example:
+        with upstream("dwds"):
+            response = requests.get(url)
+
+    Args:
+        call (str): Name of the call, e.g. "dwds" or "github_update".
+    """
+
+    t0 = perf_counter()
+    try:
+        with profiler.phase(f"upstream:{call}"):
+            yield
+    except Exception:
+        UPSTREAM_ERRORS.labels(call).inc()
+        raise
+    finally:
+        UPSTREAM_TIME.labels(call).observe(perf_counter() - t0)
+
+def count_cache(cache, hit):
+    """Counts a cache lookup.
+
+    Args:
+        cache (str): Name of the cache.
+        hit (bool): Whether the lookup was a hit.
+    """
+
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+def register_collector(collector):
+    """Adds a collector to /metrics, e.g. for state that all workers share and that is read
+    when /metrics is requested (see breakers.py).
+
+    Args:
+        collector: Object with a collect() method that yields metric families.
+    """
+
+    __collectors.append(collector)
+    if not environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        REGISTRY.register(collector)
+
+def export():
+    """Returns all metrics in the Prometheus text format.
+    Aggregates over all gunicorn workers if PROMETHEUS_MULTIPROC_DIR is set.
+
+    Returns:
+        Response: text/plain response.
+    """
+
+    if environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        for collector in __collectors:
+            registry.register(collector)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
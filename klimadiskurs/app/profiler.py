@@ -0,0 +1,226 @@
+# Profiler file
+# Opt-in sampling profiler for single requests, e.g. a slow /def/<term> page in production
+# A request is profiled if its path starts with one of PROFILE_PATHS, or if PROFILE_SIGNED is 1
+# and it has a valid X-Profile-Token header (see make_token() below)
+# While a profiled request runs, a background thread samples its Python stack every few ms.
+# Each sample is tagged with the current phase: view logic, Jinja rendering, external API or sleep.
+# Reports are written to PROFILE_DIR:
+#   <name>.folded: stacks in the "folded" format for flamegraph.pl, speedscope.app or inferno
+#   <name>.json: time per phase in ms
+# If neither PROFILE_PATHS nor PROFILE_SIGNED is set, no hooks are installed at all.
+# With gevent workers, every request runs in a greenlet instead of a thread. The sampler then runs
+# whenever the request waits for I/O and records where it waits, CPU-bound code is not sampled.
+
+import json
+import os
+import re
+import sys
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from threading import Event, Thread, get_ident
+from time import perf_counter
+from flask import current_app, g, request
+from itsdangerous import BadSignature, TimestampSigner
+from klimadiskurs.config import PROFILE_DIR, PROFILE_PATHS, PROFILE_SIGNED
+
+try:
+    from gevent import monkey
+    from greenlet import getcurrent
+except ImportError:
+    monkey = None
+
+# seconds between two samples
+INTERVAL = 0.002
+# how long a signed token stays valid, in seconds
+TOKEN_MAX_AGE = 3600
+TOKEN_HEADER = "X-Profile-Token"
+
+# profiles of the requests that are currently being profiled, by thread id
+_active = dict()
+
+
+class Profile():
+    """Samples the stack of one thread and keeps track of the time spent in each phase."""
+
+    def __init__(self, path, interval=INTERVAL):
+        """Constructor. Call start() and stop() around the code that should be profiled.
+
+        Args:
+            path (str): Request path, used for the report name.
+            interval (float, optional): Seconds between two samples. Defaults to INTERVAL.
+        """
+
+        self.path = path
+        self.interval = interval
+        self.thread_id = get_ident()
+        # gevent workers: sys._current_frames() only sees OS threads, not greenlets
+        if monkey is not None and monkey.is_module_patched("threading"):
+            self.greenlet = getcurrent()
+        else:
+            self.greenlet = None
+        self.stacks = Counter()     # folded stack -> number of samples
+        self.phases = ["view"]      # stack of phases, the last one is the current phase
+        self.phase_times = Counter()
+        self.total = 0
+        self.__stopped = Event()
+        self.__sampler = Thread(target=self.__sample, daemon=True)
+
+    def start(self):
+        self.t0 = perf_counter()
+        self.__sampler.start()
+
+    def stop(self):
+        self.__stopped.set()
+        self.__sampler.join()
+        self.total = perf_counter() - self.t0
+
+    def breakdown(self):
+        """Time per phase in ms. Phases are grouped by their prefix, e.g. all "upstream:..."
+        phases are summed up as "upstream". Whatever is left is counted as "view".
+
+        Returns:
+            dict: {"total": ..., "view": ..., "render": ..., "upstream": ..., "details": {...}}
+        """
+
+        result = {"total": self.total * 1000, "view": self.total * 1000, "details": dict()}
+        for phase, seconds in self.phase_times.items():
+            group = phase.split(":")[0]
+            result[group] = result.get(group, 0) + seconds * 1000
+            result["details"][phase] = seconds * 1000
+            result["view"] -= seconds * 1000
+        return result
+
+    def write(self, directory):
+        """Writes the folded stacks and the breakdown to directory.
+
+        Args:
+            directory (str): Output directory, created if necessary.
+
+        Returns:
+            str: Path of the report without extension.
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        slug = re.sub(r"[^\w-]+", "_", self.path).strip("_") or "index"
+        name = os.path.join(directory, f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}-{slug}")
+        with open(name + ".folded", mode="w", encoding="utf-8") as f:
+            for stack, count in self.stacks.items():
+                f.write(f"{stack} {count}\n")
+        with open(name + ".json", mode="w", encoding="utf-8") as f:
+            json.dump({"path": self.path, "interval_ms": self.interval * 1000,
+                       "samples": sum(self.stacks.values()), "ms": self.breakdown()}, f, indent=2)
+        return name
+
+    def __sample(self):
+        while not self.__stopped.wait(self.interval):
+            if self.greenlet is not None:
+                frame = self.greenlet.gr_frame
+            else:
+                frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+                             f"{code.co_firstlineno})")
+                frame = frame.f_back
+            # the phase is the root frame so flame graphs are split by phase
+            stack.append(self.phases[-1])
+            self.stacks[";".join(reversed(stack))] += 1
+
+
+def phase(name):
+    """Context manager that marks a phase of the current request, e.g. "render:about.html".
+    Only the outermost phase is counted in the breakdown. If the request isn't being profiled,
+    this is a shared context manager that does nothing, so unprofiled requests don't pay for it.
+
+    Args:
+        name (str): "<group>:<detail>", e.g. "upstream:dwds".
+
+    Returns:
+        The context manager.
+    """
+
+    profile = _active.get(get_ident()) if _active else None
+    if profile is None:
+        return __NOTHING
+    return __timed_phase(profile, name)
+
+# returned by phase() for requests that aren't being profiled
+__NOTHING = nullcontext()
+
+@contextmanager
+def __timed_phase(profile, name):
+    """Measures a phase of a profiled request, see phase()."""
+
+    profile.phases.append(name)
+    t0 = perf_counter()
+    try:
+        yield
+    finally:
+        profile.phases.pop()
+        if len(profile.phases) == 1:
+            profile.phase_times[name] += perf_counter() - t0
+
+def make_token(path, secret_key):
+    """Creates a token for the X-Profile-Token header that enables profiling for one path.
+
+    Args:
+        path (str): Request path, e.g. "/def/Klimaleugner/".
+        secret_key (str): The app's SECRET_KEY.
+
+    Returns:
+        str: The token, valid for TOKEN_MAX_AGE seconds.
+    """
+
+    return TimestampSigner(secret_key, salt="profile").sign(path).decode("utf-8")
+
+def init_app(app):
+    """Registers the profiling hooks with a Flask app if profiling is enabled in the config.
+
+    Args:
+        app (Flask): The app.
+    """
+
+    if not PROFILE_PATHS and not PROFILE_SIGNED:
+        return
+    app.before_request(__start_profile)
+    app.teardown_request(__stop_profile)
+    app.logger.info(f"Profiling enabled, writing reports to {PROFILE_DIR}")
+
+def __selected():
+    """Whether the current request should be profiled."""
+
+    if PROFILE_PATHS and request.path.startswith(tuple(PROFILE_PATHS.split(","))):
+        return True
+    token = request.headers.get(TOKEN_HEADER)
+    if PROFILE_SIGNED and token:
+        signer = TimestampSigner(current_app.config["SECRET_KEY"], salt="profile")
+        try:
+            return signer.unsign(token, max_age=TOKEN_MAX_AGE).decode("utf-8") == request.path
+        except BadSignature:
+            current_app.logger.warning(f"Invalid profiling token for {request.path}")
+    return False
+
+def __start_profile():
+    if __selected():
+        g.profile = Profile(request.path)
+        _active[g.profile.thread_id] = g.profile
+        g.profile.start()
+
+def __stop_profile(exception=None):
+    profile = g.pop("profile", None)
+    if profile is None:
+        return
+    profile.stop()
+    _active.pop(profile.thread_id, None)
+    name = profile.write(PROFILE_DIR)
+    times = ", ".join(f"{k} {v:.0f}" for k, v in profile.breakdown().items() if k != "details")
+    current_app.logger.info(f"Profiled {profile.path} (ms): {times}. Report: {name}.folded")
+
+
+if __name__ == "__main__":
+    # print a token for the X-Profile-Token header, e.g.
+    # python -m klimadiskurs.app.profiler /def/Klimaleugner/
+    from klimadiskurs.config import Config
+    print(make_token(sys.argv[1], Config.SECRET_KEY))
@@ -0,0 +1,230 @@
+# Reloader file
+# Reloads the glossary while the app is running, so a changed glossary.json doesn't need a restart.
+# Every worker starts a watcher thread that checks the size and mtime of GLOSSARY_PATH and
+# GLOSSARY_SNAPSHOT every GLOSSARY_RELOAD_INTERVAL seconds. If they changed, glossary.json is
+# hashed, and only a new hash (not e.g. a touch) or a newly built snapshot of it leads to a reload.
+# The new glossary is opened with open_glossary() (and validated), and its views and the indexes
+# the old one had are built, all outside of the requests. Only then it replaces the old glossary
+# in db, with one reference assignment (GlossaryProxy.swap() in glossary.py). Requests that already
+# started finish with the old glossary. An invalid or half-written file is logged, and the old
+# glossary is kept until the file changes again.
+# In gevent workers the watcher is a greenlet, like the requests, because the locks of logging and
+# prometheus_client are gevent locks there, which a native thread must not use. Hashing and
+# loading, which would block the event loop, run in gevent's pool of native threads (load() only
+# uses the glossary modules, which have no gevent locks).
+# Every response has an X-Glossary-Version header, /version shows the version of the worker that
+# answers and /metrics the versions of all workers.
+
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+from time import perf_counter
+from klimadiskurs import db
+from klimadiskurs.config import GLOSSARY_PATH, GLOSSARY_RELOAD_INTERVAL, GLOSSARY_SNAPSHOT, \
+                                VALIDATE_GLOSSARY
+from klimadiskurs.glossary import GlossarySnapshot, open_glossary
+from klimadiskurs.app.metrics import GLOSSARY_RELOADS, GLOSSARY_VERSION
+
+try:
+    from gevent import monkey
+except ImportError:
+    monkey = None
+
+# glossary.json is hashed in chunks of this size
+HASH_CHUNK_SIZE = 1 << 20
+
+
+class Watcher():
+    """Reloads the glossary in db when its files change, see the description above."""
+
+    def __init__(self, logger, path=GLOSSARY_PATH, snapshot_path=GLOSSARY_SNAPSHOT,
+                 validate=VALIDATE_GLOSSARY, offload=None):
+        """Constructor. Remembers the state of the files the current glossary was loaded from.
+
+        Args:
+            logger (logging.Logger): Where reloads and errors are logged, e.g. app.logger.
+            path (str, optional): Path to glossary.json. Defaults to GLOSSARY_PATH.
+            snapshot_path (str, optional): Path to the snapshot. Defaults to GLOSSARY_SNAPSHOT.
+            validate (bool, optional): Whether to validate glossary.json. Defaults to
+                VALIDATE_GLOSSARY.
+            offload (function, optional): offload(function, *args) runs hashing and loading
+                and returns the result, e.g. in a native thread under gevent. Defaults to None =
+                call them directly.
+        """
+
+        self.logger = logger
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.validate = validate
+        self.offload = offload or (lambda function, *args: function(*args))
+        self.signature = self.__signature()
+        self.digest = file_digest(path)
+        self.reloads = 0
+
+    def __signature(self):
+        # size and mtime of both files, None for a missing file
+        signature = []
+        for path in (self.path, self.snapshot_path):
+            try:
+                stat = os.stat(path) if path else None
+                signature.append(stat and (stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def __snapshot_ready(self):
+        # whether a snapshot of the current glossary.json was built after it was loaded
+        if not self.snapshot_path or isinstance(db.current, GlossarySnapshot):
+            return False
+        try:
+            snapshot = GlossarySnapshot(self.snapshot_path)
+            source = os.stat(self.path)
+        except (OSError, ValueError):
+            return False
+        return (snapshot.source_size, snapshot.source_mtime_ns) == (source.st_size,
+                                                                    source.st_mtime_ns)
+
+    def check(self):
+        """Reloads the glossary if its files changed.
+
+        Returns:
+            bool: Whether a new glossary was swapped in.
+        """
+
+        signature = self.__signature()
+        if signature == self.signature:
+            return False
+        self.signature = signature
+        try:
+            digest = self.offload(file_digest, self.path)
+        except OSError as e:
+            self.logger.error(f"Cannot read {self.path}, keeping glossary {db.current.version}: {e}")
+            return False
+        if digest == self.digest and not self.__snapshot_ready():
+            return False
+
+        t0 = perf_counter()
+        previous = db.current
+        try:
+            glossary = self.offload(load, self.path, self.snapshot_path, self.validate, previous)
+        except (OSError, ValueError) as e:
+            # ValueError includes JSON syntax errors and InvalidGlossaryError
+            GLOSSARY_RELOADS.labels("failed").inc()
+            self.logger.error(f"Cannot reload {self.path}, keeping glossary {previous.version}: {e}")
+            return False
+        db.swap(glossary)
+        self.digest = digest
+        self.reloads += 1
+        GLOSSARY_RELOADS.labels("ok").inc()
+        GLOSSARY_VERSION.labels(previous.version).set(0)
+        GLOSSARY_VERSION.labels(glossary.version).set(1)
+        self.logger.info(f"Reloaded glossary {previous.version} -> {glossary.version} "
+                         f"({len(glossary)} entries) in {perf_counter() - t0:.2f} seconds")
+        return True
+
+    def run(self, interval):
+        """Checks the files every interval seconds, forever.
+
+        Args:
+            interval (float): Seconds between checks.
+        """
+
+        while True:
+            time.sleep(interval)
+            try:
+                self.check()
+            except Exception:
+                # the watcher must not die, the next check may succeed
+                self.logger.exception("Glossary reload failed")
+
+
+def file_digest(path):
+    """BLAKE2 hash of a file's content.
+
+    Args:
+        path (str): Path to the file.
+
+    Returns:
+        str: Hex digest.
+    """
+
+    digest = hashlib.blake2b()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load(path, snapshot_path, validate, previous):
+    """Opens a new glossary and builds its views and the indexes the previous one had.
+
+    Args:
+        path, snapshot_path, validate: See open_glossary().
+        previous (GlossaryViews): The current glossary.
+
+    Returns:
+        Glossary or GlossarySnapshot: The new glossary.
+    """
+
+    glossary = open_glossary(path, snapshot_path, validate)
+    glossary.warm(previous)
+    return glossary
+
+def __offload(function, *args):
+    # gevent workers: runs function in a native thread of gevent's pool, only the calling greenlet
+    # waits for it (the requests still share the GIL with it, which Python switches every few ms)
+    import gevent
+    def call():
+        # errors are handed to the greenlet, the pool would print them to stderr
+        try:
+            return function(*args), None
+        except Exception as e:
+            return None, e
+    result, error = gevent.get_hub().threadpool.apply(call)
+    if error is not None:
+        raise error
+    return result
+
+# watcher of this worker, started by init_app()
+__watcher = None
+
+def init_app(app):
+    """Adds the X-Glossary-Version header to all responses and starts the watcher thread,
+    once per worker, if GLOSSARY_RELOAD_INTERVAL is set.
+
+    Args:
+        app (Flask): The app.
+    """
+
+    global __watcher
+    app.after_request(__add_version)
+    GLOSSARY_VERSION.labels(db.current.version).set(1)
+    if GLOSSARY_RELOAD_INTERVAL > 0 and __watcher is None:
+        # under gevent, the patched Thread is a greenlet, see the description above
+        patched = monkey is not None and monkey.is_module_patched("threading")
+        __watcher = Watcher(app.logger, offload=__offload if patched else None)
+        threading.Thread(target=__watcher.run, args=(GLOSSARY_RELOAD_INTERVAL,),
+                         name="glossary-watcher", daemon=True).start()
+
+def __add_version(response):
+    # the version this request used, which is the current one unless it was reloaded meanwhile
+    response.headers["X-Glossary-Version"] = db.version
+    return response
+
+def status():
+    """The glossary this worker currently serves, for /version.
+
+    Returns:
+        dict: pid, version, number of entries, whether it is a snapshot, when it was loaded,
+        the reload interval and the number of reloads since the worker started.
+    """
+
+    glossary = db.current
+    return {"pid": os.getpid(),
+            "version": glossary.version,
+            "entries": len(glossary),
+            "snapshot": isinstance(glossary, GlossarySnapshot),
+            "loaded": datetime.fromtimestamp(db.loaded).isoformat(timespec="seconds"),
+            "reload_interval": GLOSSARY_RELOAD_INTERVAL,
+            "reloads": __watcher.reloads if __watcher else 0}
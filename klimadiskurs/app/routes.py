@@ -1,13 +1,28 @@
 # The heart of the app
 # Contains all routes/view functions
 
-from flask import current_app, Blueprint, request, send_from_directory
+from flask import abort, current_app, Blueprint, jsonify, redirect, request, send_from_directory, \
+                  url_for
 from flask.templating import render_template
 from collections import namedtuple
+from datetime import date
+from hashlib import sha1
+from os import path
+import random
+import threading
 from klimadiskurs import db
-from klimadiskurs.config import ENABLE_SUBMISSIONS
-from klimadiskurs.app.utils import home_route, query_db, get_github_file_decoded, get_dwds_link
-from klimadiskurs.app.utils_twitter import connect_to_twitter, query_tweets
+from klimadiskurs.config import ENABLE_SUBMISSIONS, GLOSSARY_PATH, SEARCH_INDEX_PATH, STATS_PATH
+from klimadiskurs.glossary import DWDS_NONE
+from klimadiskurs.app import breakers, fulltext, metrics, reloader, trends
+from klimadiskurs.app.caching import API_MAX_AGE, Validators, file_mtime
+from klimadiskurs.app.downloads import send_download
+from klimadiskurs.app.exports import send_export
+from klimadiskurs.app.stats import load_stats
+from klimadiskurs.app.suggestions import CACHE_MAX_AGE, MAX_K, TOP_K, complete, suggest
+from klimadiskurs.app.metrics import upstream
+from klimadiskurs.app.utils import home_route, query_db, get_github_file_decoded, get_dwds_link, \
+                                   github_lock, repo
+from klimadiskurs.app.utils_twitter import connect_to_twitter, query_tweets, tweets_fetched
 
 # the following lines are executed only on server (re)start:
 # 1. initialize blueprint (see __init__.py)
@@ -20,6 +35,21 @@ twitter_api = connect_to_twitter()
 # 3. get list of tweeted terms from GitHub
 # this means the glossary view will only be updated on Heroku dyno cycling (1x/day)!
 tweeted = [t.strip() for t in get_github_file_decoded("tweeted_terms.txt").split()]
+# version of the list for HTTP validators (see caching.py), workers may have loaded different lists
+tweeted_version = sha1("\n".join(tweeted).encode("utf-8")).hexdigest()[:12]
+
+# 4. get weekly tweet counts from GitHub (see trends.py), same as above
+# in the background: the trends are optional, /def/<term> shows no trend until the file is there
+# and if GitHub fails, the worker keeps serving the file of its predecessor if there is one
+def __download_trends():
+    try:
+        with breakers.GITHUB, github_lock, upstream("github_get"):
+            trends.download(repo)
+    except Exception as e:
+        print("ERROR: Could not download the weekly tweet counts")
+        print(e)
+
+threading.Thread(target=__download_trends, name="trends-download", daemon=True).start()
 
 @glossary.route("/", methods=["GET", "POST"])
 def home():
@@ -28,9 +58,10 @@ def home():
     Renders: home.html
     """
 
+    validators = __validators()
     # display full database sorted by newest entries
-    glossary = sorted(db, key=lambda k: db[k]["id"], reverse=True)
-    return home_route("home.html", glossary, tweeted)
+    return validators.not_modified() or \
+           validators.apply(home_route("home.html", db.newest, tweeted))
 
 @glossary.route("/search/<query>", methods=["GET", "POST"])
 @glossary.route("/search/<query>/", methods=["GET", "POST"])
@@ -46,15 +77,22 @@ def search(query):
     Renders: searchresult.html
     """
 
+    validators = __validators()
+    not_modified = validators.not_modified()
+    if not_modified:
+        return not_modified
+
     # if search field is empty, search.js puts "None" as placeholder
     # in that case return all entries sorted alphabetically (takes a few seconds)
     if query == "None":
-        return home_route("searchresult.html", sorted(db), tweeted)
+        return validators.apply(home_route("searchresult.html", sorted(db), tweeted))
 
     results = query_db(query)
     # sort results alphabetically
     results = sorted(results, key=lambda k: results[k]["term"])
-    return home_route("searchresult.html", results, tweeted)
+    # "did you mean" if there are no results, e.g. for typos
+    suggestions = suggest(query) if not results else []
+    return validators.apply(home_route("searchresult.html", results, tweeted, suggestions))
 
 @glossary.route("/api")
 def api():
@@ -63,6 +101,9 @@ def api():
 
     Returns:
         dict: The search results dictionary (filtered database).
+        If there are no results, the only key is "_suggestions" with a list of similar terms.
+        Terms always start with "Klima", so this key can't be confused with a result.
+        Responses may be cached for API_MAX_AGE seconds and revalidated with their ETag.
     """
 
     # get user query from form field
@@ -70,9 +111,96 @@ def api():
     user_query = request.args.get("query")
     current_app.logger.info(f"API call: {user_query}")
 
+    validators = Validators(db.version, modified=[db.source_mtime_ns / 1e9], page=False,
+                            max_age=API_MAX_AGE)
+    not_modified = validators.not_modified()
+    if not_modified:
+        return not_modified
     # same logic as /search
-    if user_query == "None": return db
-    return query_db(user_query)
+    if user_query == "None": return validators.apply(dict(db.items()))
+    results = query_db(user_query)
+    if not results:
+        return validators.apply({"_suggestions": suggest(user_query)})
+    return validators.apply(results)
+
+@glossary.route("/api/suggest")
+def api_suggest():
+    """Autocomplete API used by search.js while the user types (/api/suggest?q=<prefix>&k=<k>).
+    Only returns term names, so it is cheap enough to call on every keystroke. Responses may be
+    cached by the browser for CACHE_MAX_AGE seconds and revalidated with their ETag.
+
+    Returns:
+        Response: JSON list of up to k (default TOP_K, max. MAX_K) terms that start with the 
+        prefix, terms with definition pages first. 
+    """
+
+    prefix = request.args.get("q", "")
+    k = max(1, min(request.args.get("k", TOP_K, type=int), MAX_K))
+    response = jsonify(complete(prefix, tweeted, k))
+    key = (db.version, tweeted_version, k, prefix.strip().lower())
+    response.set_etag(sha1(repr(key).encode("utf-8")).hexdigest()[:20])
+    response.cache_control.public = True
+    response.cache_control.max_age = CACHE_MAX_AGE
+    return response.make_conditional(request)
+
+@glossary.route("/api/search-index")
+def api_search_index():
+    """Search index used by search.js to search in the browser (/api/search-index).
+    Built by tools/create_search_index.py and compressed like the downloads (see downloads.py).
+    Browsers keep it, but revalidate it on every page load, which is a 304 while it is unchanged.
+
+    Returns:
+        Response: JSON search index, 404 if it hasn't been built (search.js then uses /api).
+    """
+
+    if not path.isfile(SEARCH_INDEX_PATH):
+        abort(404)
+    response = send_download("search", SEARCH_INDEX_PATH)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response
+
+@glossary.route("/api/fulltext")
+def api_fulltext():
+    """Full-text search API (/api/fulltext?q=<words>&k=<k>).
+    Searches the definitions, example sentences and sources of all entries, see fulltext.py.
+
+    Returns:
+        Response: JSON list of up to k (default 10, max. 50) results, best first. 
+        Each result has the keys "term", "score" and "snippet" (HTML with the matches in <mark>).
+    """
+
+    query = request.args.get("q", "")
+    k = max(1, min(request.args.get("k", fulltext.TOP_K, type=int), fulltext.MAX_K))
+    current_app.logger.info(f"Full-text API call: {query}")
+    return jsonify(fulltext.search(query, k))
+
+@glossary.route("/api/trends")
+def api_trends():
+    """Tweet counts API (/api/trends?term=<term>&weeks=<weeks>).
+    Weekly number of German tweets per term, collected by cron_tweets.py (see trends.py).
+    Responses may be cached for CACHE_MAX_AGE seconds and revalidated with their ETag, the counts
+    only change when the database is downloaded at startup.
+
+    Returns:
+        Response: JSON object term -> list of [week, count] (e.g. ["2022-W07", 12]), oldest first, 
+        for the last <weeks> weeks (default 26, max. 260). All terms, or only the given term in any 
+        spelling (empty if it isn't in the glossary).
+    """
+
+    weeks = max(1, min(request.args.get("weeks", trends.TREND_WEEKS, type=int), trends.MAX_WEEKS))
+    term = request.args.get("term")
+    if term is None:
+        response = jsonify(trends.trends(weeks))
+    else:
+        term = db.term_index.lookup(term)
+        response = jsonify(trends.trends(weeks, term=term) if term else {})
+    # the weeks are counted back from today
+    key = (file_mtime(trends.TRENDS_PATH), trends.week_of(date.today()), weeks, term)
+    response.set_etag(sha1(repr(key).encode("utf-8")).hexdigest()[:20])
+    response.cache_control.public = True
+    response.cache_control.max_age = trends.CACHE_MAX_AGE
+    return response.make_conditional(request)
 
 @glossary.route("/def/<term>")
 @glossary.route("/def/<term>/")
@@ -86,56 +214,97 @@ def define(term):
     Renders: definitions.html
     """
 
-    # check if term is in database. if not, show error page
-    if term.lower() not in db and term.capitalize() not in db:
+    # check if term is in database in any spelling, e.g. "klima-luege" -> "Klimalüge"
+    # if not, show error page
+    found = db.term_index.lookup(term)
+    if found is None:
         # route to error page if term is not in database
         message = f"Der Begriff \"{term.capitalize()}\" ist noch nicht in unserer Datenbank."
         if ENABLE_SUBMISSIONS:
             message += " Sie können ihn auf der Startseite hinzufügen."
         return render_template("errorpage.html", message=message)
+    term = found
+
+    # the page can only be validated while its tweets are cached, see utils_twitter.py
+    if tweets_fetched(term) is not None:
+        not_modified = __define_validators(term).not_modified()
+        if not_modified:
+            return not_modified
 
-    # query Twitter API for tweets
+    # query Twitter API for tweets (or take them from the cache)
     tweets = query_tweets(term, twitter_api)
 
-    # query DWDS API to see if the term is in the dictionary
-    dwds = get_dwds_link(term)
+    entry = db[term]
 
-    try:
-        entry = db[term.capitalize()]
-    except KeyError:
-        entry = db[term.lower()]
+    # link to the term's DWDS dictionary entry, stored in the glossary by tools/create_dwds.py
+    # only entries that were never looked up ask the DWDS API
+    dwds = entry["dwds"]
+    if dwds is None:
+        dwds = get_dwds_link(term)
+    elif dwds == DWDS_NONE:
+        dwds = None
+
+    # weekly number of tweets, drawn as a sparkline if the term was tweeted at all
+    trend = trends.trend(term)
+    if not any(count for _, count in trend):
+        trend = []
+    sparkline = trends.sparkline([count for _, count in trend])
 
     # defined terms is a list of terms with definitions
     # if these appear in this term's definition, they are hyperlinked
-    defined_terms = [term for term in db.keys() if db[term]["definition"]]
-    return render_template("definitions.html", term=term.capitalize(), entry=entry,
-                           dwds=dwds, defined=defined_terms, tweets=tweets)
+    page = render_template("definitions.html", term=term, entry=entry,
+                           dwds=dwds, defined=db.defined, tweets=tweets,
+                           trend=trend, sparkline=sparkline)
+    if tweets_fetched(term) is None:
+        # no tweets were cached, e.g. Twitter failed, so there is nothing to revalidate against
+        return page
+    return __define_validators(term).apply(page)
 
 @glossary.route("/about")
 @glossary.route("/about/")
 def about():
     """About route (/about). 
-    Calculates glossary statistics.
+    Calculates glossary statistics and shows the corpus statistics from tools/create_stats.py.
 
     Renders: about.html
     """
 
+    validators = __validators(file_mtime(STATS_PATH))
+    not_modified = validators.not_modified()
+    if not_modified:
+        return not_modified
+
     Statistics = namedtuple("Statistics", "no_entries no_definitions no_tweeted \
                                            pct_pro pct_contra pct_both")
 
     n = len(db)
+    # number of entries per association, e.g. {(0,): 200, (0, 1): 35, (1,): 13}
+    groups = db.association_counts
 
     stats = Statistics(n,   # total entries in db
-                       sum(1 for v in db.values() if v["definition"]),  # with definition
+                       len(db.defined),  # with definition
                        len(tweeted),    # with recent tweets
                        # percentage of entries per group
-                       int(sum(100 for v in db.values() if 1 in v["association"])/n),
-                       int(sum(100 for v in db.values() if 0 in v["association"])/n),
+                       int(sum(100*c for a, c in groups.items() if 1 in a)/n),
+                       int(sum(100*c for a, c in groups.items() if 0 in a)/n),
                        # percentage of shared terms between both groups
-                       int(sum(100 for v in db.values() if v["association"] == [0, 1])/n)
+                       int(100*groups[(0, 1)]/n)
                        )
 
-    return render_template("about.html", stats=stats)
+    return validators.apply(render_template("about.html", stats=stats, corpus=load_stats()))
+
+@glossary.route("/random")
+def random_entry():
+    """Random route (/random), the "random" button.
+    Redirects to a random entry that has a definition. Not cached, so every click leads to
+    another entry, and the pages with the button can be revalidated (see caching.py).
+    """
+
+    # if no entry has a definition, just use "Klimaleugner"
+    term = random.choice(db.defined) if db.defined else "Klimaleugner"
+    response = redirect(url_for("glossary.define", term=term))
+    response.cache_control.no_store = True
+    return response
 
 @glossary.route("/download")
 @glossary.route("/download/")
@@ -150,18 +319,57 @@ def download():
 @glossary.route("/download/wordlist")
 def download_wordlist():
     """Wordlist download route (/download/wordlist).
-    Returns wordlist.txt from tools/raw_data.
+    Returns wordlist.txt from tools/raw_data, compressed if the client accepts it 
+    (see downloads.py).
     """
     
-    return send_from_directory("../tools/raw_data", "wordlist.txt")
+    return send_download("wordlist", 
+                         path.join(current_app.root_path, "../tools/raw_data/wordlist.txt"))
 
 @glossary.route("/download/json")
 def download_json():
     """Database download route (/download/json).
-    Returns glossary.json from static/data.
+    Returns glossary.json from static/data (or the file configured in GLOSSARY_PATH), 
+    minified and compressed if the client accepts it (see downloads.py).
     """
     
-    return send_from_directory("static/data", "glossary.json")
+    return send_download("json", GLOSSARY_PATH)
+
+@glossary.route("/download/<any(tsv, csv, ndjson):format>")
+def download_export(format):
+    """Export download route (/download/tsv, /download/csv, /download/ndjson).
+    Returns all entries, or only the search results if a query is given 
+    (e.g. /download/csv?query=leugner), in the given format. See exports.py.
+    """
+
+    return send_export(format, request.args.get("query"))
+
+@glossary.route("/metrics")
+def metrics_route():
+    """Metrics route (/metrics).
+    Request, template and external API timings in the Prometheus text format, see metrics.py.
+    This route is not displayed on the website and only meant for monitoring.
+    """
+
+    return metrics.export()
+
+@glossary.route("/version")
+def version_route():
+    """Version route (/version).
+    The glossary version served by the worker that answers, see reloader.py.
+    This route is not displayed on the website and only meant for monitoring.
+    """
+
+    return jsonify(reloader.status())
+
+@glossary.route("/breakers")
+def breakers_route():
+    """Circuit breakers route (/breakers).
+    The state of the circuit breakers of the external APIs, shared by all workers, see breakers.py.
+    This route is not displayed on the website and only meant for monitoring.
+    """
+
+    return jsonify(breakers.status())
 
 @glossary.route("/download/submissions")
 def download_submissions():
@@ -171,9 +379,25 @@ def download_submissions():
     This "secret" route is not displayed on the website and only for internal use.
     """
 
-    submissions = get_github_file_decoded("submissions.tsv")
+    try:
+        with breakers.GITHUB:
+            submissions = get_github_file_decoded("submissions.tsv")
+    except breakers.CircuitOpenError:
+        abort(503)
     # creates the file in static/data folder where it is deleted once per day when the dyno cycles
     # see Heroku ephemeral disk: https://devcenter.heroku.com/articles/active-storage-on-heroku 
     with open("klimadiskurs/static/data/submissions.tsv", mode="w", encoding="utf-8") as f:
         f.write(submissions)
     return send_from_directory("static/data", "submissions.tsv")
+
+def __validators(*versions):
+    """HTTP validators of a page made of the glossary, the tweeted terms and the data with
+    the given versions, e.g. modification times (None for missing data), see caching.py."""
+
+    return Validators(db.version, tweeted_version, *versions)
+
+def __define_validators(term):
+    """HTTP validators of /def/<term>: the glossary, the tweeted terms, the cached tweets and the
+    weekly tweet counts."""
+
+    return __validators(tweets_fetched(term), file_mtime(trends.TRENDS_PATH))
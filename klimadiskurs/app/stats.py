@@ -0,0 +1,46 @@
+# Stats file
+# Corpus statistics for the about page (term frequencies, terms typical of each group)
+# They are computed offline by tools/create_stats.py from the corpus, which is not available on
+# the server, and stored in STATS_PATH. The parsed file is cached and only reloaded when it changes,
+# so the about page doesn't compute anything per request.
+# If the file is missing or has another format version, the about page shows the glossary
+# statistics only.
+
+import json
+import os
+from klimadiskurs import db
+from klimadiskurs.config import STATS_PATH
+
+# format version of the stats file, must match tools/create_stats.py
+VERSION = 1
+
+# parsed stats file, reloaded when the file or the glossary (see app/reloader.py) changes
+__stats = {"key": None, "data": None}
+
+
+def load_stats():
+    """Returns the corpus statistics, see tools/create_stats.py for the format.
+    Lists only contain terms that are in the glossary.
+
+    Returns:
+        dict: Parsed stats file, None if there is none.
+    """
+
+    try:
+        key = (os.stat(STATS_PATH).st_mtime_ns, db.version)
+        if key != __stats["key"]:
+            with open(STATS_PATH, encoding="utf-8") as f:
+                __stats.update(key=key, data=__prepare(json.load(f)))
+    except (OSError, ValueError):
+        __stats.update(key=None, data=None)
+    return __stats["data"]
+
+def __prepare(stats):
+    """Checks the format version and removes terms that are no longer in the glossary."""
+
+    if stats.get("version") != VERSION:
+        return None
+    stats["frequent"] = [t for t in stats["frequent"] if t in db]
+    stats["distinctive"] = {group: [t for t in terms if t in db]
+                            for group, terms in stats["distinctive"].items()}
+    return stats
@@ -0,0 +1,184 @@
+# Suggestions file
+# 1. "Did you mean" suggestions for searches without results, e.g. "Klimaleuger" -> "Klimaleugner"
+# Terms and their spellings are indexed by character trigrams. A query is compared with the terms
+# that share at least one trigram with it, ranked by the share of common trigrams.
+# All terms start with "Klima", so the prefix is removed before indexing. Otherwise every term
+# would share the trigrams of "klima" with every query, and "leuger" (no prefix) works as well.
+# 2. Autocomplete for search-as-you-type (/api/suggest), e.g. "klimale" -> "Klimaleugner", ...
+# Terms and spellings are kept in sorted lists, so the terms with a prefix are found by bisection.
+# There is one list per rank (see PrefixIndex), so the best k terms are the first k matches.
+
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from itertools import chain, islice
+from klimadiskurs import db
+from klimadiskurs.normalization import PREFIX, normalize
+
+# number of suggestions
+TOP_K = 5
+# minimum similarity (Dice coefficient of the trigram sets) for a suggestion
+MIN_SIMILARITY = 0.3
+# maximum k for /api/suggest
+MAX_K = 20
+# seconds browsers and proxies may cache /api/suggest responses without revalidating, like /api.
+# The glossary is reloaded when glossary.json changes (see reloader.py), so completions are at most
+# this old, afterwards they are revalidated with the ETag, which changes with the glossary version
+CACHE_MAX_AGE = 60
+# highest character, every key with a prefix sorts before prefix + MAX_CHAR
+MAX_CHAR = "\U0010ffff"
+
+
+class TrigramIndex():
+    """Maps the trigrams of all terms and spellings to the terms that contain them."""
+
+    def __init__(self, glossary):
+        """Constructor. Builds the index.
+
+        Args:
+            glossary (Mapping): The glossary, e.g. db.
+        """
+
+        self.version = glossary.version
+        self.postings = defaultdict(list)   # trigram -> indices into self.words
+        self.words = []                     # (term, number of trigrams) per indexed word
+        for term in glossary:
+            words = {head(s) for s in (term, *glossary[term]["spellings"])}
+            for word in words:
+                grams = trigrams(word)
+                for gram in grams:
+                    self.postings[gram].append(len(self.words))
+                self.words.append((term, len(grams)))
+
+    def search(self, query, k=TOP_K):
+        """Returns the k terms that are most similar to query.
+
+        Args:
+            query (str): User input.
+            k (int, optional): Maximum number of terms. Defaults to TOP_K.
+
+        Returns:
+            list(str): Terms, most similar first.
+        """
+
+        grams = trigrams(head(query))
+        # number of shared trigrams per indexed word, counted in C by Counter
+        shared = Counter(chain.from_iterable(self.postings.get(gram, ()) for gram in grams))
+
+        # best similarity per term, spellings of the same term don't count twice
+        # a word with n shared trigrams can't score higher than 2n / (n + len(grams)),
+        # so words with too few shared trigrams are skipped without looking them up
+        min_shared = MIN_SIMILARITY * len(grams) / (2 - MIN_SIMILARITY)
+        scores = dict()
+        for i, n in shared.items():
+            if n < min_shared:
+                continue
+            term, size = self.words[i]
+            score = 2 * n / (len(grams) + size)
+            if score >= MIN_SIMILARITY and score > scores.get(term, 0):
+                scores[term] = score
+        return sorted(scores, key=lambda t: (-scores[t], t))[:k]
+
+
+class PrefixIndex():
+    """Sorted normalized terms and spellings (see normalization.py), split by rank:
+    0 = term has a definition or sources (i.e. a definition page), 1 = tweeted, 2 = other terms.
+    Within a rank terms are sorted alphabetically.
+    """
+
+    def __init__(self, glossary, tweeted):
+        """Constructor. Builds the index.
+
+        Args:
+            glossary (Mapping): The glossary, e.g. db.
+            tweeted (list(str)): Tweeted terms.
+        """
+
+        self.version = glossary.version
+        tweeted = set(tweeted)
+        ranks = ([], [], [])
+        for term in glossary:
+            entry = glossary[term]
+            if entry["definition"] or entry["sources"]:
+                rank = ranks[0]
+            elif term in tweeted:
+                rank = ranks[1]
+            else:
+                rank = ranks[2]
+            rank.extend((normalize(s), term) for s in {term, *entry["spellings"]})
+        # (key, term) pairs, keys separately for bisect
+        self.ranks = [sorted(r) for r in ranks]
+        self.keys = [[key for key, _ in r] for r in self.ranks]
+
+    def complete(self, prefix, k=TOP_K):
+        """Returns the k best terms that start with prefix.
+
+        Args:
+            prefix (str): Normalized user input.
+            k (int, optional): Maximum number of terms. Defaults to TOP_K.
+
+        Returns:
+            list(str): Terms, best rank first.
+        """
+
+        results = []
+        for keys, pairs in zip(self.keys, self.ranks):
+            start = bisect_left(keys, prefix)
+            end = bisect_left(keys, prefix + MAX_CHAR, start)
+            # a term can match with several spellings
+            for _, term in islice(pairs, start, end):
+                if term not in results:
+                    results.append(term)
+                    if len(results) == k:
+                        return results
+        return results
+
+
+def head(word):
+    """Normalizes a word and removes the "Klima" prefix, e.g. "Klima-Leugner" -> "leugner"."""
+
+    word = normalize(word)
+    if word.startswith(PREFIX):
+        word = word[len(PREFIX):]
+    return word
+
+def trigrams(word):
+    """Set of character trigrams, padded so that the first letters count more,
+    e.g. "leugner" -> {"  l", " le", "leu", ..., "er "}."""
+
+    word = f"  {word} "
+    return {word[i:i+3] for i in range(len(word) - 2)}
+
+def suggest(query, k=TOP_K):
+    """Terms that the user may have meant with query.
+
+    Args:
+        query (str): User input.
+        k (int, optional): Maximum number of terms. Defaults to TOP_K.
+
+    Returns:
+        list(str): Up to k terms, most similar first.
+    """
+
+    # built on first use, see GlossaryViews.index()
+    return db.index("trigrams", TrigramIndex).search(query, k)
+
+def complete(prefix, tweeted, k=TOP_K):
+    """Terms that start with prefix, for autocomplete.
+    "Klima" can be left out, e.g. "leug" -> "Klimaleugner".
+
+    Args:
+        prefix (str): User input.
+        tweeted (list(str)): Tweeted terms, ranked after terms with a definition page.
+        k (int, optional): Maximum number of terms. Defaults to TOP_K.
+
+    Returns:
+        list(str): Up to k terms, terms with definition pages first.
+    """
+
+    index = db.index("prefixes", PrefixIndex, tweeted)
+    prefix = normalize(prefix)
+    if not prefix:
+        return []
+    if not prefix.startswith(PREFIX) and not PREFIX.startswith(prefix):
+        prefix = PREFIX + prefix
+    return index.complete(prefix, k)
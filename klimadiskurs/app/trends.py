@@ -0,0 +1,214 @@
+# Trends file
+# Weekly number of German tweets per term, shown on /def/<term> and served by /api/trends
+# cron_tweets.py asks Twitter's tweet counts endpoint how often each term was tweeted per day and
+# adds up the days per ISO week. The weeks are stored in an SQLite database (TRENDS_PATH) with one
+# row per term and week. The primary key (term, week) is the index of all queries: the trend of a
+# term is one range scan, and weeks are strings like "2022-W07" that sort chronologically.
+# Heroku's disk is not persistent, so the database is kept in the GitHub files repository like
+# tweeted_terms.txt. The cron job updates it there, every worker downloads it in the background at
+# startup (see routes.py) and only reads it, through one read-only connection (see __reader()).
+
+import os
+import sqlite3
+import tempfile
+from base64 import b64decode
+from datetime import date, timedelta
+from pathlib import Path
+from github import UnknownObjectException
+from klimadiskurs.config import TRENDS_PATH
+
+# name of the database in the GitHub files repository
+GITHUB_FILE = "tweet_counts.sqlite"
+# number of weeks shown on /def/<term> and returned by /api/trends by default
+TREND_WEEKS = 26
+# maximum weeks for /api/trends
+MAX_WEEKS = 5 * 52
+# seconds browsers and proxies may cache /api/trends responses, the counts only change weekly
+CACHE_MAX_AGE = 24 * 60 * 60
+# size of the sparkline on /def/<term> in SVG units
+SPARKLINE_WIDTH = 300
+SPARKLINE_HEIGHT = 40
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS weekly_counts (
+    term TEXT NOT NULL,
+    week TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (term, week)
+) WITHOUT ROWID
+"""
+
+
+def week_of(day):
+    """ISO week of a date, e.g. date(2022, 2, 14) -> "2022-W07"."""
+
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+def connect(path=TRENDS_PATH, readonly=True):
+    """Opens the database.
+
+    Args:
+        path (str, optional): Path to the database. Defaults to TRENDS_PATH.
+        readonly (bool, optional): If False, the database is created if it doesn't exist.
+            Defaults to True.
+
+    Returns:
+        sqlite3.Connection: The connection.
+
+    Raises:
+        sqlite3.OperationalError: If readonly and the database doesn't exist.
+    """
+
+    if readonly:
+        # a worker's requests share the connection, it may be used by threads of the sync workers
+        return sqlite3.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True,
+                               check_same_thread=False)
+    connection = sqlite3.connect(path)
+    connection.execute(SCHEMA)
+    return connection
+
+def add_counts(connection, term, counts):
+    """Stores the weekly counts of a term, replacing counts of the same weeks.
+
+    Args:
+        connection (sqlite3.Connection): Writable connection, see connect().
+        term (str): The term.
+        counts (dict(str, int)): Number of tweets per week, e.g. {"2022-W07": 12}.
+    """
+
+    with connection:
+        connection.executemany(
+            "INSERT INTO weekly_counts (term, week, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (term, week) DO UPDATE SET count = excluded.count",
+            [(term, week, count) for week, count in counts.items()])
+
+def trend(term, weeks=TREND_WEEKS, path=TRENDS_PATH):
+    """Weekly counts of a term.
+
+    Args:
+        term (str): The term.
+        weeks (int, optional): Number of weeks up to today. Defaults to TREND_WEEKS.
+        path (str, optional): Path to the database. Defaults to TRENDS_PATH.
+
+    Returns:
+        list(tuple(str, int)): (week, count), oldest first. Weeks that weren't counted are missing.
+        Empty if there is no database.
+    """
+
+    return trends(weeks, path, term).get(term, [])
+
+def trends(weeks=TREND_WEEKS, path=TRENDS_PATH, term=None):
+    """Weekly counts of all terms, or of one term.
+
+    Args:
+        weeks (int, optional): Number of weeks up to today. Defaults to TREND_WEEKS.
+        path (str, optional): Path to the database. Defaults to TRENDS_PATH.
+        term (str, optional): Only return this term. Defaults to None = all terms.
+
+    Returns:
+        dict(str, list(tuple(str, int))): Term -> (week, count), oldest first.
+    """
+
+    first = week_of(date.today() - timedelta(weeks=weeks - 1))
+    query = "SELECT term, week, count FROM weekly_counts WHERE week >= ?"
+    params = [first]
+    if term is not None:
+        query += " AND term = ?"
+        params.append(term)
+    result = dict()
+    try:
+        for t, week, count in __reader(path).execute(query + " ORDER BY term, week", params):
+            result.setdefault(t, []).append((week, count))
+    # not downloaded (yet), see routes.py --> no trends
+    except (OSError, sqlite3.Error):
+        return dict()
+    return result
+
+# read-only connection of this worker and the file it was opened for, see __reader()
+__connection = None
+__connection_file = None
+
+def __reader(path):
+    """Read-only connection to the database, shared by all requests of the worker.
+    It is opened again when download() replaced the file, the old one stays open until then.
+
+    Args:
+        path (str): Path to the database.
+
+    Returns:
+        sqlite3.Connection: The connection.
+
+    Raises:
+        OSError: If the database doesn't exist.
+        sqlite3.Error: If it can't be opened.
+    """
+
+    global __connection, __connection_file
+    stat = os.stat(path)
+    file = (os.path.abspath(path), stat.st_ino, stat.st_mtime_ns)
+    if file != __connection_file:
+        __connection = connect(path)
+        __connection_file = file
+    return __connection
+
+def sparkline(counts, width=SPARKLINE_WIDTH, height=SPARKLINE_HEIGHT):
+    """Points of an SVG polyline for a series of counts, the highest count at the top.
+
+    Args:
+        counts (list(int)): The counts, oldest first.
+        width (int, optional): Width of the line. Defaults to SPARKLINE_WIDTH.
+        height (int, optional): Height of the line. Defaults to SPARKLINE_HEIGHT.
+
+    Returns:
+        str: Points attribute, e.g. "0,40 150,0 300,20".
+    """
+
+    if not counts:
+        return ""
+    step = width / max(len(counts) - 1, 1)
+    top = max(max(counts), 1)
+    return " ".join(f"{i*step:g},{height - height*c/top:g}" for i, c in enumerate(counts))
+
+def download(repo, path=TRENDS_PATH):
+    """Replaces the local database with the one from the GitHub files repository.
+    Several workers may download at the same time, so the file is replaced atomically.
+
+    Args:
+        repo (github.Repository.Repository): The files repository.
+        path (str, optional): Local path. Defaults to TRENDS_PATH.
+
+    Returns:
+        bool: False if there is no database on GitHub yet.
+    """
+
+    try:
+        file = repo.get_contents(GITHUB_FILE)
+    except UnknownObjectException:
+        return False
+    # the contents API only includes files up to 1 MB, larger ones are read as git blobs
+    if file.encoding == "base64":
+        content = file.decoded_content
+    else:
+        content = b64decode(repo.get_git_blob(file.sha).content)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    os.replace(temp_path, path)
+    return True
+
+def upload(repo, path=TRENDS_PATH):
+    """Commits the local database to the GitHub files repository.
+
+    Args:
+        repo (github.Repository.Repository): The files repository.
+        path (str, optional): Local path. Defaults to TRENDS_PATH.
+    """
+
+    with open(path, "rb") as f:
+        content = f.read()
+    try:
+        file = repo.get_contents(GITHUB_FILE)
+        repo.update_file(file.path, "weekly tweet counts", content, file.sha)
+    except UnknownObjectException:
+        repo.create_file(GITHUB_FILE, "weekly tweet counts", content)
@@ -1,21 +1,32 @@
 from flask import current_app, flash, json, redirect, render_template, url_for
 from github import Github
-import random
 import re
 import requests
+from threading import Lock
 from klimadiskurs import db
+from klimadiskurs.app import breakers
 from klimadiskurs.app.forms import EntrySubmitForm
-from klimadiskurs.config import ENABLE_SUBMISSIONS, ITEMS_PER_PAGE, GITHUB_TOKEN
-
-github = Github(GITHUB_TOKEN)
+from klimadiskurs.app.metrics import upstream
+from klimadiskurs.normalization import spellings
+from klimadiskurs.config import ENABLE_SUBMISSIONS, ITEMS_PER_PAGE, GITHUB_TOKEN, GITHUB_API_URL, \
+                                GITHUB_TIMEOUT, DWDS_API_URL, DWDS_TIMEOUT
+
+github = Github(GITHUB_TOKEN, base_url=GITHUB_API_URL, timeout=GITHUB_TIMEOUT)
+# PyGithub sends all requests of a client over one persistent connection, so requests
+# that run at the same time (gevent workers, see gunicorn.conf.py) must take turns
+github_lock = Lock()
+# not through the GitHub circuit breaker (see breakers.py): the app can't start without the repo,
+# and a breaker that was opened by a worker that failed to start would keep the next ones from
+# trying again
 try:
-    repo = github.get_repo("noelsimmel/klimadiskurs-files")
+    with upstream("github_get"):
+        repo = github.get_repo("noelsimmel/klimadiskurs-files")
 except github.GithubException.BadCredentialsException:
     current_app.logger.error("Bad GitHub credentials. Maybe the personal access token has expired.")
 
-def home_route(template, entries, tweeted):
+def home_route(template, entries, tweeted, suggestions=()):
     """Route to the home page.
-    Handles new term submissions and random button.
+    Handles new term submissions.
     Separate function because this logic is used by / and /search routes. 
 
 
@@ -23,6 +34,8 @@ def home_route(template, entries, tweeted):
         template (str): HTML template to render.
         entries (dict): Glossary (for home) or subset (for search results) to display.
         tweeted (list(str)): List of tweeted terms. 
+        suggestions (list(str), optional): Similar terms if a search has no results. 
+            Defaults to ().
 
     Renders:
         template
@@ -36,19 +49,15 @@ def home_route(template, entries, tweeted):
             send_submission(form)
             return redirect(url_for("glossary.home"))
 
-    # select random entry that has a definition for the "random" button
-    try:
-        random_entry = random.choice(list({k for k, v in db.items() if v["definition"]}))
-    # if no entry has a definition, just use "Klimaleugner"
-    except IndexError:
-        random_entry = "Klimaleugner"
-
+    # the "random" button links to /random, which picks the entry, so the page can be cached
     return render_template(template, glossary=entries, tweeted_terms=tweeted, 
-                           random_entry=random_entry, form=form, db_size=len(db),
+                           form=form, db_size=len(db), glossary_version=db.version,
+                           suggestions=suggestions,
                            enable_submissions=ENABLE_SUBMISSIONS, items_per_page=ITEMS_PER_PAGE)
 
 def query_db(query):
-    """Helper function. Queries the database by key.
+    """Helper function. Queries the database by term and spellings, ignoring case, umlaut 
+    transliterations, hyphens and gender markers (see normalization.py).
 
     Args:
         query (str): Query.
@@ -57,7 +66,8 @@ def query_db(query):
         dict: Dict subset of search results.
     """
 
-    return {k: v for k, v in db.items() if query.lower() in k.lower()}
+    # only matching entries are read, which matters when db is a lazily decoded snapshot
+    return {k: db[k] for k in db.term_index.search(query)}
 
 def get_github_file(fn, repo_name="noelsimmel/klimadiskurs-files"):
     """Retrieves a file using the GitHub API.
@@ -73,8 +83,9 @@ def get_github_file(fn, repo_name="noelsimmel/klimadiskurs-files"):
         https://pygithub.readthedocs.io/en/latest/github_objects/ContentFile.html#github.ContentFile.ContentFile
     """
 
-    repo = github.get_repo(repo_name)
-    return repo.get_contents(fn)
+    with github_lock, upstream("github_get"):
+        repo = github.get_repo(repo_name)
+        return repo.get_contents(fn)
 
 def get_github_file_decoded(fn, repo_name="noelsimmel/klimadiskurs-files", encoding="UTF-8"):
     """Retrieves a file using the GitHub API and returns its content as a string.
@@ -89,8 +100,9 @@ def get_github_file_decoded(fn, repo_name="noelsimmel/klimadiskurs-files", encod
         str: Decoded file content.
     """
 
-    repo = github.get_repo(repo_name)
-    return repo.get_contents(fn).decoded_content.decode(encoding)
+    with github_lock, upstream("github_get"):
+        repo = github.get_repo(repo_name)
+        return repo.get_contents(fn).decoded_content.decode(encoding)
 
 def get_dwds_link(term):
     """Query the DWDS API to see if term exists in the dictionary.
@@ -103,16 +115,21 @@ def get_dwds_link(term):
     """
 
     try:
-        dwds_url = f"https://www.dwds.de/api/wb/snippet/?q={term.capitalize()}"
+        dwds_url = f"{DWDS_API_URL}/api/wb/snippet/?q={term.capitalize()}"
         # sample response: 
         # [{"wortart":"Substantiv","url":"https://www.dwds.de/wb/Klimawandel",
         # "input":"Klimawandel","lemma":"Klimawandel"}]
-        dwds_response = requests.get(dwds_url)
-        dwds_content = json.loads(dwds_response.content.decode("utf-8"))
+        with breakers.DWDS, upstream("dwds"):
+            dwds_response = requests.get(dwds_url, timeout=DWDS_TIMEOUT)
+            dwds_response.raise_for_status()
+            dwds_content = json.loads(dwds_response.content.decode("utf-8"))
         if dwds_content:
             return dwds_content[0]["url"]
+    # DWDS failed for other requests recently, the page is shown without the link
+    except breakers.CircuitOpenError:
+        pass
     # sometimes DWDS doesn't respond in time
-    except TimeoutError:
+    except (TimeoutError, requests.Timeout):
         current_app.logger.error("TimeoutError: DWDS API didn't respond in time")
     # catch other exceptions that might be caused by users' unstable internet connection
     except Exception as e:
@@ -131,21 +148,28 @@ def send_submission(form):
         # generate Python dict
         new_entry = __generate_db_entry(form)
 
-        # read submissions file from GitHub
-        submissions_file = get_github_file("submissions.tsv")
+        try:
+            # read submissions file from GitHub
+            with breakers.GITHUB:
+                submissions_file = get_github_file("submissions.tsv")
 
-        # decode content and append new entry
-        # do it like this to avoid trailing tabs at the end of the line
-        content = submissions_file.decoded_content.decode("UTF-8") + "\n" + new_entry["term"]
-        for key in EntrySubmitForm.fieldnames[1:]:
-            content += "\t" + str(new_entry[key])
+            # decode content and append new entry
+            # do it like this to avoid trailing tabs at the end of the line
+            content = submissions_file.decoded_content.decode("UTF-8") + "\n" + new_entry["term"]
+            for key in EntrySubmitForm.fieldnames[1:]:
+                content += "\t" + str(new_entry[key])
 
-        try:
             # this replaces the old file content, "submission" is the commit message
-            repo.update_file(submissions_file.path, "submission", content, submissions_file.sha)
+            with breakers.GITHUB, github_lock, upstream("github_update"):
+                repo.update_file(submissions_file.path, "submission", content, 
+                                 submissions_file.sha)
             current_app.logger.info(f"New submission received: \"{form.term.data}\"")
             flash("Wir haben Ihren Vorschlag erhalten und werden ihn überprüfen. Vielen Dank!", 
                   "success")
+        # GitHub failed for other requests recently, see breakers.py
+        except breakers.CircuitOpenError:
+            flash("""Leider haben wir gerade technische Probleme. 
+                  Bitte versuchen Sie es später erneut.""", "error")
         except Exception as e:
             current_app.logger.error("GitHub API Error:", e)
             flash("""Leider haben wir gerade technische Probleme. 
@@ -169,11 +193,7 @@ def __generate_db_entry(form):
 
     # alternate spellings
     term = form.term.data.capitalize()
-    entry["spellings"] = term
-    if "-" in term:
-        entry["spellings"] += " " + term.replace("-", "")
-    else:
-        entry["spellings"] += " Klima-" + term[5:].capitalize()
+    entry["spellings"] = " ".join(spellings(term))
 
     # groups who use that term
     # ass_con = contra = 0 = climate sceptics
@@ -2,30 +2,54 @@
 
 import tweepy
 import re
-from time import sleep
-from klimadiskurs.config import TWITTER_TOKEN
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+from time import sleep, time
+from klimadiskurs.app import breakers, profiler
+from klimadiskurs.app.metrics import SLEEP_TIME, count_cache, upstream
+from klimadiskurs.config import TWEETS_CACHE_SECONDS, TWITTER_TOKEN, TWITTER_API_URL, \
+                                TWITTER_TIMEOUT
+from klimadiskurs.normalization import normalize, normalize_text, spellings
+
+# tweepy hard-codes this host for all API v2 requests
+TWITTER_DEFAULT_HOST = "https://api.twitter.com"
+
+# links are removed from tweet texts
+LINK_PATTERN = re.compile(r"(?:http|www)\S+")
+# words compared by the near-duplicate filter: no @mentions, no punctuation, no # of hashtags
+WORD_PATTERN = re.compile(r"(?<!@)\b\w+")
+# tweets are compared as sets of word n-grams ("shingles")
+SHINGLE_SIZE = 3
+# tweets whose shingle sets overlap at least this much (Jaccard similarity) are near-duplicates,
+# e.g. manual retweets, quotes with a short comment or copy-pasted spam
+DUPLICATE_THRESHOLD = 0.5
+# share of additional tweets requested to make up for the ones that are filtered out
+OVERFETCH = 0.5
+# number of terms whose tweets are cached per worker
+TWEETS_CACHE_SIZE = 1000
 
 class Tweet():
     """Custom Tweet class. Makes working with tweets easier."""
 
-    def __init__(self, data, users):
+    __slots__ = ("id", "text", "handle", "date")
+
+    def __init__(self, data, handle, text=None):
         """Constructor. Only keeps valuable information from the API response:
         Tweet ID, text, user handle (@username), date.
         Links are removed from tweet text.
 
         Args:
-            data (list): Tweet data from API response.
-            users (list): User data from API response.
+            data (tweepy.Tweet): Tweet data from API response.
+            handle (str): Username of the author.
+            text (str, optional): Tweet text without links, if already known. 
+                Defaults to None = remove links from data.text.
         """
         
         self.id = str(data.id)
-        self.text = data.text
-        self.handle = [user.username for user in users if user.id == data.author_id][0]
+        self.text = LINK_PATTERN.sub("", data.text) if text is None else text
+        self.handle = handle
         self.date = data.created_at.strftime("%d.%m.%y")
 
-        self.text = re.sub(r"http\S+", "", self.text)   # remove links
-        self.text = re.sub(r"www\S+", "", self.text)   # remove links
-
     def __str__(self):
         """Tweet string representation, example: \"@username: This is the tweet text.\""""
 
@@ -41,14 +65,11 @@ class Tweet():
         """Checks if tweet text contains a query and returns a boolean.
         Example for query="Klimaleugner":
         Returns True iff \"klimaleugner\" OR \"klima-leugner\" 
-        or \"klima leugner\" is in tweet text, case insensitive.
+        or \"klima leugner\" (or e.g. \"Klima-LeugnerInnen\") is in tweet text, 
+        case insensitive. See normalization.py.
         """
 
-        text = self.text.lower()
-        contains = query.lower() in text \
-            or "klima-" + query[5:] in text \
-            or "klima " + query[5:] in text
-        return contains
+        return normalize(query) in normalize_text(self.text)
 
     def startswith(self, query):
         """Checks if tweet text starts with a query and returns a boolean.
@@ -57,28 +78,74 @@ class Tweet():
         return self.text.lower().startswith(query.lower())
 
 
-def connect_to_twitter():
+class TimeoutAdapter(HTTPAdapter):
+    """Transport adapter that gives up on requests after TWITTER_TIMEOUT seconds.
+    tweepy sends its requests without a timeout, so a hanging API would block the request forever.
+    Mounted on the tweepy session."""
+
+    def send(self, request, timeout=None, **kwargs):
+        """Sends the request as usual, with TWITTER_TIMEOUT if no timeout is given."""
+
+        return super().send(request, timeout=timeout or TWITTER_TIMEOUT, **kwargs)
+
+
+class RedirectAdapter(TimeoutAdapter):
+    """Transport adapter that sends requests meant for the Twitter API to another host.
+    Mounted on the tweepy session if TWITTER_API_URL is set, e.g. to a local stand-in server."""
+
+    def __init__(self, host, **kwargs):
+        """Constructor.
+
+        Args:
+            host (str): Base URL that replaces https://api.twitter.com.
+        """
+
+        super().__init__(**kwargs)
+        self.host = host.rstrip("/")
+
+    def send(self, request, **kwargs):
+        """Rewrites the request URL, then sends the request as usual."""
+
+        request.url = self.host + request.url[len(TWITTER_DEFAULT_HOST):]
+        return super().send(request, **kwargs)
+
+
+def connect_to_twitter(wait_on_rate_limit=False):
     """Connects to Twitter API using tweepy.Client.
 
+    Args:
+        wait_on_rate_limit (bool, optional): Whether to wait until the rate limit resets
+            (up to 15 minutes) instead of failing. Defaults to False, a page must not wait that
+            long, the Twitter circuit breaker handles rate limits (see breakers.py).
+
     Returns:
         tweepy.Client: The API.
-        (None: If errors occurred.)
+        (None: If the credentials are wrong.)
     """
 
-    api = tweepy.Client(bearer_token=TWITTER_TOKEN, wait_on_rate_limit=True)
+    api = tweepy.Client(bearer_token=TWITTER_TOKEN, wait_on_rate_limit=wait_on_rate_limit)
+    if TWITTER_API_URL.rstrip("/") != TWITTER_DEFAULT_HOST:
+        api.session.mount(TWITTER_DEFAULT_HOST, RedirectAdapter(TWITTER_API_URL))
+    else:
+        api.session.mount(TWITTER_DEFAULT_HOST, TimeoutAdapter())
     # verify connection
+    # if Twitter is down, the API is used anyway and the breaker keeps requests from waiting for it
     try:
-        api.get_tweet(20)
-        return api
+        with breakers.TWITTER, upstream("twitter_verify"):
+            api.get_tweet(20)
     except tweepy.errors.Unauthorized:
         print("ERROR: Could not verify Twitter credentials")
+        return None
     except Exception as e:
         print(e)
-    return None
+    return api
+
+# (query, count) -> (time fetched, list of Tweet objects), least recently used first
+__tweets = OrderedDict()
 
 def query_tweets(query, api, count=10):
     """Queries the full Twitter archive using search_all_tweets(). 
-    Results are cleaned using filter_tweets().
+    Results are cleaned using filter_tweets() and cached for TWEETS_CACHE_SECONDS.
 
     Needs Twitter API v2 Academic Research access: 
     https://developer.twitter.com/en/docs/projects/overview#product-track
@@ -94,50 +161,118 @@ def query_tweets(query, api, count=10):
         (list(): Empty list if some error occurred.)
     """
 
+    # tweets of the last TWEETS_CACHE_SECONDS are reused, also as validator of /def/<term>
+    cached = __tweets.get((query, count))
+    fresh = cached is not None and time() - cached[0] < TWEETS_CACHE_SECONDS
+    count_cache("tweets", fresh)
+    if fresh:
+        __tweets.move_to_end((query, count))
+        return cached[1]
+
     print(f"Querying Twitter API for {query}")
 
     # if API connection failed (error is logged by connect_to_twitter)
     if not api: return []
 
-    # retrieve twice the number of tweets at first and filter them down to 10 below
+    # retrieve some more tweets at first and filter them down to count below
+    # the API returns at least 10 tweets
     try:
-        response = api.search_all_tweets(query+" OR "+"klima-"+query[5:]+" lang:de -is:retweet", 
-                                         max_results=count*2, 
-                                         since_id=20, tweet_fields=["created_at", "author_id"],
-                                         expansions="author_id")
+        with breakers.TWITTER, upstream("twitter_search"):
+            response = api.search_all_tweets(" OR ".join(spellings(query))+" lang:de -is:retweet", 
+                                             max_results=max(10, round(count*(1 + OVERFETCH))), 
+                                             since_id=20, tweet_fields=["created_at", "author_id"],
+                                             expansions="author_id")
         # avoid rate limiting
         # requesting >1 /def/ entries per second leads to a tweepy error (rate limit)
         # this can be solved by clicking more slowly or reloading the page
-        sleep(1)
+        with SLEEP_TIME.time(), profiler.phase("sleep:twitter"):
+            sleep(1)
+    # Twitter failed for other requests recently, see breakers.py --> don't show any tweets
+    except breakers.CircuitOpenError:
+        return []
     # in case of errors, return an empty list --> don't show any tweets
     except Exception as e:
         print(e)
         return []
-    
-    return filter_tweets(response, query)[:count]
 
-def filter_tweets(response, query):
-    """Take a Twitter API response and filters it to exclude retweets and mentions.
+    tweets = filter_tweets(response, query, count)
+    # failed requests are not cached, so the next request tries again
+    if TWEETS_CACHE_SECONDS > 0:
+        __tweets[(query, count)] = (time(), tweets)
+        __tweets.move_to_end((query, count))
+        while len(__tweets) > TWEETS_CACHE_SIZE:
+            __tweets.popitem(last=False)
+    return tweets
+
+def tweets_fetched(query, count=10):
+    """When the cached tweets of query were fetched, see query_tweets().
+
+    Args:
+        query (str): The query (term).
+        count (int, optional): Maximum number of tweets, as for query_tweets(). Defaults to 10.
+
+    Returns:
+        float: Timestamp, None if there are no cached tweets or they are too old.
+    """
+
+    cached = __tweets.get((query, count))
+    if cached is None or time() - cached[0] >= TWEETS_CACHE_SECONDS:
+        return None
+    return cached[0]
+
+def filter_tweets(response, query, count=None):
+    """Take a Twitter API response and filters it to exclude retweets, mentions and
+    near-duplicates. Tweet objects are only created for tweets that pass the filter.
 
     Args:
         response (requests.Response): API response (i.e. result of search_all_tweets()).
         query (str): The query.
+        count (int, optional): Stop after this many tweets. Defaults to None = all.
 
     Returns:
-        list(Tweet): List of tweets that passed the filter.
+        list(Tweet): List of tweets that passed the filter, in the order of the response.
     """
 
     if not response.data: return []
 
-    # set to avoid duplicate tweets
-    tweets = []
-    for i in range(len(response.data)):
-        tweets.append(Tweet(response.data[i], response.includes["users"]))
+    # author ID -> username, instead of searching the user list for every tweet
+    handles = {user.id: user.username for user in response.includes.get("users", [])}
+    key = normalize(query)
+    mention = "@" + query.lower()
+
+    tweets, seen = [], []
+    for data in response.data:
+        if data.author_id not in handles:
+            continue
+        text = LINK_PATTERN.sub("", data.text)
+        lowered = text.lower()
+        # filter out manual retweets
+        # filter out tweets where the term only appears in the username
+        # same as not t.startswith("RT") and query in t and "@"+query not in t for a Tweet t
+        if lowered.startswith("rt") or mention in lowered \
+                or key not in normalize_text(text):
+            continue
+        # filter out quotes and copies of tweets that were already accepted
+        shingles = __shingles(lowered)
+        if any(__similarity(shingles, other) >= DUPLICATE_THRESHOLD for other in seen):
+            continue
+        seen.append(shingles)
+        tweets.append(Tweet(data, handles[data.author_id], text))
+        if len(tweets) == count:
+            break
+
+    return tweets
+
+def __shingles(text):
+    """Helper function for filter_tweets(). 
+    Returns the set of word n-grams of a lowercase text, as hashes."""
+
+    words = WORD_PATTERN.findall(text)
+    if len(words) <= SHINGLE_SIZE:
+        return {hash(tuple(words))}
+    return {hash(tuple(words[i:i+SHINGLE_SIZE])) for i in range(len(words) - SHINGLE_SIZE + 1)}
 
-    # filter out manual retweets to avoid duplicates 
-    # filter out tweets where the term only appears in the username 
-    # note that __contains__ and startswith are redefined for Tweet objects
-    tweets_cleaned = [t for t in tweets if not t.startswith("RT") 
-                      and query in t and "@"+query not in t]
+def __similarity(a, b):
+    """Helper function for filter_tweets(). Jaccard similarity of two sets."""
 
-    return tweets_cleaned
+    return len(a & b) / len(a | b) if a or b else 1.0
@@ -4,11 +4,32 @@
 # https://devcenter.heroku.com/articles/config-vars
 
 from dotenv import load_dotenv
-from os import environ
+from os import environ, path
+import tempfile
 
 load_dotenv()
 
 # database
+# path to the glossary, relative to the root directory
+GLOSSARY_PATH = environ.get("GLOSSARY_PATH", "klimadiskurs/static/data/glossary.json")
+# optional path to a binary snapshot of the glossary, created by tools/create_snapshot.py
+# all gunicorn workers share the memory-mapped snapshot instead of each parsing GLOSSARY_PATH
+# if it is missing or older than GLOSSARY_PATH, GLOSSARY_PATH is loaded instead
+GLOSSARY_SNAPSHOT = environ.get("GLOSSARY_SNAPSHOT", "")
+# if set to 1, glossary.json is validated against tools/glossary.schema.json when it is loaded
+# and the app doesn't start if an entry is malformed, see schema.py
+VALIDATE_GLOSSARY = int(environ.get("VALIDATE_GLOSSARY", 1))
+# seconds between checks whether GLOSSARY_PATH or GLOSSARY_SNAPSHOT changed, every worker then
+# reloads the glossary without a restart, see app/reloader.py. 0 turns reloading off
+GLOSSARY_RELOAD_INTERVAL = float(environ.get("GLOSSARY_RELOAD_INTERVAL", 30))
+# minified and compressed download files, created by tools/create_downloads.py
+DOWNLOADS_DIR = environ.get("DOWNLOADS_DIR", "klimadiskurs/static/data/downloads")
+# search index for search.js, created by tools/create_search_index.py
+SEARCH_INDEX_PATH = environ.get("SEARCH_INDEX_PATH", "klimadiskurs/static/data/search_index.json")
+# corpus statistics for the about page, created by tools/create_stats.py
+STATS_PATH = environ.get("STATS_PATH", "klimadiskurs/static/data/stats.json")
+# weekly tweet counts, downloaded from GitHub at startup, see app/trends.py
+TRENDS_PATH = environ.get("TRENDS_PATH", "tweet_counts.sqlite")
 # how many items to show per "page" on the home page
 # changing this may break the layout
 ITEMS_PER_PAGE = 30
@@ -18,10 +39,43 @@ ENABLE_SUBMISSIONS = int(environ.get("ENABLE_SUBMISSIONS"))
 
 # Twitter API access token
 TWITTER_TOKEN = environ.get("TW_BEARER_TOKEN")
+# seconds the tweets of a term are kept per worker, /def/<term> pages can be revalidated (304)
+# as long as their tweets are cached, see app/caching.py. 0 turns the cache off
+TWEETS_CACHE_SECONDS = int(environ.get("TWEETS_CACHE_SECONDS", 15 * 60))
 
 # GitHub API access token
 GITHUB_TOKEN = environ.get("GH_ACCESS_TOKEN")
 
+# base URLs of the external APIs
+# only change these to point the app at local stand-ins, e.g. for the benchmarks in /benchmarks
+TWITTER_API_URL = environ.get("TWITTER_API_URL", "https://api.twitter.com")
+GITHUB_API_URL = environ.get("GITHUB_API_URL", "https://api.github.com")
+DWDS_API_URL = environ.get("DWDS_API_URL", "https://www.dwds.de")
+# seconds to wait for the external APIs (to connect and for each read), see app/breakers.py
+# PyGithub only accepts whole seconds
+TWITTER_TIMEOUT = float(environ.get("TWITTER_TIMEOUT", 5))
+DWDS_TIMEOUT = float(environ.get("DWDS_TIMEOUT", 3))
+GITHUB_TIMEOUT = int(environ.get("GITHUB_TIMEOUT", 10))
+
+# circuit breakers of the external APIs, see app/breakers.py
+# directory with the state of the breakers that all workers share, set in gunicorn.conf.py
+BREAKER_DIR = environ.get("BREAKER_DIR", path.join(tempfile.gettempdir(), "klimadiskurs-breakers"))
+# a breaker opens if at least BREAKER_FAILURE_RATE of the calls in a window of BREAKER_WINDOW
+# seconds failed, and at least BREAKER_MIN_CALLS calls were made
+BREAKER_FAILURE_RATE = float(environ.get("BREAKER_FAILURE_RATE", 0.5))
+BREAKER_MIN_CALLS = int(environ.get("BREAKER_MIN_CALLS", 5))
+BREAKER_WINDOW = float(environ.get("BREAKER_WINDOW", 60))
+# seconds an open breaker rejects all calls before it lets one through to probe the API
+BREAKER_OPEN_SECONDS = float(environ.get("BREAKER_OPEN_SECONDS", 30))
+
+# profiling, see app/profiler.py
+# comma-separated path prefixes of requests that are always profiled, e.g. "/def/,/search/"
+PROFILE_PATHS = environ.get("PROFILE_PATHS", "")
+# if set to 1, requests with a valid X-Profile-Token header are profiled
+PROFILE_SIGNED = int(environ.get("PROFILE_SIGNED", 0))
+# where profiling reports are written to
+PROFILE_DIR = environ.get("PROFILE_DIR", "profiles")
+
 # Config class is only necessary for Flask app configuration
 class Config:
     # Flask app key
@@ -0,0 +1,490 @@
+# Glossary file
+# Compact in-memory representation of the glossary database
+# Every entry is an immutable Entry object with __slots__ instead of a dict with nine keys.
+# Lists are stored as tuples, and strings that repeat across entries (terms, spellings,
+# related terms, sources) are interned so each of them is only stored once.
+# Example sentences take up most of the memory and are rarely read, so they are kept as one
+# UTF-8 encoded bytes object per entry (German text would take 2 bytes per character as str).
+# Entries can still be read like dicts, e.g. entry["definition"], so routes, templates and forms
+# work as before, and they are converted back to dicts for JSON responses.
+# The glossary is either loaded from glossary.json (Glossary) or mapped from a binary snapshot
+# that all gunicorn workers share (GlossarySnapshot, see tools/create_snapshot.py).
+# When glossary.json is loaded, each entry can be validated against the schema as it is parsed
+# (see schema.py), so a malformed entry stops the app at startup instead of failing a request.
+# Snapshots are validated by create_snapshot.py when they are built.
+# The app modules import the glossary as klimadiskurs.db, a GlossaryProxy. app/reloader.py replaces
+# the glossary behind it when glossary.json changes, and every request keeps using the glossary
+# it started with.
+
+import json
+import mmap
+import os
+import sys
+from collections import Counter
+from collections.abc import Mapping
+from functools import cached_property, lru_cache
+from time import time
+from flask import g, has_app_context
+from flask.json import JSONEncoder
+from klimadiskurs.normalization import TermIndex
+from klimadiskurs.schema import InvalidGlossaryError, entry_validator
+from klimadiskurs.snapshot import FIELDS, FLAG_DEFINITION, FLAG_GROUP_0, FLAG_GROUP_1, \
+                                  HEADER as SNAPSHOT_HEADER, MAGIC as SNAPSHOT_MAGIC, \
+                                  RECORD as SNAPSHOT_RECORD, VERSION as SNAPSHOT_VERSION
+
+# "dwds" of entries that are not in the DWDS dictionary, see tools/create_dwds.py
+DWDS_NONE = "none"
+# fields with lists of strings that often repeat in other entries
+INTERNED_FIELDS = ("sources", "related", "spellings")
+# separates encoded example sentences, the ASCII "unit separator" never appears in text
+SEPARATOR = "\x1f"
+
+# decoded snapshot entries that are kept in memory per worker
+SNAPSHOT_CACHE_SIZE = 2048
+
+
+class Entry():
+    """Immutable glossary entry with dict-style read access."""
+
+    __slots__ = ("term", "id", "definition", "sources", "related", "spellings", "_examples",
+                 "association", "dwds")
+
+    def __init__(self, term, id, definition="", sources=(), related=(), spellings=(), examples=(),
+                 association=(), dwds=None, shared=None):
+        """Constructor. Takes the same keys as a glossary.json entry, so Entry(**entry) works.
+
+        Args:
+            term (str): The term.
+            id (int): Unique ID.
+            definition (str, optional): Definition. Defaults to "".
+            sources, related, spellings, examples (list(str), optional): Defaults to ().
+            association (list(int), optional): Discourse groups. Defaults to ().
+            dwds (str, optional): URL of the DWDS dictionary entry or DWDS_NONE, stored by
+                tools/create_dwds.py. Defaults to None (not looked up yet).
+            shared (dict, optional): Tuples of the entries loaded so far, so identical tuples,
+                e.g. association (0, 1) or the same related terms, are stored once per load.
+                Defaults to None = no deduplication.
+        """
+
+        def share(values):
+            return values if shared is None else shared.setdefault(values, values)
+
+        # object.__setattr__ because __setattr__ is blocked below
+        init = object.__setattr__
+        init(self, "term", sys.intern(term))
+        init(self, "id", id)
+        init(self, "definition", definition)
+        for field, values in zip(INTERNED_FIELDS, (sources, related, spellings)):
+            init(self, field, share(tuple(sys.intern(v) for v in values)))
+        # None for no examples, b"" would be one empty sentence
+        init(self, "_examples", SEPARATOR.join(examples).encode("utf-8") if examples else None)
+        init(self, "association", share(tuple(association)))
+        init(self, "dwds", dwds)
+
+    @property
+    def examples(self):
+        """Example sentences, decoded on access."""
+
+        if self._examples is None:
+            return ()
+        return tuple(self._examples.decode("utf-8").split(SEPARATOR))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Glossary entries are read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError("Glossary entries are read-only")
+
+    def __getitem__(self, key):
+        """Dict-style access, e.g. entry["definition"]. Raises KeyError for unknown keys."""
+
+        if key not in FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in FIELDS
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __eq__(self, other):
+        if isinstance(other, Entry):
+            return all(self[k] == other[k] for k in FIELDS)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((self.term, self.id))
+
+    def __repr__(self):
+        return f"Entry({self.to_dict()!r})"
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in FIELDS else default
+
+    def keys(self):
+        return FIELDS
+
+    def values(self):
+        return tuple(getattr(self, k) for k in FIELDS)
+
+    def items(self):
+        return tuple((k, getattr(self, k)) for k in FIELDS)
+
+    def to_dict(self):
+        """Returns the entry as a dict with lists, exactly like in glossary.json."""
+
+        return {k: list(v) if isinstance(v, tuple) else v for k, v in self.items()
+                if v is not None}
+
+
+class GlossaryJSONEncoder(JSONEncoder):
+    """Flask JSON encoder that can also serialize Entry objects, e.g. for the /api route."""
+
+    def default(self, o):
+        if isinstance(o, Entry):
+            return o.to_dict()
+        return super().default(o)
+
+
+class GlossaryViews():
+    """Mixin with derived views of the glossary that routes need on every request.
+    They are computed once on first use. Subclasses implement _summaries() and set version,
+    an identifier of the glossary.json they were loaded from (see source_version()), and
+    source_size and source_mtime_ns, the size and mtime of that file."""
+
+    version = None
+    source_size = source_mtime_ns = None
+
+    def _summaries(self):
+        """Yields (term, id, has definition, association) for every entry."""
+
+        raise NotImplementedError
+
+    @cached_property
+    def defined(self):
+        """List of terms that have a definition."""
+
+        return [term for term, _, has_definition, _ in self._summaries() if has_definition]
+
+    @cached_property
+    def newest(self):
+        """List of all terms, sorted by ID in descending order (newest entries first)."""
+
+        return [term for term, _ in sorted(((term, id) for term, id, _, _ in self._summaries()),
+                                           key=lambda t: t[1], reverse=True)]
+
+    @cached_property
+    def association_counts(self):
+        """Counter of association tuples, e.g. {(0,): 200, (0, 1): 35, (1,): 13}."""
+
+        return Counter(association for _, _, _, association in self._summaries())
+
+    @cached_property
+    def term_index(self):
+        """TermIndex of all terms and spellings, see normalization.py."""
+
+        return TermIndex(self)
+
+    @cached_property
+    def _indexes(self):
+        # index name -> (index, build, args), see index()
+        return dict()
+
+    def index(self, name, build, *args):
+        """An index of the glossary that an app module builds on first use, e.g. the
+        TrigramIndex of suggestions.py. Like the views above, it is kept as long as the glossary,
+        so a reloaded glossary gets new indexes and the old ones are freed with the old glossary.
+
+        Args:
+            name (str): Name of the index, e.g. "trigrams".
+            build (function): Builds the index from the glossary and args, e.g. a class.
+            *args: Further arguments for build.
+
+        Returns:
+            object: The index.
+        """
+
+        if name not in self._indexes:
+            self._indexes[name] = (build(self, *args), build, args)
+        return self._indexes[name][0]
+
+    def warm(self, previous=None):
+        """Computes the views, and the indexes that were built for the previous glossary,
+        so that requests don't have to after a reload.
+
+        Args:
+            previous (GlossaryViews, optional): The glossary this one replaces. Defaults to None.
+        """
+
+        self.defined, self.newest, self.association_counts, self.term_index
+        if previous is not None:
+            for name, (_, build, args) in list(previous._indexes.items()):
+                self.index(name, build, *args)
+
+
+class Glossary(GlossaryViews, dict):
+    """The glossary as a dict of Entry objects. Must not be modified after loading,
+    otherwise the cached views are out of date."""
+
+    def _summaries(self):
+        for term, entry in self.items():
+            yield term, entry.id, bool(entry.definition), entry.association
+
+
+class GlossarySnapshot(GlossaryViews, Mapping):
+    """Read-only glossary backed by a memory-mapped snapshot file.
+    Opening it is constant-time, all workers share the same physical memory pages and
+    entries are only decoded when they are accessed. Keys are iterated in alphabetical order."""
+
+    def __init__(self, path):
+        """Constructor. Maps the file into memory.
+
+        Args:
+            path (str): Path to the snapshot created by tools/create_snapshot.py.
+
+        Raises:
+            ValueError: If the file is not a snapshot or has an unsupported format version.
+        """
+
+        with open(path, "rb") as f:
+            self.__mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.__count, self.source_size, self.source_mtime_ns, \
+            self.__keys_offset, self.__data_offset = SNAPSHOT_HEADER.unpack_from(self.__mm)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"{path} is not a glossary snapshot (version {SNAPSHOT_VERSION})")
+        self.version = source_version(self.source_size, self.source_mtime_ns)
+        self.__index = memoryview(self.__mm)[SNAPSHOT_HEADER.size:self.__keys_offset]
+        self.__entry = lru_cache(maxsize=SNAPSHOT_CACHE_SIZE)(self.__decode)
+
+    def __len__(self):
+        return self.__count
+
+    def __iter__(self):
+        return iter(self.__keys)
+
+    def __contains__(self, key):
+        return isinstance(key, str) and self.__find(key) is not None
+
+    def __getitem__(self, key):
+        i = self.__find(key) if isinstance(key, str) else None
+        if i is None:
+            raise KeyError(key)
+        return self.__entry(i)
+
+    @cached_property
+    def __keys(self):
+        # all keys as str, decoded once per worker on first iteration (e.g. for a search)
+        blob = self.__mm[self.__keys_offset:self.__data_offset]
+        return [sys.intern(blob[key_offset:key_offset + key_length].decode("utf-8"))
+                for key_offset, key_length, *_ in SNAPSHOT_RECORD.iter_unpack(self.__index)]
+
+    def _summaries(self):
+        groups = {flags: tuple(g for g, flag in enumerate((FLAG_GROUP_0, FLAG_GROUP_1))
+                               if flags & flag) for flags in range(16)}
+        records = SNAPSHOT_RECORD.iter_unpack(self.__index)
+        for key, (_, _, _, _, id, flags) in zip(self.__keys, records):
+            yield key, id, bool(flags & FLAG_DEFINITION), groups[flags & 15]
+
+    def __key(self, i):
+        key_offset, key_length = SNAPSHOT_RECORD.unpack_from(self.__index,
+                                                             i * SNAPSHOT_RECORD.size)[:2]
+        start = self.__keys_offset + key_offset
+        return self.__mm[start:start + key_length]
+
+    def __find(self, key):
+        """Binary search over the sorted keys. UTF-8 byte order is the same as str order.
+        Returns the index of key or None."""
+
+        key = key.encode("utf-8")
+        lo, hi = 0, self.__count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.__key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.__count and self.__key(lo) == key:
+            return lo
+        return None
+
+    def __decode(self, i):
+        offset, length = SNAPSHOT_RECORD.unpack_from(self.__index, i * SNAPSHOT_RECORD.size)[2:4]
+        start = self.__data_offset + offset
+        return _decode_entry(self.__mm[start:start + length])
+
+
+class GlossaryProxy(Mapping):
+    """The current glossary (klimadiskurs.db). Forwards all reads to a Glossary or
+    GlossarySnapshot, which swap() replaces as a whole.
+    Within a request, every read goes to the glossary that was current at the first read, so a
+    page is never rendered from two versions, e.g. a term found in the old index but deleted in the
+    new glossary. The old glossary is freed when the last request using it is done."""
+
+    def __init__(self, glossary):
+        """Constructor.
+
+        Args:
+            glossary (Glossary or GlossarySnapshot): The glossary, see open_glossary().
+        """
+
+        self.current = glossary
+        self.loaded = time()
+
+    def __target(self):
+        if not has_app_context():
+            return self.current
+        glossary = g.get("_glossary")
+        if glossary is None:
+            glossary = g._glossary = self.current
+        return glossary
+
+    def pinned(self):
+        """The glossary of the current request, for work that outlives the request context,
+        e.g. a streamed response.
+
+        Returns:
+            Glossary or GlossarySnapshot: The glossary.
+        """
+
+        return self.__target()
+
+    def swap(self, glossary):
+        """Makes glossary the current glossary, for all requests that start from now on.
+        A single reference assignment, so it is atomic for concurrent requests.
+
+        Args:
+            glossary (Glossary or GlossarySnapshot): The new glossary.
+        """
+
+        self.loaded = time()
+        self.current = glossary
+
+    def __getattr__(self, name):
+        # views and attributes of the glossary, e.g. db.version or db.term_index
+        return getattr(self.__target(), name)
+
+    def __getitem__(self, key):
+        return self.__target()[key]
+
+    def __iter__(self):
+        return iter(self.__target())
+
+    def __len__(self):
+        return len(self.__target())
+
+    def __contains__(self, key):
+        return key in self.__target()
+
+    def get(self, key, default=None):
+        return self.__target().get(key, default)
+
+    def keys(self):
+        return self.__target().keys()
+
+    def values(self):
+        return self.__target().values()
+
+    def items(self):
+        return self.__target().items()
+
+
+def _decode_entry(data):
+    # one snapshot entry, without deduplication because entries are decoded one by one
+    return Entry(**json.loads(data))
+
+def __object_hook(obj, shared):
+    # called by json.load for every JSON object, innermost first
+    # entries are converted right away so the parsed dicts can be freed during loading
+    # shared is the tuple table of this load (see Entry), so concurrent loads, e.g. a reload in the
+    # background, don't share one
+    if "term" in obj and "id" in obj:
+        return Entry(**{k: v for k, v in obj.items() if k in FIELDS}, shared=shared)
+    return Glossary((sys.intern(k), v) for k, v in obj.items())
+
+def load_glossary(path, validate=False):
+    """Loads glossary.json into a dict of Entry objects.
+
+    Args:
+        path (str): Path to glossary.json.
+        validate (bool, optional): Whether to validate the entries against
+            tools/glossary.schema.json (see schema.py). Defaults to False.
+
+    Returns:
+        Glossary: The glossary, same keys and order as in the file.
+
+    Raises:
+        InvalidGlossaryError: If validate is True and entries don't match the schema.
+    """
+
+    errors = []
+    shared = dict()
+    def object_hook(obj):
+        return __object_hook(obj, shared)
+    if validate:
+        check = entry_validator()
+        def object_hook(obj):
+            # entries have "term" and "id", the keys of the top-level object are terms
+            if "term" in obj or "id" in obj:
+                n = len(errors)
+                check(obj, obj.get("term", "?"), errors)
+                if len(errors) > n:
+                    return obj
+            return __object_hook(obj, shared)
+
+    with open(path, encoding="utf-8", errors="replace") as f:
+        glossary = json.load(f, object_hook=object_hook)
+        source = os.fstat(f.fileno())
+    if validate:
+        # values that aren't entries at all, invalid entries were reported above
+        errors += [f"{term}: expected a glossary entry" for term, entry in glossary.items()
+                   if not isinstance(entry, Entry) and not (type(entry) is dict
+                                                            and ("term" in entry or "id" in entry))]
+        if errors:
+            raise InvalidGlossaryError(path, errors)
+    # same attributes as GlossarySnapshot
+    glossary.source_size, glossary.source_mtime_ns = source.st_size, source.st_mtime_ns
+    glossary.version = source_version(source.st_size, source.st_mtime_ns)
+    return glossary
+
+def source_version(size, mtime_ns):
+    """Identifier of a glossary.json version, e.g. for cache keys and ETags.
+    The snapshot of a file has the same version as the file itself.
+
+    Args:
+        size (int): File size in bytes.
+        mtime_ns (int): Modification time in nanoseconds.
+
+    Returns:
+        str: Version, e.g. "28e97-1702e8a5a74f3e00".
+    """
+
+    return f"{size:x}-{mtime_ns:x}"
+
+def open_glossary(path, snapshot_path=None, validate=False):
+    """Opens the snapshot if it exists and was built from the current glossary.json,
+    otherwise loads glossary.json.
+
+    Args:
+        path (str): Path to glossary.json.
+        snapshot_path (str, optional): Path to the snapshot. Defaults to None = don't use one.
+        validate (bool, optional): Whether to validate glossary.json if it is loaded, 
+            see load_glossary(). Defaults to False.
+
+    Returns:
+        Glossary or GlossarySnapshot: The glossary.
+    """
+
+    if snapshot_path and os.path.isfile(snapshot_path):
+        snapshot = GlossarySnapshot(snapshot_path)
+        source = os.stat(path)
+        if (snapshot.source_size, snapshot.source_mtime_ns) == (source.st_size,
+                                                                source.st_mtime_ns):
+            return snapshot
+        print(f"WARNING: {snapshot_path} is out of date, loading {path} instead")
+    elif snapshot_path:
+        print(f"WARNING: {snapshot_path} does not exist, loading {path} instead")
+    return load_glossary(path, validate)
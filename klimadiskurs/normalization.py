@@ -0,0 +1,160 @@
+# Normalization file
+# One normalized form for all ways of writing a term, used wherever terms are matched:
+# search (query_db), /def/<term>, tweet filtering, submissions, suggestions and the tools.
+# Case, ß/ss, umlaut transliterations, hyphens/spaces in compounds and gender markers are ignored:
+# "Klima-Lüge", "klima lüge", "Klimaluege" -> "klimaluege"
+# "KlimaretterInnen", "Klimaretter*innen", "Klimaretter:in" -> "klimaretter"
+# TermIndex maps the normalized forms of all terms and spellings to the terms, so a lookup is a
+# dict access instead of trying string variants one by one. A search for a part of a term scans
+# the forms of all terms, joined into one string, so the scan runs in C (str.find) instead of
+# checking the terms one by one in Python. db.term_index is built on first use.
+# This module doesn't import the app, so the tools can import it without the app config
+# (see tools/create_json.py).
+
+import re
+from bisect import bisect_right
+from itertools import islice
+
+# all terms start with "Klima"
+PREFIX = "klima"
+UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+# umlauts without dots, e.g. "Klimaluge", only used as fallback keys
+DOTLESS = str.maketrans("äöüÄÖÜ", "aouAOU")
+# binnen-I, matched before lowercasing: "KlimaretterIn", "KlimaretterInnen"
+BINNEN_I = re.compile(r"(?<=[a-zäöüß])In(?:nen)?\b")
+# gender star, colon, gap and slash: "klimaretter*innen", "klimaretter:in", "klimaretter/-in"
+GENDER_MARKER = re.compile(r"(?:[*:_]|/-?)in(?:nen)?\b")
+# hyphens and spaces inside a compound: "klima-lüge", "klima lüge"
+SEPARATORS = re.compile(r"[\s\-‐‑]+")
+# in running text, only separators directly after "klima" join a compound
+TEXT_SEPARATORS = re.compile(r"\b" + PREFIX + r"[\s\-‐‑]+")
+# TermIndex.search() tests the remaining terms one by one after this many matches, which is faster
+# for queries that match most terms (e.g. a single letter)
+SCAN_AFTER = 500
+
+
+class TermIndex():
+    """Maps normalized terms and spellings to glossary terms."""
+
+    def __init__(self, glossary):
+        """Constructor. Builds the index.
+
+        Args:
+            glossary (Mapping): The glossary, e.g. db.
+        """
+
+        self.forms = dict()     # term -> all normalized forms, joined by "\n"
+        # if two terms share a form, terms win over spellings, and both over dotless umlauts
+        priorities = ([], [], [])
+        for term in glossary:
+            written = (term, *glossary[term]["spellings"])
+            forms = ([normalize(term)], [normalize(s) for s in written[1:]],
+                     [normalize(s.translate(DOTLESS)) for s in written])
+            for priority, keys in zip(priorities, forms):
+                priority.extend((key, term) for key in keys)
+            self.forms[term] = "\n".join(sorted(set().union(*forms)))
+
+        # for search(): the forms of all terms in one string and where each term's forms start
+        # normalized queries never contain "\n", so a match never spans two terms
+        self.terms = list(self.forms)
+        self.starts = []
+        position = 0
+        for forms in self.forms.values():
+            self.starts.append(position)
+            position += len(forms) + 1
+        self.text = "\n".join(self.forms.values())
+
+        self.keys = dict()      # normalized form -> term
+        for priority in priorities:
+            for key, term in priority:
+                self.keys.setdefault(key, term)
+
+    def lookup(self, text):
+        """Returns the term that text is a way of writing, e.g. "klima-luege" -> "Klimalüge".
+        The compound head alone works as well, e.g. "leugner" -> "Klimaleugner".
+
+        Args:
+            text (str): User input.
+
+        Returns:
+            str: The term, None if text isn't a glossary term.
+        """
+
+        key = normalize(text)
+        term = self.keys.get(key)
+        if term is None and not key.startswith(PREFIX):
+            term = self.keys.get(PREFIX + key)
+        return term
+
+    def search(self, query):
+        """Returns all terms that contain query in any of their spellings.
+
+        Args:
+            query (str): User input, e.g. "leugner" or "Klima-L".
+
+        Returns:
+            list(str): Matching terms in glossary order.
+        """
+
+        query = normalize(query)
+        if not query:
+            return list(self.terms)
+        results = []
+        position = self.text.find(query)
+        while position != -1:
+            i = bisect_right(self.starts, position) - 1
+            results.append(self.terms[i])
+            if len(results) == SCAN_AFTER:
+                results += [term for term, forms in islice(self.forms.items(), i + 1, None)
+                            if query in forms]
+                break
+            # continue with the next term, the forms of this one may match again
+            if i + 1 == len(self.starts):
+                break
+            position = self.text.find(query, self.starts[i+1])
+        return results
+
+
+def normalize(word):
+    """Normalized form of a term or user input, see the module description.
+
+    Args:
+        word (str): Term, spelling or user input, e.g. "Klima-Lüge".
+
+    Returns:
+        str: Normalized form, e.g. "klimaluege".
+    """
+
+    word = BINNEN_I.sub("", word.strip()).lower()
+    word = GENDER_MARKER.sub("", word)
+    return SEPARATORS.sub("", word).translate(UMLAUTS)
+
+def normalize_text(text):
+    """Normalizes running text (e.g. a tweet) so that normalize(term) in normalize_text(text)
+    is True if the text contains the term in any spelling.
+    Unlike normalize(), only spaces and hyphens after "Klima" are removed.
+
+    Args:
+        text (str): Text, e.g. "Die Klima-Lüge geht weiter".
+
+    Returns:
+        str: Normalized text, e.g. "die klimaluege geht weiter".
+    """
+
+    text = GENDER_MARKER.sub("", BINNEN_I.sub("", text).lower())
+    return TEXT_SEPARATORS.sub(PREFIX, text).translate(UMLAUTS)
+
+def spellings(term):
+    """The usual spellings of a term: as one word and with a hyphen after "Klima".
+
+    Args:
+        term (str): Term, e.g. "Klimalüge" or "Klima-Lüge".
+
+    Returns:
+        list(str): term first, e.g. ["Klimalüge", "Klima-Lüge"] or ["Klima-Lüge", "Klimalüge"].
+    """
+
+    head = term[len(PREFIX):]
+    if "-" in term:
+        return [term, term[:len(PREFIX)] + head.replace("-", "").lower()]
+    return [term, term[:len(PREFIX)] + "-" + head.capitalize()]
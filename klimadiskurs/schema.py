@@ -0,0 +1,223 @@
+# Schema file
+# Validates glossary entries against tools/glossary.schema.json, when the app loads glossary.json
+# (see glossary.py) and in the tools that write it.
+# The schema is compiled into Python source code once, e.g. {"type": "string"} for "term" becomes
+# 'if type(v1) is not str: errors.append(...)'. Validating an entry runs these few lines instead of
+# walking the schema, and error messages are only formatted for invalid values.
+# Only the keywords below are supported, compile_schema() raises ValueError for any other keyword,
+# so a schema change can't be silently ignored.
+# This module doesn't import the app, so the tools can import it without the app config
+# (like normalization.py).
+
+import json
+import os
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools",
+                           "glossary.schema.json")
+# maximum number of errors in the message of InvalidGlossaryError
+MAX_ERRORS = 20
+
+# JSON type -> condition for a valid value v, bool is a subclass of int in Python
+TYPES = {"string": "type({v}) is str", "integer": "type({v}) is int",
+         "number": "type({v}) in (int, float)", "boolean": "type({v}) is bool",
+         "array": "type({v}) is list", "object": "type({v}) is dict", "null": "{v} is None"}
+# JSON type -> Python types of valid values, for arrays (see "items" below)
+PYTHON_TYPES = {"string": "str", "integer": "int", "number": "int, float", "boolean": "bool",
+                "array": "list", "object": "dict", "null": "type(None)"}
+# keywords that don't affect validation
+ANNOTATIONS = {"$schema", "$id", "$comment", "title", "description", "default", "examples"}
+KEYWORDS = {"type", "properties", "required", "additionalProperties", "items", "uniqueItems",
+            "enum", "minimum", "minLength"}
+
+
+class InvalidGlossaryError(ValueError):
+    """Raised if glossary entries don't match the schema."""
+
+    def __init__(self, source, errors):
+        """Constructor.
+
+        Args:
+            source (str): Where the entries come from, e.g. the path to glossary.json.
+            errors (list(str)): Error messages, e.g. ["Klimaleugner.id: expected integer"].
+        """
+
+        self.errors = errors
+        message = f"{source}: {len(errors)} schema errors\n" + "\n".join(errors[:MAX_ERRORS])
+        if len(errors) > MAX_ERRORS:
+            message += f"\n... and {len(errors) - MAX_ERRORS} more"
+        super().__init__(message)
+
+
+def compile_schema(schema):
+    """Compiles a JSON schema into a validation function.
+
+    Args:
+        schema (dict): The schema.
+
+    Returns:
+        function(value, path, errors): Appends a message to the list errors for every violation,
+        e.g. "Klimaleugner.sources[2]: expected string" for path "Klimaleugner".
+
+    Raises:
+        ValueError: If the schema uses unsupported keywords.
+    """
+
+    lines = ["def validate(v0, path, errors):"]
+    __generate(schema, 0, "{path}", lines, 1)
+    namespace = {"_unique": __unique, "_missing": object()}
+    exec(compile("\n".join(lines), "<glossary schema>", "exec"), namespace)
+    return namespace["validate"]
+
+def __generate(schema, depth, path, lines, indent):
+    """Appends the code that validates the variable v<depth> against schema.
+
+    Args:
+        schema (dict): (Sub-)schema.
+        depth (int): Nesting depth, the value is in v<depth>, nested values go to v<depth+1>.
+        path (str): f-string expression of the path of the value, e.g. "{path}.sources[{i1}]".
+        lines (list(str)): Generated lines.
+        indent (int): Indentation level.
+    """
+
+    unknown = set(schema) - KEYWORDS - ANNOTATIONS
+    if unknown:
+        raise ValueError(f"Unsupported schema keywords: {', '.join(sorted(unknown))}")
+    v, child = f"v{depth}", f"v{depth + 1}"
+    pad = "    " * indent
+    def error(message, pad=pad + "    ", path=path):
+        lines.append(f"{pad}errors.append(f{path + ': ' + message!r})")
+
+    types = schema.get("type", [])
+    types = [types] if isinstance(types, str) else types
+    if "enum" in schema:
+        lines.append(f"{pad}if {v} not in {schema['enum']!r}:")
+        error(f"must be one of {schema['enum']}")
+
+    # the other keywords only apply to values of one type: JSON type -> code for these values
+    blocks = dict()
+    if "required" in schema or "properties" in schema or "additionalProperties" in schema:
+        body = blocks["object"] = []
+        for key in schema.get("required", ()):
+            body.append(f"{pad}    if {key!r} not in {v}:")
+            error(f"missing {key!r}", pad + "        ")
+            body.append(lines.pop())
+        properties = schema.get("properties", {})
+        for key, subschema in properties.items():
+            body.append(f"{pad}    {child} = {v}.get({key!r}, _missing)")
+            body.append(f"{pad}    if {child} is not _missing:")
+            __generate(subschema, depth + 1, path + "." + __escape(key), body, indent + 2)
+        additional = schema.get("additionalProperties")
+        if isinstance(additional, dict):
+            body.append(f"{pad}    for k{depth}, {child} in {v}.items():")
+            if properties:
+                body.append(f"{pad}        if k{depth} in {set(properties)!r}: continue")
+            __generate(additional, depth + 1, path + f".{{k{depth}}}", body, indent + 2)
+        elif additional is False:
+            body.append(f"{pad}    for k{depth} in {v}.keys() - {set(properties)!r}:")
+            error("not allowed", pad + "        ", path + f".{{k{depth}}}")
+            body.append(lines.pop())
+    if "items" in schema or schema.get("uniqueItems"):
+        body = blocks["array"] = []
+        items = schema.get("items", {})
+        unique = schema.get("uniqueItems")
+        item_types = items.get("type", [])
+        item_types = [item_types] if isinstance(item_types, str) else item_types
+        if item_types and set(items) - ANNOTATIONS == {"type"}:
+            # only item types: compare the set of Python types first, which runs in C, and only
+            # look at the items one by one to report errors. Scalars can be compared with a set.
+            allowed = "{" + ", ".join(PYTHON_TYPES[t] for t in item_types) + "}"
+            body.append(f"{pad}    if {v} and not {{*map(type, {v})}} <= {allowed}:")
+            body.append(f"{pad}        for i{depth}, {child} in enumerate({v}):")
+            __generate(items, depth + 1, path + f"[{{i{depth}}}]", body, indent + 3)
+            if unique and not set(item_types) & {"array", "object"}:
+                body.append(f"{pad}    elif len({v}) > 1 and len({{*{v}}}) < len({v}):")
+                error("items are not unique", pad + "        ")
+                body.append(lines.pop())
+                unique = False
+        elif items:
+            body.append(f"{pad}    for i{depth}, {child} in enumerate({v}):")
+            __generate(items, depth + 1, path + f"[{{i{depth}}}]", body, indent + 2)
+        if unique:
+            body.append(f"{pad}    if len({v}) > 1 and not _unique({v}):")
+            error("items are not unique", pad + "        ")
+            body.append(lines.pop())
+    if "minLength" in schema:
+        blocks["string"] = [f"{pad}    if len({v}) < {schema['minLength']!r}:"]
+        error(f"shorter than {schema['minLength']}", pad + "        ")
+        blocks["string"].append(lines.pop())
+    if "minimum" in schema:
+        blocks["number"] = [f"{pad}    if {v} < {schema['minimum']!r}:"]
+        error(f"less than {schema['minimum']}", pad + "        ")
+        blocks["number"].append(lines.pop())
+
+    if len(types) == 1 and set(blocks) <= set(types):
+        # the common case: one type, checked once
+        if blocks:
+            lines.append(f"{pad}if {TYPES[types[0]].format(v=v)}:")
+            lines.extend(blocks[types[0]])
+            lines.append(f"{pad}else:")
+        else:
+            lines.append(f"{pad}if not ({TYPES[types[0]].format(v=v)}):")
+        error(f"expected {types[0]}")
+    else:
+        if types:
+            lines.append(f"{pad}if not ({' or '.join(TYPES[t].format(v=v) for t in types)}):")
+            error(f"expected {' or '.join(types)}")
+        for t, body in blocks.items():
+            lines.append(f"{pad}if {TYPES[t].format(v=v)}:")
+            lines.extend(body)
+    if lines[-1].endswith(":"):
+        # a schema without keywords (or only annotations) accepts everything
+        lines.append(f"{pad}pass")
+
+def __escape(key):
+    """Escapes a property name for the f-string of a path."""
+
+    return key.replace("{", "{{").replace("}", "}}")
+
+def __unique(values):
+    """Whether all values of a list are different. Lists and dicts are compared as JSON."""
+
+    try:
+        return len(set(values)) == len(values)
+    except TypeError:
+        encoded = [json.dumps(v, sort_keys=True) for v in values]
+        return len(set(encoded)) == len(encoded)
+
+# compiled validators of the glossary schema, created on first use
+__validators = dict()
+
+def __validator(name):
+    if not __validators:
+        with open(SCHEMA_PATH, encoding="utf-8") as f:
+            schema = json.load(f)
+        __validators["glossary"] = compile_schema(schema)
+        __validators["entry"] = compile_schema(schema.get("additionalProperties", {}))
+    return __validators[name]
+
+def entry_validator():
+    """The compiled validator of a single glossary entry, see compile_schema().
+    Used by glossary.py while loading, where the entries are parsed one by one."""
+
+    return __validator("entry")
+
+def validate_glossary(glossary, terms=None):
+    """Validates a glossary against the schema.
+
+    Args:
+        glossary (dict): The glossary as parsed from glossary.json.
+        terms (iterable(str), optional): Only validate these entries, e.g. the ones changed by a
+            tool. Defaults to None = the whole glossary.
+
+    Returns:
+        list(str): Error messages, empty if the glossary is valid.
+    """
+
+    errors = []
+    if terms is None:
+        __validator("glossary")(glossary, "glossary", errors)
+    else:
+        validate = __validator("entry")
+        for term in terms:
+            validate(glossary[term], term, errors)
+    return errors
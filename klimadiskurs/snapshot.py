@@ -0,0 +1,49 @@
+# Snapshot file
+# Format of the binary glossary snapshot, written by tools/create_snapshot.py and memory-mapped by
+# the app (GlossarySnapshot in glossary.py).
+# File layout (all integers little-endian):
+#   header:  magic "KDSNAP", format version, number of entries, size and mtime (ns) of the
+#            glossary.json it was built from, offset of the key blob, offset of the entry blob
+#   index:   one fixed-size record per entry, sorted by key (UTF-8 byte order):
+#            key offset, key length, entry offset, entry length, id, flags
+#   keys:    all keys, UTF-8 encoded, concatenated
+#   entries: all entries as compact JSON with the keys in FIELDS, concatenated
+# Increase VERSION when the layout changes, the app then falls back to glossary.json until the
+# snapshot is built again.
+# This module doesn't import the app, so the tools can import it without the app config
+# (like normalization.py).
+
+import struct
+
+# all keys of a glossary entry, see tools/glossary.schema.json
+FIELDS = ("term", "id", "definition", "sources", "related", "spellings", "examples", "association",
+          "dwds")
+
+MAGIC = b"KDSNAP"
+VERSION = 1
+HEADER = struct.Struct("<6sHIQqQQ")
+RECORD = struct.Struct("<IHQIIB")
+# flags: bit 0 = has definition, bit 1 = has sources, bit 2/3 = used by group 0/1
+FLAG_DEFINITION, FLAG_SOURCES, FLAG_GROUP_0, FLAG_GROUP_1 = 1, 2, 4, 8
+
+
+def flags(entry):
+    """Summary bits of an entry, so the app can list e.g. all defined terms without decoding.
+
+    Args:
+        entry (dict): The entry as parsed from glossary.json.
+
+    Returns:
+        int: The flags.
+    """
+
+    result = 0
+    if entry.get("definition"):
+        result |= FLAG_DEFINITION
+    if entry.get("sources"):
+        result |= FLAG_SOURCES
+    if 0 in entry.get("association", []):
+        result |= FLAG_GROUP_0
+    if 1 in entry.get("association", []):
+        result |= FLAG_GROUP_1
+    return result
@@ -17,38 +17,147 @@ $(document).on("click", ".alpha", function (e) {
     makeAjaxCall(searchTerm);
 });
 
-/** Actual AJAX call:
- * Get search result from /api route in routes.py
+// "did you mean" suggestion: search for the suggested term
+$(document).on("click", ".suggestion", function (e) {
+    e.preventDefault();
+    makeAjaxCall($(this).text().toLowerCase());
+});
+
+// autocomplete: while the user types, show matching terms below the search field
+// requests wait until the user stops typing for a moment, answers are also cached by the browser
+const suggestDelay = 100;
+const suggestCache = new Map();
+var suggestTimeout;
+$(document).on("input", "#query", function () {
+    clearTimeout(suggestTimeout);
+    const prefix = $(this).val().trim().toLowerCase();
+    if (!prefix) { return showSuggestions([]); }
+    if (suggestCache.has(prefix)) { return showSuggestions(suggestCache.get(prefix)); }
+    suggestTimeout = setTimeout(function () {
+        $.getJSON("/api/suggest", {"q": prefix}, function (terms) {
+            suggestCache.set(prefix, terms);
+            // only show the answer if the user hasn't typed on in the meantime
+            if ($("#query").val().trim().toLowerCase() === prefix) { showSuggestions(terms); }
+        });
+    }, suggestDelay);
+});
+
+/** Replaces the autocomplete options of the search field */
+function showSuggestions (terms) {
+    const datalist = document.getElementById("query-suggestions");
+    datalist.replaceChildren(...terms.map(term => new Option(term)));
+}
+
+// local search: the search index (tools/create_search_index.py) has all terms, their normalized
+// forms and which of them have a definition page. It is loaded once per page, on the first search,
+// and answers all searches with results. Searches without results go to /api, which suggests
+// similar terms. If there is no index, or it is from another glossary version, /api is used.
+const searchIndexFormat = 1;
+var searchIndex;
+
+/** Promise of the decoded search index, null if it can't be used */
+function loadSearchIndex () {
+    if (!searchIndex) {
+        searchIndex = $.getJSON("/api/search-index").then(decodeSearchIndex, function () {
+            return null;
+        });
+    }
+    return searchIndex;
+}
+
+/** Decodes the front-coded terms and forms of the search index */
+function decodeSearchIndex (data) {
+    if (data.format !== searchIndexFormat || data.version !== glossaryVersion) { return null; }
+    return {terms: frontDecode(data.terms), forms: frontDecode(data.forms), pages: data.pages};
+}
+
+/** [0, "Klimaleugner", 10, "ung"] -> ["Klimaleugner", "Klimaleugnung"] */
+function frontDecode (coded) {
+    const strings = [];
+    var previous = "";
+    for (var i = 0; i < coded.length; i += 2) {
+        previous = previous.slice(0, coded[i]) + coded[i + 1];
+        strings.push(previous);
+    }
+    return strings;
+}
+
+// same normalization as normalization.py, e.g. "Klima-Lüge" -> "klimaluege"
+// (?![\p{L}\p{N}_]) is Python's \b after a letter, \b in JavaScript only knows ASCII letters
+const binnenI = /(?<=[a-zäöüß])In(?:nen)?(?![\p{L}\p{N}_])/gu;
+const genderMarker = /(?:[*:_]|\/-?)in(?:nen)?(?![\p{L}\p{N}_])/gu;
+const separators = /[\s\-‐‑]+/gu;
+const umlauts = {"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"};
+
+function normalize (word) {
+    word = word.trim().replace(binnenI, "").toLowerCase().replace(genderMarker, "");
+    return word.replace(separators, "").replace(/[äöüß]/g, c => umlauts[c]);
+}
+
+/** Indices of the terms that contain searchTerm in any spelling, like query_db() in utils.py */
+function searchLocally (index, searchTerm) {
+    const results = [];
+    const query = normalize(searchTerm);
+    for (var i = 0; i < index.terms.length; i++) {
+        if (searchTerm === "None" || index.forms[i].includes(query)) { results.push(i); }
+    }
+    return results;
+}
+
+/** Search: 
+ * Answer from the search index if possible, otherwise get the search result from /api (routes.py)
  * Replace glossary content with it and display pagination buttons if necessary
  */
 function makeAjaxCall (searchTerm) {
-    $.ajax({
-        type: "GET",
-        url: "/api",
-        data: {"query": searchTerm},
-        success: function (glossary) {
-            const resultsCount = Object.keys(glossary).length;
-
-            // replace header content with "Suchergebnisse"
-            $("#glossary-header").empty();
-            $("#glossary-header").append(`Suchergebnisse (${resultsCount})`)
-
-            // empty all glossary content
-            $("#glossary-content").empty();
-
-            const newContent = getGlossaryContent(glossary, resultsCount, searchTerm);
-            
-            // replace glossary content HTML with newContent
-            document.getElementById("glossary-content").innerHTML = newContent;
-
-            // call pagination.js
-            if (resultsCount > itemsPerPage) { pagination(resultsCount); }
+    loadSearchIndex().then(function (index) {
+        const results = index ? searchLocally(index, searchTerm) : [];
+        if (results.length) {
+            const terms = results.map(i => index.terms[i]);
+            const pages = new Set(results.filter(i => index.pages[i] === "1").map(i => index.terms[i]));
+            return showResults(terms, pages, searchTerm, []);
         }
+        $.ajax({
+            type: "GET",
+            url: "/api",
+            data: {"query": searchTerm},
+            success: function (glossary) {
+                // if there are no results, the API suggests similar terms instead
+                const suggestions = glossary._suggestions || [];
+                delete glossary._suggestions;
+                const terms = Object.keys(glossary);
+                const pages = new Set(terms.filter(t => glossary[t].definition.length ||
+                                                        glossary[t].sources.length));
+                showResults(terms, pages, searchTerm, suggestions);
+            }
+        });
     });
 }
 
-/** Helper function that generates the HTML for the search results */
-function getGlossaryContent (glossary, resultsCount, searchTerm) {
+/** Replaces the glossary content with the search results */
+function showResults (terms, pages, searchTerm, suggestions) {
+    const resultsCount = terms.length;
+
+    // replace header content with "Suchergebnisse"
+    $("#glossary-header").empty();
+    $("#glossary-header").append(`Suchergebnisse (${resultsCount})`)
+
+    // empty all glossary content
+    $("#glossary-content").empty();
+
+    const newContent = getGlossaryContent(terms, pages, searchTerm, suggestions);
+
+    // replace glossary content HTML with newContent
+    document.getElementById("glossary-content").innerHTML = newContent;
+
+    // call pagination.js
+    if (resultsCount > itemsPerPage) { pagination(resultsCount); }
+}
+
+/** Helper function that generates the HTML for the search results
+ * terms: result terms, pages: set of terms with a definition page (tweeted terms are added here)
+ */
+function getGlossaryContent (terms, pages, searchTerm, suggestions) {
+    const resultsCount = terms.length;
     // always show alphabet
     var newContent = `<div id="glossary-alphabet">`;
     for (var char in ["A", "Ä", "B", "C", "D", "E", "F", "G", "H", "I", "J", "K", "L", "M", "N", "O", "Ö", "P", "Q", "R", "S", "T", "U", "Ü", "V", "W", "X", "Y", "Z"]) {
@@ -59,6 +168,12 @@ function getGlossaryContent (glossary, resultsCount, searchTerm) {
     // if no search results
     if (!resultsCount) {
         newContent = "<p style='margin-top: 2em'>Die Suche erzielte leider keine Treffer.<p>";
+        // "did you mean" links, clicking one searches for that term
+        if (suggestions.length) {
+            newContent += "<p>Meinten Sie: ";
+            newContent += suggestions.map(s => `<a href='/search/${s}' class='suggestion'>${s}</a>`).join(", ");
+            newContent += "</p>";
+        }
         // insert submit button if submissions are enabled
         if (enableSubmissions) {
             newContent += "<p>Möchten Sie einen Glossareintrag vorschlagen?</p>";
@@ -69,31 +184,19 @@ function getGlossaryContent (glossary, resultsCount, searchTerm) {
     } else {
         // this is the javascript version of glossary.html
         var newContent = "<ul class='list'>";
-        for (var i = 0; i < resultsCount; i++) {
-            var entry = Object.keys(glossary)[i];
-            if (glossary[entry].definition.length ||
-                glossary[entry].sources.length ||
-                tweetedTerms.includes(entry)) {
-                newContent += `<li><a href='/def/${entry}'>${entry}</a></li>`;
+        const tweeted = new Set(tweetedTerms);
+        var items = "";
+        for (const entry of terms) {
+            if (pages.has(entry) || tweeted.has(entry)) {
+                items += `<li><a href='/def/${entry}'>${entry}</a></li>`;
             } else {
-                newContent += `<li>${entry}</li>`;
+                items += `<li>${entry}</li>`;
             }
         }
-        newContent += "</ul>";
+        newContent += items + "</ul>";
 
         // responsive design version for phone screens
-        newContent += "<ul class='glossary-one-list'>";
-        for (var i = 0; i < resultsCount; i++) {
-            var entry = Object.keys(glossary)[i];
-            if (glossary[entry].definition.length ||
-                glossary[entry].sources.length ||
-                tweetedTerms.includes(entry)) {
-                newContent += `<li><a href='/def/${entry}'>${entry}</a></li>`;
-            } else {
-                newContent += `<li>${entry}</li>`;
-            }
-        }
-        newContent += "</ul>";
+        newContent += "<ul class='glossary-one-list'>" + items + "</ul>";
 
         // add pagination if necessary
         // next and previous buttons
@@ -0,0 +1,43 @@
+# Test configuration
+# The tests cover the modules that work without the external APIs: normalization, schema, snapshots,
+# full-text search and the tools, and the app with the stand-ins of the APIs (benchmarks/stubs.py).
+# Run them from the root directory with "python -m pytest".
+# Importing the app modules reads the config, so the required variables get test values here,
+# before any test module imports klimadiskurs.
+
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# the tools import each other by module name, like when they are run from tools/
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+os.chdir(ROOT)
+
+# the app tests use the local stand-ins of Twitter, GitHub and DWDS, never the real APIs
+import stubs
+STUBS, STUB_ENV = stubs.start_all()
+os.environ.update(STUB_ENV)
+STUBS["github"].RequestHandlerClass.files["submissions.tsv"] = b"term\tid\tdefinition"
+
+os.environ.setdefault("ENABLE_SUBMISSIONS", "1")
+os.environ.setdefault("DEBUG_MODE", "0")
+os.environ.setdefault("APP_SECRET_KEY", "test")
+os.environ.setdefault("GLOSSARY_RELOAD_INTERVAL", "0")
+os.environ.setdefault("GLOSSARY_SNAPSHOT", "")
+
+
+@pytest.fixture(scope="session")
+def app():
+    """The app, created once. Importing the routes connects to the stand-ins."""
+
+    from klimadiskurs import create_app
+    return create_app()
+
+@pytest.fixture
+def client(app):
+    """Test client with its own cookies (session)."""
+
+    return app.test_client()
@@ -0,0 +1,7 @@
+# Stage functions for test_pipeline.py, imported by name in the pipeline's worker processes
+
+def concatenate(inputs, output):
+    with open(output, mode="w", encoding="utf-8") as f:
+        for path in inputs:
+            with open(path, encoding="utf-8") as source:
+                f.write(source.read())
@@ -0,0 +1,38 @@
+# Tests of the HTTP validators of the pages (klimadiskurs/app/caching.py)
+
+import re
+
+THANKS = "Vielen Dank!"
+
+
+def revalidate(client, url, response):
+    return client.get(url, headers={"If-None-Match": response.headers["ETag"]})
+
+
+def test_page_is_revalidated(client):
+    first = client.get("/about/")
+    assert first.status_code == 200
+    assert "private" in first.headers["Cache-Control"]
+    assert "Last-Modified" not in first.headers
+    assert revalidate(client, "/about/", first).status_code == 304
+
+def test_page_of_other_session_is_not_reused(client, app):
+    first = client.get("/about/")
+    assert revalidate(app.test_client(), "/about/", first).status_code == 200
+
+def test_flash_after_submission_is_shown(client):
+    page = client.get("/")
+    token = re.search(r'name="csrf-token" content="([^"]+)"', page.get_data(as_text=True))[1]
+    form = {"csrf_token": token, "url": "", "term": "Klimatestbegriff", "definition": "",
+            "association": "", "sources": "https://example.org/quelle", "examples": ""}
+    response = client.post("/", data=form)
+    assert response.status_code == 302
+    # the page the browser already has doesn't show the message
+    redirected = revalidate(client, "/", page)
+    assert redirected.status_code == 200
+    assert THANKS in redirected.get_data(as_text=True)
+    # the message was shown, the page without it is rendered again and can be revalidated
+    after = revalidate(client, "/", redirected)
+    assert after.status_code == 200
+    assert THANKS not in after.get_data(as_text=True)
+    assert revalidate(client, "/", after).status_code == 304
@@ -0,0 +1,37 @@
+# Tests of the glossary exports (klimadiskurs/app/exports.py)
+
+import json
+import pytest
+from klimadiskurs import db
+from klimadiskurs.config import GLOSSARY_PATH
+from klimadiskurs.glossary import load_glossary
+
+
+@pytest.fixture
+def reloaded(tmp_path):
+    """A glossary with the same terms and other definitions. db is swapped back afterwards."""
+
+    with open(GLOSSARY_PATH, encoding="utf-8") as f:
+        entries = json.load(f)
+    for entry in entries.values():
+        entry["definition"] = "reloaded"
+    path = tmp_path / "glossary.json"
+    path.write_text(json.dumps(entries, ensure_ascii=False), encoding="utf-8")
+    original = db.current
+    yield load_glossary(str(path))
+    db.swap(original)
+
+
+def test_export_has_all_entries(client):
+    response = client.get("/download/ndjson")
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line)["term"] for line in lines] == sorted(db)
+
+def test_export_stays_on_its_version_during_a_reload(client, reloaded):
+    response = client.get("/download/ndjson?query=klima")
+    chunks = iter(response.response)
+    first = next(chunks)
+    db.swap(reloaded)
+    lines = (first + b"".join(chunks)).decode("utf-8").splitlines()
+    assert len(lines) == len(reloaded)
+    assert all(json.loads(line)["definition"] != "reloaded" for line in lines)
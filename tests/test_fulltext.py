@@ -0,0 +1,58 @@
+# Tests of klimadiskurs/app/fulltext.py
+
+import pytest
+from klimadiskurs.app.fulltext import FulltextIndex, analyze_text, snippet
+
+
+class Glossary(dict):
+    """Stand-in for db: a dict of entries with a version."""
+
+    version = "test"
+
+def entry(definition="", examples=(), sources=()):
+    return {"definition": definition, "examples": list(examples), "sources": list(sources)}
+
+
+@pytest.mark.parametrize("word, stem", [
+    ("Aktivist", "aktivist"), ("Aktivisten", "aktivist"),
+    ("Klimaleugner", "klimaleugn"), ("Klimaleugnern", "klimaleugn"),
+    ("Ergebnisse", "ergebnis"), ("Kinder", "kind"), ("Tests", "test"),
+    # R1: the root is never cut
+    ("Test", "test"), ("Haus", "haus"), ("Häuser", "haeus"), ("Rebellion", "rebellion"),
+    # umlauts are transliterated like in normalization.py
+    ("Gelände", "gelaend"), ("Gelaende", "gelaend"), ("wärmsten", "waerm"),
+])
+def test_stems(word, stem):
+    assert analyze_text(word) == [stem]
+
+def test_stopwords_are_dropped():
+    assert analyze_text("für die Zukunft") == ["zukunft"]
+
+def test_search_ranks_matching_entries():
+    glossary = Glossary({
+        "Klimaaktivismus": entry("Protest von Aktivisten", ["Extinction Rebellion blockiert"]),
+        "Klimaleugner": entry("Leugnet den Klimawandel"),
+        "Klimaziel": entry(sources=["https://example.org/ziele"]),
+    })
+    index = FulltextIndex(glossary)
+    assert [term for _, term in index.search("Rebellion")] == ["Klimaaktivismus"]
+    assert [term for _, term in index.search("Aktivist")] == ["Klimaaktivismus"]
+    assert index.search("nichts") == []
+
+def test_umlaut_transliterations_match():
+    index = FulltextIndex(Glossary({"Klimaschutz": entry("Schutz für das Gelände")}))
+    assert [term for _, term in index.search("Gelaende")] == ["Klimaschutz"]
+    assert str(snippet(entry("Schutz für das Gelände"), "Gelaende")) \
+        == "Schutz für das <mark>Gelände</mark>"
+
+def test_entries_without_text():
+    index = FulltextIndex(Glossary({"Klimaa": entry(), "Klimab": entry()}))
+    assert index.search("klima") == []
+
+def test_empty_glossary():
+    assert FulltextIndex(Glossary()).search("klima") == []
+
+def test_snippet_marks_matches():
+    text = snippet(entry("Die Aktivisten blockieren eine Straße"), "Aktivist")
+    assert str(text) == "Die <mark>Aktivisten</mark> blockieren eine Straße"
+    assert snippet(entry("Nichts davon"), "Aktivist") == ""
@@ -0,0 +1,23 @@
+# Tests of the in-memory glossary entries (klimadiskurs/glossary.py)
+
+import pytest
+from klimadiskurs.glossary import Entry
+
+ENTRY = {"term": "Klimawandel", "id": 1, "definition": "Änderung des Klimas", "sources": ["DWDS"],
+         "related": ["Klimakrise"], "spellings": ["Klima-Wandel"], "examples": ["Ein Satz."],
+         "association": [0, 1], "dwds": "none"}
+
+
+@pytest.mark.parametrize("examples", [[], [""], ["", ""], ["Ein Satz.", ""], ["Ein Satz."]])
+def test_examples_round_trip(examples):
+    entry = Entry(**{**ENTRY, "examples": examples})
+    assert entry.examples == tuple(examples)
+    assert entry.to_dict() == {**ENTRY, "examples": examples}
+
+def test_entries_are_read_like_dicts():
+    entry = Entry(**ENTRY)
+    assert entry["related"] == ("Klimakrise",)
+    assert entry.get("missing", 0) == 0
+    assert dict(entry.items())["association"] == (0, 1)
+    with pytest.raises(AttributeError):
+        entry.definition = "changed"
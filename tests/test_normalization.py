@@ -0,0 +1,73 @@
+# Tests of klimadiskurs/normalization.py
+
+import pytest
+from klimadiskurs.normalization import SCAN_AFTER, TermIndex, normalize, normalize_text, spellings
+
+
+@pytest.mark.parametrize("written", [
+    "Klimalüge", "Klima-Lüge", "klima lüge", "Klimaluege", "KLIMALÜGE", " Klima‐Lüge ",
+])
+def test_normalize_spellings(written):
+    assert normalize(written) == "klimaluege"
+
+@pytest.mark.parametrize("written", [
+    "Klimaretter", "KlimaretterIn", "KlimaretterInnen", "Klimaretter*innen", "Klimaretter:in",
+    "Klimaretter_innen", "Klimaretter/-in",
+])
+def test_normalize_gender_markers(written):
+    assert normalize(written) == "klimaretter"
+
+def test_normalize_sharp_s():
+    assert normalize("Klimaschutzmaßnahme") == normalize("Klimaschutzmassnahme")
+
+def test_normalize_text():
+    text = normalize_text("Die Klima-Lüge der KlimaleugnerInnen geht weiter")
+    assert text == "die klimaluege der klimaleugner geht weiter"
+    assert normalize("Klimaleugner") in text
+    # only separators after "Klima" join words
+    assert normalize_text("Das Klima ändert sich") == "das klimaaendert sich"
+    assert normalize_text("gut - schlecht") == "gut - schlecht"
+
+def test_spellings():
+    assert spellings("Klimalüge") == ["Klimalüge", "Klima-Lüge"]
+    assert spellings("Klima-Lüge") == ["Klima-Lüge", "Klimalüge"]
+
+
+GLOSSARY = {
+    "Klimalüge": {"spellings": ["Klima-Lüge"]},
+    "Klimaleugner": {"spellings": ["Klimaleugnerin"]},
+    "Klimaleugnung": {"spellings": []},
+}
+
+def test_lookup():
+    index = TermIndex(GLOSSARY)
+    assert index.lookup("klima-lüge") == "Klimalüge"
+    assert index.lookup("Klimaleugnerin") == "Klimaleugner"
+    # the compound head alone
+    assert index.lookup("leugnung") == "Klimaleugnung"
+    assert index.lookup("Klimawandel") is None
+
+def test_lookup_priorities():
+    # "Klimaluge" is the dotless form of "Klimalüge", but a term wins over it
+    assert TermIndex(GLOSSARY).lookup("Klimaluge") == "Klimalüge"
+    glossary = {"Klimalüge": {"spellings": []}, "Klimaluge": {"spellings": []}}
+    assert TermIndex(glossary).lookup("Klimaluge") == "Klimaluge"
+
+def test_search():
+    index = TermIndex(GLOSSARY)
+    assert index.search("leugn") == ["Klimaleugner", "Klimaleugnung"]
+    assert index.search("Klima-L") == list(GLOSSARY)
+    assert index.search("") == list(GLOSSARY)
+    assert index.search("wandel") == []
+    # matches of a spelling, each term only once
+    assert index.search("leugnerin") == ["Klimaleugner"]
+
+def test_search_many_matches():
+    # more than SCAN_AFTER matches switch to testing the terms one by one
+    glossary = {f"Klima{i:05d}{'x' if i % 3 else ''}": {"spellings": []}
+                for i in range(3 * SCAN_AFTER)}
+    index = TermIndex(glossary)
+    expected = [term for term in glossary if term.endswith("x")]
+    assert index.search("x") == expected
+    assert index.search("klima") == list(glossary)
+    assert TermIndex({}).search("klima") == []
@@ -0,0 +1,100 @@
+# Tests of tools/pipeline.py
+
+import pytest
+import pipeline
+from pipeline import Stage, run_pipeline
+
+# module-level names are not mangled, the tests can call the helpers directly
+check = pipeline.__check
+
+
+def stage(name, inputs, outputs, keep=False):
+    return Stage(name, "test", inputs, outputs, "stage_functions", "concatenate",
+                 {"inputs": [i for i in inputs if i not in outputs], "output": outputs[0]},
+                 keep=keep)
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Runs the test in an empty directory with the file source.txt."""
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "source.txt").write_text("source\n", encoding="utf-8")
+    return tmp_path
+
+@pytest.fixture
+def stages(workdir, monkeypatch):
+    """a: source.txt -> a.txt, b: a.txt + missing.txt -> b.txt, c: a.txt -> c.txt"""
+
+    stages = [stage("a", ["source.txt"], ["a.txt"]),
+              stage("b", ["a.txt", "missing.txt"], ["b.txt"]),
+              stage("c", ["a.txt"], ["c.txt"])]
+    monkeypatch.setattr(pipeline, "STAGES", stages)
+    return stages
+
+
+def test_check_runs_new_stage(stages):
+    status, hashes = check(stages[0], {}, {}, set(), {"a": set()}, {})
+    assert status == "run"
+    assert set(hashes) == {"source.txt"}
+
+def test_check_skips_up_to_date_stage(stages, workdir):
+    files = {}
+    _, hashes = check(stages[0], {}, files, set(), {"a": set()}, {})
+    (workdir / "a.txt").write_text("source\n", encoding="utf-8")
+    state = {"stages": {"a": hashes}}
+    assert check(stages[0], state, files, set(), {"a": set()}, {})[0] == "up to date"
+    # forced, changed input or missing output
+    assert check(stages[0], state, files, {"a"}, {"a": set()}, {})[0] == "run"
+    (workdir / "source.txt").write_text("changed\n", encoding="utf-8")
+    assert check(stages[0], state, files, set(), {"a": set()}, {})[0] == "run"
+    (workdir / "a.txt").unlink()
+    assert check(stages[0], {"stages": {"a": hashes}}, {}, set(), {"a": set()}, {})[0] == "run"
+
+def test_check_missing_inputs(stages):
+    status, _ = check(stages[1], {}, {}, set(), {"b": {"a"}}, {"a": "done"})
+    assert status == "skipped, missing a.txt, missing.txt"
+
+def test_check_blocked_by_failed_dependency(stages):
+    assert check(stages[2], {}, {}, set(), {"c": {"a"}}, {"a": "failed"})[0] == "blocked"
+
+def test_check_dry_run(stages):
+    # the output of a stage that would run counts as there, other missing inputs don't
+    done = {"a": "would run"}
+    assert check(stages[2], {}, {}, set(), {"c": {"a"}}, done) == ("run", None)
+    assert check(stages[1], {}, {}, set(), {"b": {"a"}}, done)[0] \
+        == "skipped, missing missing.txt"
+
+def test_check_kept_stage(stages, workdir):
+    kept = stage("k", ["missing.txt"], ["k.txt"], keep=True)
+    (workdir / "k.txt").write_text("edited\n", encoding="utf-8")
+    assert check(kept, {}, {}, set(), {"k": set()}, {})[0] == "kept, k.txt exists"
+    assert check(kept, {}, {}, {"k"}, {"k": set()}, {})[0] == "skipped, missing missing.txt " \
+                                                            "(using the existing outputs)"
+
+
+def statuses(output):
+    return dict(line[1:].split("] ", 1) for line in output.splitlines() if line.startswith("["))
+
+def test_run_pipeline(stages, workdir, capsys):
+    state = str(workdir / "state.json")
+    assert run_pipeline(dry_run=True, jobs=1, state_path=state)
+    dry = statuses(capsys.readouterr().out)
+    assert dry == {"a": "would run", "b": "skipped, missing missing.txt", "c": "would run"}
+
+    assert run_pipeline(jobs=1, state_path=state)
+    real = statuses(capsys.readouterr().out)
+    # the dry run reported what the run did
+    assert {name: status.split(" in ")[0] for name, status in real.items()} \
+        == {"a": "done", "b": "skipped, missing missing.txt", "c": "done"}
+    assert (workdir / "c.txt").read_text(encoding="utf-8") == "source\n"
+
+    run_pipeline(jobs=1, state_path=state)
+    assert statuses(capsys.readouterr().out)["c"] == "up to date"
+    (workdir / "source.txt").write_text("changed\n", encoding="utf-8")
+    run_pipeline(["c"], jobs=1, state_path=state)
+    assert set(statuses(capsys.readouterr().out)) == {"a", "c"}
+    assert (workdir / "c.txt").read_text(encoding="utf-8") == "changed\n"
+
+def test_unknown_target(stages):
+    with pytest.raises(ValueError):
+        run_pipeline(["nothing"])
@@ -0,0 +1,19 @@
+# Tests of the request profiler's phases (klimadiskurs/app/profiler.py)
+
+from threading import get_ident
+from klimadiskurs.app import profiler
+
+
+def test_phase_does_nothing_without_profile():
+    assert profiler.phase("render:about.html") is profiler.phase("upstream:dwds")
+    with profiler.phase("render:about.html"):
+        pass
+
+def test_only_outermost_phase_is_timed(monkeypatch):
+    profile = profiler.Profile("/about/")
+    monkeypatch.setitem(profiler._active, get_ident(), profile)
+    with profiler.phase("render:about.html"):
+        with profiler.phase("upstream:dwds"):
+            assert profile.phases == ["view", "render:about.html", "upstream:dwds"]
+    assert profile.phases == ["view"]
+    assert set(profile.phase_times) == {"render:about.html"}
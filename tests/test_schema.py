@@ -0,0 +1,71 @@
+# Tests of klimadiskurs/schema.py
+
+import pytest
+from klimadiskurs.schema import MAX_ERRORS, InvalidGlossaryError, compile_schema, \
+                                entry_validator, validate_glossary
+
+ENTRY = {"term": "Klimawandel", "id": 1, "definition": "Änderung des Klimas", "sources": ["DWDS"],
+         "related": ["Klimakrise"], "spellings": [], "examples": ["Ein Satz."], "association": [0],
+         "dwds": "none"}
+
+
+def errors_of(schema, value):
+    errors = []
+    compile_schema(schema)(value, "x", errors)
+    return errors
+
+
+def test_valid_glossary():
+    assert validate_glossary({"Klimawandel": ENTRY}) == []
+    assert validate_glossary({}) == []
+
+def test_entry_errors():
+    errors = []
+    entry_validator()({**ENTRY, "id": "1", "sources": ["a", 2], "dwds": ""}, "Klimawandel", errors)
+    assert errors == ["Klimawandel.id: expected integer", "Klimawandel.sources[1]: expected string",
+                      "Klimawandel.dwds: shorter than 1"]
+
+def test_missing_required_keys():
+    errors = validate_glossary({"Klimawandel": {"term": "Klimawandel"}})
+    assert errors == ["glossary.Klimawandel: missing 'id'",
+                      "glossary.Klimawandel: missing 'association'"]
+
+def test_only_given_terms_are_validated():
+    glossary = {"Klimawandel": ENTRY, "Klimaleugner": {"term": "Klimaleugner"}}
+    assert validate_glossary(glossary, ["Klimawandel"]) == []
+    assert validate_glossary(glossary, ["Klimaleugner"]) != []
+
+def test_bool_is_not_integer():
+    assert errors_of({"type": "integer"}, True) == ["x: expected integer"]
+    assert errors_of({"type": "number"}, 1.5) == []
+
+def test_unique_items():
+    schema = {"type": "array", "items": {"type": "string"}, "uniqueItems": True}
+    assert errors_of(schema, ["a", "b"]) == []
+    assert errors_of(schema, ["a", "a"]) == ["x: items are not unique"]
+    # items that can't be hashed are compared as JSON
+    schema = {"type": "array", "uniqueItems": True}
+    assert errors_of(schema, [[1], {"a": 1}]) == []
+    assert errors_of(schema, [{"a": 1, "b": 2}, {"b": 2, "a": 1}]) == ["x: items are not unique"]
+
+def test_additional_properties_false():
+    schema = {"type": "object", "properties": {"a": {}}, "additionalProperties": False}
+    assert errors_of(schema, {"a": 1}) == []
+    assert errors_of(schema, {"a": 1, "b": 2}) == ["x.b: not allowed"]
+
+def test_several_types_enum_and_minimum():
+    assert errors_of({"type": ["string", "null"]}, None) == []
+    assert errors_of({"type": ["string", "null"]}, 1) == ["x: expected string or null"]
+    assert errors_of({"enum": [0, 1]}, 2) == ["x: must be one of [0, 1]"]
+    assert errors_of({"type": "integer", "minimum": 0}, -1) == ["x: less than 0"]
+
+def test_unsupported_keyword():
+    with pytest.raises(ValueError, match="pattern"):
+        compile_schema({"type": "string", "pattern": "^Klima"})
+
+def test_error_message_is_shortened():
+    errors = [f"error {i}" for i in range(MAX_ERRORS + 5)]
+    error = InvalidGlossaryError("glossary.json", errors)
+    assert error.errors == errors
+    assert str(error).startswith(f"glossary.json: {MAX_ERRORS + 5} schema errors\nerror 0\n")
+    assert str(error).endswith("\n... and 5 more")
@@ -0,0 +1,33 @@
+# Tests of tools/create_search_index.py: the front coding is decoded by frontDecode() in search.js
+
+import json
+import re
+import shutil
+import subprocess
+import pytest
+from create_search_index import front_code
+
+SEARCH_JS = "klimadiskurs/static/js/search.js"
+STRINGS = ["Klimaleugner", "Klimaleugnung", "Klimaleugnung", "Klimaöl", "Klimaölpreis", "Klima",
+           "", "Klima-Lüge", "Klima🌍", "Klima🌍Lüge", "Klima🌎"]
+
+
+def front_decode(coded):
+    """Runs frontDecode() of search.js with Node.js."""
+
+    with open(SEARCH_JS, encoding="utf-8") as f:
+        function = re.search(r"^function frontDecode .*?^}", f.read(), re.M | re.S).group()
+    script = f"{function}\nconsole.log(JSON.stringify(frontDecode({json.dumps(coded)})));"
+    result = subprocess.run(["node", "-e", script], capture_output=True, check=True,
+                            encoding="utf-8")
+    return json.loads(result.stdout)
+
+
+def test_front_code():
+    assert front_code(["Klimaleugner", "Klimaleugnung"]) == [0, "Klimaleugner", 10, "ung"]
+    assert front_code([]) == []
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs Node.js")
+def test_search_js_decodes_front_code():
+    assert front_decode(front_code(STRINGS)) == STRINGS
+    assert front_decode(front_code(sorted(STRINGS))) == sorted(STRINGS)
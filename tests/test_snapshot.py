@@ -0,0 +1,54 @@
+# Tests of the glossary snapshot: tools/create_snapshot.py writes it, glossary.py reads it
+
+import json
+import pytest
+from create_snapshot import create_snapshot
+from klimadiskurs import snapshot
+from klimadiskurs.glossary import GlossarySnapshot
+
+GLOSSARY = {
+    "Klimawandel": {"term": "Klimawandel", "id": 1, "definition": "Änderung des Klimas",
+                    "sources": ["DWDS"], "association": [0, 1],
+                    "dwds": "https://www.dwds.de/wb/Klimawandel"},
+    "Klimaleugner": {"term": "Klimaleugner", "id": 2, "spellings": ["Klima-Leugner"],
+                     "examples": ["Ein Satz.", "Noch ein Satz."], "association": [1]},
+    "Klimaöl": {"term": "Klimaöl", "id": 3, "association": []},
+}
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    json_path = tmp_path / "glossary.json"
+    json_path.write_text(json.dumps(GLOSSARY, ensure_ascii=False), encoding="utf-8")
+    path = tmp_path / "glossary.snapshot"
+    create_snapshot(str(json_path), str(path))
+    return path
+
+
+def test_entries_round_trip(snapshot_path):
+    glossary = GlossarySnapshot(str(snapshot_path))
+    assert len(glossary) == 3
+    assert list(glossary) == sorted(GLOSSARY)
+    for term, entry in GLOSSARY.items():
+        assert {k: v for k, v in glossary[term].items() if v not in ((), None, "")} == \
+            {k: tuple(v) if isinstance(v, list) else v for k, v in entry.items() if v}
+    assert "Klimaschutz" not in glossary
+
+def test_flags_in_summaries(snapshot_path):
+    summaries = {key: rest for key, *rest in GlossarySnapshot(str(snapshot_path))._summaries()}
+    assert summaries == {"Klimaleugner": [2, False, (1,)], "Klimaöl": [3, False, ()],
+                         "Klimawandel": [1, True, (0, 1)]}
+
+def test_flags():
+    assert snapshot.flags({"definition": "x", "sources": ["y"], "association": [0, 1]}) == \
+        snapshot.FLAG_DEFINITION | snapshot.FLAG_SOURCES | snapshot.FLAG_GROUP_0 | \
+        snapshot.FLAG_GROUP_1
+    assert snapshot.flags({"definition": "", "association": [1]}) == snapshot.FLAG_GROUP_1
+
+def test_other_version_is_rejected(snapshot_path):
+    data = bytearray(snapshot_path.read_bytes())
+    magic, version, *rest = snapshot.HEADER.unpack_from(data)
+    snapshot.HEADER.pack_into(data, 0, magic, version + 1, *rest)
+    snapshot_path.write_bytes(data)
+    with pytest.raises(ValueError):
+        GlossarySnapshot(str(snapshot_path))
@@ -0,0 +1,21 @@
+# Tests of the autocomplete API (/api/suggest, klimadiskurs/app/suggestions.py)
+
+from klimadiskurs.app import routes
+from klimadiskurs.app.suggestions import CACHE_MAX_AGE
+
+
+def test_suggest_is_revalidated(client):
+    response = client.get("/api/suggest?q=klimal")
+    assert response.status_code == 200
+    assert all(term.lower().startswith("klimal") for term in response.get_json())
+    assert f"max-age={CACHE_MAX_AGE}" in response.headers["Cache-Control"]
+    revalidated = client.get("/api/suggest?q=klimal",
+                             headers={"If-None-Match": response.headers["ETag"]})
+    assert revalidated.status_code == 304
+
+def test_etag_changes_with_the_tweeted_terms(client, monkeypatch):
+    etag = client.get("/api/suggest?q=klimal").headers["ETag"]
+    # another list of the same length, e.g. loaded by another worker
+    monkeypatch.setattr(routes, "tweeted", [t + "x" for t in routes.tweeted])
+    monkeypatch.setattr(routes, "tweeted_version", "other")
+    assert client.get("/api/suggest?q=klimal").headers["ETag"] != etag
@@ -6,21 +6,48 @@
 # Edit the file to keep only the submissions you want (e.g. using Excel)
 # Make sure to open it with UTF-8 encoding
 # Then place the TSV in tools/ directory and run this script
+# Run it with --dry-run first to see the changes as a diff without writing anything.
+#
+# The submissions are turned into a patch: one operation per new or changed entry, which is
+# appended to raw_data/glossary_patches.ndjson (the history of all merges) and then applied.
+# glossary.json is written by the tools with indent=2, so every entry starts with a line
+# '  "<term>": ' and nested lines are indented further. The script finds the entries by these
+# lines and only parses and re-serializes the entries the patch touches, all other entries are
+# copied as they are. The new glossary is written to a temporary file that replaces glossary.json
+# (atomic), so the app never sees a half-written file and an interrupted run leaves the old
+# glossary intact.
+# New entries get their IDs from a counter in raw_data/last_id.txt, so IDs of deleted entries are
+# never reused. The changed entries are validated against glossary.schema.json before anything is
+# written.
 
+import argparse
 import csv
+import difflib
 import json
 import os
+import re
+import sys
+from datetime import datetime
+from pipeline import run_pipeline
+
+# same schema validation as the app, schema.py doesn't import the app so it can be loaded on its own
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "klimadiskurs"))
+from schema import InvalidGlossaryError, validate_glossary
 
 fieldnames = ["term", "id", "definition", "sources", "association", 
               "examples", "spellings", "related"]
+# first line of a top-level entry in glossary.json, nested keys are indented further
+ENTRY_PATTERN = re.compile(r'^  "((?:[^"\\]|\\.)*)": ', flags=re.M)
+# IDs in glossary.json, used to initialize the ID counter
+ID_PATTERN = re.compile(r'(?<!\\)"id": (\d+)')
 
-def add_new_entries(tsv_path, json_path, overwrite):
+def add_new_entries(tsv_path, json_path, overwrite, patches_path="raw_data/glossary_patches.ndjson",
+                    id_path="raw_data/last_id.txt", dry_run=False):
     """
     Creates new glossary entries from a curated TSV file and merges them with the existing glossary.
 
-    Overwrites json_path with the new glossary. The old glossary is stored in glossary_OLD.json for 
-    comparison (git diff recommended). The TSV is emptied, but the old file is stored in 
-    submissions_OLD.tsv. 
+    Appends the changes to patches_path and applies them to json_path, see the description above.
+    The TSV is emptied afterwards, only the header is kept.
 
     Args:
         tsv_path (str): Path to submissions.tsv (downloaded from Heroku).
@@ -28,43 +55,173 @@ def add_new_entries(tsv_path, json_path, overwrite):
         overwrite (bool): Whether existing glossary information (i.e. example sentences) should be \
             overwritten by information from the TSV. If False, only missing information is filled \
             in.
+        patches_path (str): Path to the patch log.
+        id_path (str): Path to the ID counter.
+        dry_run (bool): If True, only print the changes as a diff. Defaults to False.
+
+    Returns:
+        bool: False if there was nothing to merge or the merged entries are invalid.
     """
 
-    # read both files
     submissions = __read_tsv(tsv_path)
-    with open(json_path, encoding="utf-8", errors="replace") as f:
-        live_db = json.load(f)
-
-    # construct dict with new entries
-    new_db, adds, mods = __construct_new_dict(submissions, live_db, overwrite)
-    # merge dicts
-    new_db = live_db | new_db
-
-    # rename old files so they won't get deleted
+    glossary = Glossary(json_path)
     try:
-        os.rename(json_path, os.path.splitext(json_path)[0] + "_OLD.json")
-        os.rename(tsv_path, os.path.splitext(tsv_path)[0] + "_OLD.tsv")
-    except FileExistsError as e:
-        fn, ext = os.path.splitext(str(e).split()[-3])
-        culprit = fn + "_OLD" + ext
-        print(f"Error: File {culprit} already exists, please remove it.")
-        exit()
-
-    # write new db to file
-    with open(json_path, mode="w", encoding="utf-8", errors="replace") as f:
-        f.write(json.dumps(new_db, indent=2, ensure_ascii=False))
+        with open(id_path, encoding="utf-8") as f:
+            last_id = int(f.read())
+    except FileNotFoundError:
+        last_id = glossary.max_id()
 
+    patch, last_id = __construct_patch(submissions, glossary, overwrite, last_id)
+    adds = sum(op["op"] == "add" for op in patch)
+    if not patch:
+        print("Nothing to merge")
+        return False
+    # in memory only, the file is written below
+    glossary.apply(patch)
+    # only the changed entries need to be validated
+    errors = validate_glossary(glossary, [op["term"] for op in patch])
+    if errors:
+        print(InvalidGlossaryError(tsv_path, errors))
+        print("Please correct the submissions, nothing was changed.")
+        return False
+    if dry_run:
+        sys.stdout.writelines(glossary.diff())
+        print(f"Would add {adds} new entries and modify {len(patch)-adds} existing entries")
+        return True
+
+    # log first, so every change of the glossary is in the log even if the script is interrupted
+    batch = datetime.now().isoformat(timespec="seconds")
+    with open(patches_path, mode="a", encoding="utf-8") as f:
+        f.write("".join(json.dumps({"batch": batch, **op}, ensure_ascii=False) + "\n" 
+                        for op in patch))
+        f.flush()
+        os.fsync(f.fileno())
+    write_atomic(id_path, str(last_id))
+    glossary.save()
     # empty submissions file, only leave header
-    with open(tsv_path, mode="w", encoding="utf-8", errors="replace") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames, delimiter="\t")
-        writer.writeheader()
+    write_atomic(tsv_path, "\t".join(fieldnames) + "\n")
+
+    print(f"Updated {json_path}, logged the changes in {patches_path}")
+    print(f"Added {adds} new entries, modified {len(patch)-adds} existing entries")
+    return True
+
+
+class Glossary():
+    """glossary.json as text with the positions of the entries, see the description above.
+    Entries are only parsed when they are needed, changed entries are kept as new texts."""
+
+    def __init__(self, json_path):
+        """Constructor. Reads the file and finds the entries.
+
+        Args:
+            json_path (str): Path to glossary.json.
+        """
+
+        self.path = json_path
+        with open(json_path, encoding="utf-8") as f:
+            self.text = f.read()
+        matches = list(ENTRY_PATTERN.finditer(self.text))
+        body = self.text.strip()
+        if not (body.startswith("{") and body.endswith("}")) or (body != "{}" and not matches):
+            # not written by the tools, e.g. edited by hand: re-serialize everything once
+            self.text = json.dumps(json.loads(self.text), indent=2, ensure_ascii=False)
+            matches = list(ENTRY_PATTERN.finditer(self.text))
+        # (start, end) of each entry, entries are separated by ",\n"
+        starts = [m.start() for m in matches]
+        ends = [s - 2 for s in starts[1:]] + [self.text.rstrip().rfind("\n}")]
+        self.spans = list(zip(starts, ends))
+        # keys only need to be decoded if they contain escapes
+        self.index = {json.loads(f'"{m[1]}"') if "\\" in m[1] else m[1]: i
+                      for i, m in enumerate(matches)}
+        self.changed = dict()   # entry index -> new text, indices after the spans are new entries
+
+    def __contains__(self, term):
+        return term in self.index
+
+    def __getitem__(self, term):
+        """Parses the entry of term."""
+
+        return json.loads("{" + self.entry_text(self.index[term]) + "}")[term]
+
+    def entry_text(self, i):
+        """Current text of the i-th entry."""
+
+        if i in self.changed:
+            return self.changed[i]
+        start, end = self.spans[i]
+        return self.text[start:end]
+
+    def max_id(self):
+        """Highest ID in the glossary, 0 if it is empty."""
+
+        return max(map(int, ID_PATTERN.findall(self.text)), default=0)
+
+    def apply(self, patch):
+        """Applies the operations of a patch, see __construct_patch().
+
+        Args:
+            patch (list(dict)): The operations.
+        """
+
+        for op in patch:
+            term = op["term"]
+            if op["op"] == "add" and term not in self:
+                self.index[term] = len(self.index)
+                self.changed[self.index[term]] = entry_text(term, op["entry"])
+            else:
+                entry = self[term]
+                entry.update(op["entry"] if op["op"] == "add" else op["set"])
+                self.changed[self.index[term]] = entry_text(term, entry)
+
+    def diff(self):
+        """Unified diff of all changed entries, as they are in the file and after the changes.
+
+        Returns:
+            iterator(str): Lines of the diff.
+        """
+
+        terms = {i: term for term, i in self.index.items() if i in self.changed}
+        for i in sorted(self.changed):
+            old = ""
+            if i < len(self.spans):
+                start, end = self.spans[i]
+                old = self.text[start:end] + "\n"
+            yield from difflib.unified_diff(old.splitlines(keepends=True),
+                                            (self.changed[i] + "\n").splitlines(keepends=True),
+                                            f"{self.path} ({terms[i]})", f"{self.path} ({terms[i]})")
+
+    def save(self):
+        """Replaces the file atomically. 
+        The text between changed entries is copied in one piece, without looking at the entries."""
+
+        if not self.index:
+            write_atomic(self.path, "{}")
+            return
+        parts = ["{\n"]
+        position = self.spans[0][0] if self.spans else None
+        for i in sorted(self.changed):
+            if i < len(self.spans):
+                start, end = self.spans[i]
+                parts.append(self.text[position:start])
+                parts.append(self.changed[i])
+                position = end
+            else:
+                # new entries after the existing ones
+                if position is not None:
+                    parts.append(self.text[position:self.spans[-1][1]])
+                    position = None
+                if len(parts) > 1:
+                    parts.append(",\n")
+                parts.append(self.changed[i])
+        if position is not None:
+            parts.append(self.text[position:self.spans[-1][1]])
+        parts.append("\n}")
+        write_atomic(self.path, "".join(parts))
 
-    print(f"Updated {json_path}")
-    print(f"Added {adds} new entries, modified {mods} existing entries")
 
 def __read_tsv(tsv_path):
     """Reads the submissions file and converts it to the glossary dictionary fomat.
-    Note: The ID field is filled in in __construct_new_dict().
+    Note: The ID field is filled in in __construct_patch().
 
     Args:
         tsv_path (str): see add_new_entries
@@ -115,55 +272,89 @@ def __split_string(s, delimiter=None):
     except AttributeError:
         return []
 
-def __construct_new_dict(submissions, live_db, overwrite):
+def __construct_patch(submissions, glossary, overwrite, last_id):
     """
-    Constructs a dictionary of new entries from submissions and the current glossary.
+    Constructs the patch for the submissions: the operations that change the glossary.
 
-    Terms that are not yet in the glossary are added with new IDs. Entries that already are in the 
-    glossary are updated with new information from submissions (e.g. definitions).
+    Terms that are not yet in the glossary are added with new IDs:
+    {"op": "add", "term": ..., "entry": {...}}
+    Entries that already are in the glossary are updated with new information from submissions 
+    (e.g. definitions), only the changed fields are stored:
+    {"op": "update", "term": ..., "set": {"definition": ...}}
 
     Args:
         submissions (dict): Submissions dict from __read_tsv().
-        live_db (dict): Glossary JSON that is currently live on the app.
+        glossary (Glossary): Glossary that is currently live on the app.
         overwrite (bool): Whether to overwrite all information with new info from submissions. If \
             False, only missing information is filled in. Normally only concerns example sentences \
             that may have been submitted through the app.
+        last_id (int): Last ID that was assigned.
 
     Returns:
-        dict: Dictionary with new entries.
-        int: Number of new entries.
-        int: Number of modified entries.
+        list(dict): The operations, at most one per term.
+        int: Last ID that was assigned, including the new entries.
     """
 
-    new_db = dict()
-    last_id = len(live_db)
-    adds, mods = 0, 0
+    patch = dict()      # term -> operation
 
-    for term, entry in submissions.items():
-        original_term = term
+    for term, submission in submissions.items():
         term = term.replace("-", "").capitalize()   # adhere to glossary spelling rules
+        values = {k: v for (k, v) in submission.items() if k != "term"}
         # previously unseen terms/items/entries are added as-is
-        if term not in live_db: 
-            new_db[term] = entry
-            new_db[term]["id"] = last_id + 1
+        # several submissions of a new term are merged into one entry
+        if term not in glossary and term not in patch:
             last_id += 1
-            adds += 1
+            entry = {k: values.get(k, []) for k in ("definition", "sources", "related", 
+                                                    "spellings", "examples", "association")}
+            patch[term] = {"op": "add", "term": term, "entry": {"term": term, "id": last_id, **entry}}
+            continue
+
         # update existing entries
+        current = patch[term]["entry"] if term in patch and patch[term]["op"] == "add" \
+                  else glossary[term]
+        if term in patch and patch[term]["op"] == "update":
+            current.update(patch[term]["set"])
+        if overwrite:
+            # update with key, value if value is informative (truthy)
+            changes = {k: v for (k, v) in values.items() if v and v != current.get(k)}
         else:
-            new_db[term] = live_db[term]
-            if overwrite:
-                # update with key, value if value is informative (truthy)
-                new_db[term].update((k, v) for (k, v) in submissions[original_term].items() if v)
-            else:
-                # update with key, value iff value is informative and not yet filled
-                new_db[term].update((k, v) for (k, v) in submissions[original_term].items() if v 
-                                    and not new_db[term][k])
-            mods += 1
-    
-    return new_db, adds, mods
+            # update with key, value iff value is informative and not yet filled
+            changes = {k: v for (k, v) in values.items() if v and not current.get(k)}
+        if not changes:
+            continue
+        if term in patch and patch[term]["op"] == "add":
+            current.update(changes)
+        else:
+            patch.setdefault(term, {"op": "update", "term": term, "set": dict()})["set"].update(changes)
+
+    return list(patch.values()), last_id
+
+def entry_text(term, entry):
+    """An entry as it is written in glossary.json (indent=2), without the separating comma."""
+
+    return json.dumps({term: entry}, indent=2, ensure_ascii=False)[2:-2]
+
+def write_atomic(path, text):
+    """Replaces a file atomically: writes a temporary file and renames it."""
+
+    with open(path + ".tmp", mode="w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge submissions.tsv into glossary.json")
+    parser.add_argument("--dry-run", action="store_true", 
+                        help="only show the changes as a diff, don't write anything")
+    args = parser.parse_args()
 
-tsv_path = "submissions.tsv"
-json_path = "../klimadiskurs/static/data/glossary.json"
-overwrite = False   # recommended
-add_new_entries(tsv_path, json_path, overwrite)
+    tsv_path = "submissions.tsv"
+    json_path = "../klimadiskurs/static/data/glossary.json"
+    overwrite = False   # recommended
+    if add_new_entries(tsv_path, json_path, overwrite, dry_run=args.dry_run) and not args.dry_run:
+        # update the files built from the glossary (search index of search.js, download page, ...),
+        # see pipeline.py. Not the DWDS links and related terms, they are an explicit step
+        # (python pipeline.py enrichment) because they query DWDS and change other entries
+        run_pipeline(["snapshot", "search_index", "downloads"], only=True)
@@ -0,0 +1,90 @@
+# This script prepares the files offered on the download page (/download/json, /download/wordlist)
+# and the search index of search.js (/api/search-index, see create_search_index.py).
+# glossary.json is stored with indentation, so it is minified first. Every file is then also
+# compressed with gzip and, if the Brotli package is installed, brotli, so the app can send the
+# smallest variant the client accepts without compressing anything per request.
+# The results are written to klimadiskurs/static/data/downloads together with manifest.json, which
+# lists the variants with their size and ETag. ETags are content hashes, so they only change when
+# the content changes and mirrors polling the downloads get 304 Not Modified otherwise.
+# add_new_entries.py runs this automatically, Heroku runs it after every deploy (bin/post_compile).
+# The app falls back to the uncompressed source files if the manifest is missing or out of date.
+
+import gzip
+import hashlib
+import json
+import os
+from time import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# name in the URL -> source file, relative to the tools directory
+SOURCES = {"json": "../klimadiskurs/static/data/glossary.json",
+           "wordlist": "raw_data/wordlist.txt",
+           "search": "../klimadiskurs/static/data/search_index.json"}
+MIMETYPES = {"json": "application/json", "wordlist": "text/plain; charset=utf-8",
+             "search": "application/json"}
+# built by other scripts, skipped if they haven't been run
+OPTIONAL = {"search"}
+
+def create_downloads(out_dir="../klimadiskurs/static/data/downloads", sources=SOURCES):
+    """
+    Writes minified and compressed variants of the download files and their manifest.
+
+    Args:
+        out_dir (str): Output directory, created if necessary.
+        sources (dict(str, str)): Download name -> path of the source file.
+    """
+
+    t0 = time()
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = dict()
+    for name, source_path in sources.items():
+        if name in OPTIONAL and not os.path.isfile(source_path):
+            print(f"{name}: {source_path} does not exist, skipped")
+            continue
+        source = os.stat(source_path)
+        with open(source_path, mode="rb") as f:
+            content = f.read()
+        if name == "json":
+            content = json.dumps(json.loads(content), ensure_ascii=False,
+                                 separators=(",", ":")).encode("utf-8")
+
+        # the identity variant keeps the original file name so downloads are named as before
+        fn = os.path.basename(source_path)
+        variants = {"identity": (fn, content),
+                    # mtime=0 so the same content always gives the same bytes and ETag
+                    "gzip": (fn + ".gz", gzip.compress(content, compresslevel=9, mtime=0))}
+        if brotli is not None:
+            variants["br"] = (fn + ".br", brotli.compress(content, quality=11))
+
+        manifest[name] = {"download_name": fn, "mimetype": MIMETYPES[name],
+                          "source_size": source.st_size, "source_mtime_ns": source.st_mtime_ns,
+                          "variants": dict()}
+        for encoding, (variant_fn, data) in variants.items():
+            __write(os.path.join(out_dir, variant_fn), data)
+            manifest[name]["variants"][encoding] = {
+                "file": variant_fn, "size": len(data),
+                "etag": f"{hashlib.sha256(content).hexdigest()[:20]}-{encoding}"}
+        sizes = ", ".join(f"{e} {v['size']/1024:.0f} KB"
+                          for e, v in manifest[name]["variants"].items())
+        print(f"{name}: {sizes} (source {source.st_size/1024:.0f} KB)")
+
+    if brotli is None:
+        print("Brotli is not installed, skipped .br files (pip install Brotli)")
+    __write(os.path.join(out_dir, "manifest.json"),
+            json.dumps(manifest, indent=2).encode("utf-8"))
+    print(f"Wrote downloads to {out_dir} in {time()-t0:.2f} seconds")
+
+def __write(path, data):
+    """Replaces a file atomically, so the app never sends a half-written file."""
+
+    with open(path + ".tmp", mode="wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+
+
+if __name__ == "__main__":
+    create_downloads()
@@ -0,0 +1,174 @@
+# This script stores for every term of glossary.json whether it has an entry in the DWDS
+# dictionary (https://www.dwds.de), so /def/<term> can link to it without asking the DWDS API on
+# every view. The "dwds" field of an entry is the URL of the DWDS entry or "none". The app only
+# asks the DWDS API itself for entries without the field, e.g. submissions added since the last run.
+# The terms are looked up with the same snippet API as the app (get_dwds_link() in
+# klimadiskurs/app/utils.py), WORKERS requests at a time. The answers are kept in
+# raw_data/dwds_cache.json with the date they were fetched, and only terms that are not in the
+# cache or were fetched more than MAX_AGE_DAYS ago are looked up again, so a run after adding a few
+# terms only sends a few requests. A term whose lookup fails keeps its previous value and is tried
+# again on the next run. After MAX_ERRORS failed lookups the remaining terms are skipped, DWDS is
+# probably down then.
+# Like add_new_entries.py, the script only re-serializes the entries whose link changed and copies
+# all other entries of glossary.json as they are, so a run after adding a few terms changes a few
+# lines of the file.
+# DWDS_API_URL (environment or .env) changes the API, e.g. to the stand-in of
+# benchmarks/stubs.py, which makes this script testable offline:
+#   python ../benchmarks/stubs.py    (prints DWDS_API_URL=http://127.0.0.1:<port>)
+#   DWDS_API_URL=http://127.0.0.1:<port> python create_dwds.py --cache-path /tmp/dwds_cache.json
+# pipeline.py runs this script as the "dwds" stage before create_related.py. It is run locally and
+# glossary.json is committed with the links, bin/post_compile doesn't run it on deploys. Entries
+# without a link are looked up live on every view of /def/<term>.
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+from time import time
+
+import requests
+from dotenv import load_dotenv
+from add_new_entries import Glossary
+
+# same schema validation as the app, schema.py doesn't import the app so it can be loaded on its own
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "klimadiskurs"))
+from schema import InvalidGlossaryError, validate_glossary
+
+load_dotenv()
+DWDS_API_URL = os.environ.get("DWDS_API_URL", "https://www.dwds.de")
+# value of "dwds" for terms that are not in the dictionary, DWDS_NONE in klimadiskurs/glossary.py
+NONE = "none"
+# requests sent at the same time
+WORKERS = 8
+# seconds to wait for an answer
+TIMEOUT = 10
+# cached answers older than this are fetched again, DWDS entries rarely change
+MAX_AGE_DAYS = 180
+# failed lookups after which the remaining terms are skipped
+MAX_ERRORS = 20
+# the cache is saved every SAVE_EVERY lookups, so an interrupted run keeps most of its answers
+SAVE_EVERY = 500
+
+def create_dwds(json_path="../klimadiskurs/static/data/glossary.json",
+                cache_path="raw_data/dwds_cache.json", api_url=DWDS_API_URL, workers=WORKERS,
+                max_age=MAX_AGE_DAYS):
+    """
+    Looks up the terms of glossary.json in the DWDS dictionary and stores the results in the
+    entries' "dwds" field, see the description above. glossary.json is only written if an entry
+    changed.
+
+    Args:
+        json_path (str): Path to glossary.json, which is updated.
+        cache_path (str): Path to the cache of DWDS answers, term -> [URL or NONE, date].
+        api_url (str): Base URL of the DWDS API. Defaults to DWDS_API_URL.
+        workers (int): Number of requests sent at the same time. Defaults to WORKERS.
+        max_age (int): Days after which a cached answer is fetched again, 0 fetches all.
+            Defaults to MAX_AGE_DAYS.
+    """
+
+    t0 = time()
+    glossary = Glossary(json_path)
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            cache = json.load(f)
+    except FileNotFoundError:
+        cache = dict()
+
+    oldest = (date.today() - timedelta(days=max_age)).isoformat()
+    todo = [term for term in glossary.index if term not in cache or cache[term][1] <= oldest]
+    print(f"{len(glossary.index) - len(todo)}/{len(glossary.index)} terms are cached, "
+          f"looking up {len(todo)} terms at {api_url}")
+
+    errors = []
+    session = requests.Session()
+    session.mount(api_url, requests.adapters.HTTPAdapter(pool_maxsize=workers))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(__lookup, session, api_url, term, errors): term
+                   for term in todo}
+        for n, future in enumerate(as_completed(futures), start=1):
+            url = future.result()
+            if url is not None:
+                cache[futures[future]] = [url, date.today().isoformat()]
+            if n % SAVE_EVERY == 0 and len(errors) < MAX_ERRORS:
+                __write(cache_path, json.dumps(cache, indent=1, ensure_ascii=False))
+                print(f"\tLooked up {n}/{len(todo)} terms")
+    if len(errors) >= MAX_ERRORS:
+        print(f"Stopped after {len(errors)} failed lookups, the last one: {errors[-1]}")
+    elif errors:
+        print(f"{len(errors)} lookups failed and are tried again on the next run, "
+              f"the last one: {errors[-1]}")
+
+    # one update operation per changed link, see Glossary.apply() in add_new_entries.py
+    patch = []
+    linked = 0
+    for term in glossary.index:
+        dwds = glossary[term].get("dwds")
+        if term in cache and dwds != cache[term][0]:
+            dwds = cache[term][0]
+            patch.append({"op": "update", "term": term, "set": {"dwds": dwds}})
+        linked += dwds not in (None, NONE)
+    glossary.apply(patch)
+    # only the changed entries need to be validated
+    validation_errors = validate_glossary(glossary, [op["term"] for op in patch])
+    if validation_errors:
+        raise InvalidGlossaryError(json_path, validation_errors)
+
+    if todo or not os.path.exists(cache_path):
+        __write(cache_path, json.dumps(cache, indent=1, ensure_ascii=False))
+    if patch:
+        glossary.save()
+    print(f"Updated {len(patch)} entries in {json_path}, {linked}/{len(glossary.index)} terms "
+          f"are in the DWDS dictionary, {sum(t not in cache for t in glossary.index)} unresolved")
+    print(f"Done in {time()-t0:.1f} seconds")
+
+def __lookup(session, api_url, term, errors):
+    """
+    Asks the DWDS snippet API for a term, like get_dwds_link() in klimadiskurs/app/utils.py.
+
+    Args:
+        session (requests.Session): Session shared by all lookups.
+        api_url (str): Base URL of the DWDS API.
+        term (str): The term.
+        errors (list(str)): Messages of the failed lookups, appended to.
+
+    Returns:
+        str: URL of the DWDS entry, NONE if there is none, None if the lookup failed or was
+        skipped.
+    """
+
+    if len(errors) >= MAX_ERRORS:
+        return None
+    try:
+        # sample response:
+        # [{"wortart":"Substantiv","url":"https://www.dwds.de/wb/Klimawandel",
+        # "input":"Klimawandel","lemma":"Klimawandel"}]
+        response = session.get(f"{api_url}/api/wb/snippet/", params={"q": term.capitalize()},
+                               timeout=TIMEOUT)
+        response.raise_for_status()
+        content = response.json()
+        return content[0]["url"] if content else NONE
+    except (requests.RequestException, ValueError, LookupError, TypeError) as e:
+        errors.append(f"{term}: {e}")
+        return None
+
+def __write(path, text):
+    """Replaces a file atomically."""
+
+    with open(path + ".tmp", mode="w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store the DWDS links of all terms in glossary.json")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help=f"requests sent at the same time (default: {WORKERS})")
+    parser.add_argument("--max-age", type=int, default=MAX_AGE_DAYS,
+                        help=f"days after which cached answers are fetched again, 0 fetches all "
+                             f"(default: {MAX_AGE_DAYS})")
+    parser.add_argument("--cache-path", default="raw_data/dwds_cache.json",
+                        help="cache of DWDS answers (default: raw_data/dwds_cache.json)")
+    args = parser.parse_args()
+    create_dwds(cache_path=args.cache_path, workers=args.workers, max_age=args.max_age)
@@ -2,13 +2,21 @@
 # It reads the list of climate compounds "raw_data/wordlist.txt" 
 # and finds example sentences from the master files of the pro and contra groups.
 # These master files must be created once by create_master_text_files.py and moved to /raw_data.
-# The final JSON structure is specified in the JSON schema "glossary.schema.json".
+# The final JSON structure is specified in the JSON schema "glossary.schema.json", the glossary is
+# validated against it before it is written.
 
 import re
 import json
+import sys
 from os import path
 from time import time
 
+# same spellings and schema validation as the app, these modules don't import the app so they
+# can be loaded on their own
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), "..", "klimadiskurs"))
+from normalization import spellings
+from schema import InvalidGlossaryError, validate_glossary
+
 def create_json(json_path,
                 wordlist_path="raw_data/wordlist.txt",
                 groups_texts_paths=["raw_data/texts_contra.txt", "raw_data/texts_pro.txt"],
@@ -45,6 +53,9 @@ def create_json(json_path,
     print("Creating glossary entries...")
     # create the actual glossary
     glossary = __create_glossary_content(terms_list, groups_texts, verbose)
+    errors = validate_glossary(glossary)
+    if errors:
+        raise InvalidGlossaryError(json_path, errors)
 
     # write it to json
     with open(json_path, mode="w+", encoding="utf-8", errors="replace") as f:
@@ -130,7 +141,7 @@ def __create_single_entry(term, idx, groups_texts, verbose=False):
     entry = {"term": term, "id": idx, "definition": "", "sources": [], "related": []}
 
     # compounds are often spelled with hyphens
-    entry["spellings"] = [term, "Klima-" + term[5:].capitalize()]
+    entry["spellings"] = spellings(term)
 
     # "association" is a list of ids (indices) for groups that use that term,
     # i.e. climate sceptics (id 0) or climate activists (id 1)
@@ -194,7 +205,8 @@ def __get_examples(term, all_groups_texts, spellings, max_examples_per_group=2,
     return examples, ass
 
 
-glossary_path = "glossary.json"
-cleaned_wordlist_path = "raw_data/wordlist.txt"
+if __name__ == "__main__":
+    glossary_path = "glossary.json"
+    cleaned_wordlist_path = "raw_data/wordlist.txt"
 
-create_json(glossary_path, cleaned_wordlist_path)
+    create_json(glossary_path, cleaned_wordlist_path)
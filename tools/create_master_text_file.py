@@ -2,6 +2,7 @@
 # This scipt combines all the .txt files in text_files/pro and text_files_contra
 # into one .txt master file, respectively
 # This is necessary for preprocess_wordlists.py and create_json.py
+# The master file is replaced, so the script can be run again after the texts changed
 
 import os
 
@@ -19,26 +20,30 @@ def create_master_text_file(source_path, target_filename):
 
     Args:
         source_path (str): Path to the main directory.
-        target_filename (str): Filename of the resulting master text file.
+        target_filename (str): Filename of the resulting master text file, it is replaced.
     """
 
     c = 1   # counts number of files
-    # recursively walk all subdirectories of source_path
-    for root, _, files in os.walk(source_path):
-        for fn in files:
-            if fn.endswith(".txt"):
-                path_to_file = os.path.join(root, fn)
-                with open(target_filename, mode="a", encoding="utf-8") as target:
+    # written to a temporary file first, so an interrupted run doesn't leave half a master file
+    with open(target_filename + ".tmp", mode="w", encoding="utf-8") as target:
+        # recursively walk all subdirectories of source_path, in the same order on every run
+        for root, dirs, files in os.walk(source_path):
+            dirs.sort()
+            for fn in sorted(files):
+                if fn.endswith(".txt"):
+                    path_to_file = os.path.join(root, fn)
                     target.write(f"*** FILE {c} *** {path_to_file} \n")
                     with open(path_to_file, encoding="utf-8", errors="replace") as source:
                         for line in source:
                             target.write(line)
                     target.write("\n\n")
-                c += 1
+                    c += 1
+    os.replace(target_filename + ".tmp", target_filename)
 
 
-# example call using CCG github repo:
-create_master_text_file("../../climate_change_glossary/text_files/pro", 
-                        "raw_data/texts_pro.txt")
-create_master_text_file("../../climate_change_glossary/text_files/contra", 
-                        "raw_data/texts_contra.txt")
+if __name__ == "__main__":
+    # example call using CCG github repo:
+    create_master_text_file("../../climate_change_glossary/text_files/pro", 
+                            "raw_data/texts_pro.txt")
+    create_master_text_file("../../climate_change_glossary/text_files/contra", 
+                            "raw_data/texts_contra.txt")
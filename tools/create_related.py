@@ -0,0 +1,225 @@
+# This script fills the "related" field of glossary.json with terms that are used in the same
+# contexts, so more definition pages can show "Siehe auch".
+# It reads the same corpus as create_json.py (the master text files of the pro and contra groups)
+# and builds a sparse term-by-sentence matrix X (1 if the term occurs in the sentence).
+# X @ X.T counts the sentences two terms share, divided by the square root of both sentence counts
+# this is the cosine similarity of the terms. Terms with the same compound head (e.g. Klimaleugner
+# and Klimawandelleugner, Klimaskeptiker and Klimaskeptikerin) get a bonus on top.
+# All of this is done with sparse matrix products, so it takes seconds for tens of thousands of
+# terms instead of comparing all pairs of terms in Python.
+# Related terms that were entered by hand are kept and come first. The terms added by this script
+# are stored in raw_data/related_generated.json, so they are replaced (not kept) on the next run.
+# Needs NumPy and SciPy (pip install numpy scipy), the app itself doesn't need them.
+
+import json
+import os
+import re
+import sys
+from time import time
+
+import numpy as np
+from scipy import sparse
+
+from create_json import __tokenize_file as tokenize_file
+# same normalization as the app, normalization.py doesn't import the app so it can be loaded on its own
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "klimadiskurs"))
+from normalization import PREFIX, TermIndex, normalize
+from schema import InvalidGlossaryError, validate_glossary
+
+# number of related terms added per entry
+TOP_K = 5
+# minimum number of shared sentences for two terms to be related
+MIN_COOCCURRENCES = 2
+# similarity added for terms with the same compound head
+HEAD_BONUS = 0.2
+# heads shared by more terms than this get no bonus, e.g. "politik" says little about a term
+MAX_HEAD_GROUP = 50
+# minimum length of a compound head
+MIN_HEAD_LENGTH = 4
+# words that may be glossary terms, with spaces, hyphens and gender markers, e.g. "Klima-Lügner*innen"
+COMPOUND_PATTERN = re.compile(r"\b" + PREFIX + r"[\s\-‐‑]*[\w*:_/\-]+", flags=re.I)
+# inflection endings tried if a word is not a term, e.g. "klimaleugners" -> "klimaleugner"
+ENDINGS = ("s", "n", "e", "en", "es", "ern")
+
+def create_related(json_path="../klimadiskurs/static/data/glossary.json",
+                   groups_texts_paths=["raw_data/texts_contra.txt", "raw_data/texts_pro.txt"],
+                   generated_path="raw_data/related_generated.json", k=TOP_K):
+    """
+    Adds up to k related terms per entry to glossary.json, see the description above.
+
+    Args:
+        json_path (str): Path to glossary.json, which is updated.
+        groups_texts_paths (list(str)): Master text files for each group, as in create_json.py.
+        generated_path (str): Terms added by the last run, to tell them apart from manual ones.
+        k (int): Number of related terms to add per entry. Defaults to TOP_K.
+    """
+
+    t0 = time()
+    with open(json_path, encoding="utf-8") as f:
+        glossary = json.load(f)
+    try:
+        with open(generated_path, encoding="utf-8") as f:
+            generated = json.load(f)
+    except FileNotFoundError:
+        generated = dict()
+    terms = list(glossary)
+
+    sentences = [s for fn in groups_texts_paths for s in tokenize_file(fn)]
+    print(f"Read {len(sentences)} sentences in {time()-t0:.1f} seconds")
+    t1 = time()
+    occurrences = __occurrence_matrix(glossary, terms, sentences)
+    similarities = __similarities(occurrences) + HEAD_BONUS * __head_matrix(terms)
+    similarities.setdiag(0)
+    similarities.eliminate_zeros()
+    neighbors = __top_k(similarities.tocsr(), k)
+    print(f"Computed similarities in {time()-t1:.1f} seconds")
+
+    changed = []
+    new_generated = dict()
+    for i, term in enumerate(terms):
+        manual = [t for t in glossary[term]["related"] if t not in generated.get(term, ())]
+        added = [terms[j] for j in neighbors[i] if terms[j] not in manual]
+        related = manual + added
+        if related != glossary[term]["related"]:
+            glossary[term]["related"] = related
+            changed.append(term)
+        if added:
+            new_generated[term] = added
+    # only the changed entries need to be validated
+    errors = validate_glossary(glossary, changed)
+    if errors:
+        raise InvalidGlossaryError(json_path, errors)
+
+    __write(json_path, json.dumps(glossary, indent=2, ensure_ascii=False))
+    __write(generated_path, json.dumps(new_generated, indent=2, ensure_ascii=False))
+    print(f"Updated related terms of {len(changed)} entries in {json_path}, "
+          f"{len(new_generated)}/{len(terms)} entries have generated related terms")
+    print(f"Done in {time()-t0:.1f} seconds")
+
+def __occurrence_matrix(glossary, terms, sentences):
+    """
+    Builds the binary term-by-sentence matrix.
+
+    Args:
+        glossary (dict): The glossary.
+        terms (list(str)): Terms in row order.
+        sentences (list(str)): Corpus sentences in column order.
+
+    Returns:
+        scipy.sparse.csr_matrix: len(terms) x len(sentences), 1 where a term occurs.
+    """
+
+    keys = TermIndex(glossary).keys
+    term_rows = {term: i for i, term in enumerate(terms)}
+    # compound as written -> row, or None if it isn't a term
+    # the same compounds occur many times, so each is only normalized once
+    compound_rows = dict()
+    rows, columns = [], []
+    for j, sentence in enumerate(sentences):
+        found = set()
+        for compound in COMPOUND_PATTERN.findall(sentence):
+            if compound not in compound_rows:
+                compound_rows[compound] = __find_row(normalize(compound), keys, term_rows)
+            if compound_rows[compound] is not None:
+                found.add(compound_rows[compound])
+        rows.extend(found)
+        columns.extend([j] * len(found))
+    data = np.ones(len(rows), dtype=np.float32)
+    return sparse.csr_matrix((data, (rows, columns)), shape=(len(terms), len(sentences)))
+
+def __find_row(word, keys, term_rows):
+    """Row of the term that a normalized word is a form of, also if it is inflected."""
+
+    term = keys.get(word)
+    if term is None:
+        term = next((keys[word[:-len(e)]] for e in ENDINGS
+                     if word.endswith(e) and word[:-len(e)] in keys), None)
+    return None if term is None else term_rows[term]
+
+def __similarities(occurrences):
+    """
+    Cosine similarities of all pairs of terms that share at least MIN_COOCCURRENCES sentences.
+
+    Args:
+        occurrences (scipy.sparse.csr_matrix): Term-by-sentence matrix.
+
+    Returns:
+        scipy.sparse.csr_matrix: Symmetric terms x terms matrix.
+    """
+
+    cooccurrences = (occurrences @ occurrences.T).tocsr()
+    cooccurrences.data[cooccurrences.data < MIN_COOCCURRENCES] = 0
+    cooccurrences.eliminate_zeros()
+    counts = np.asarray(occurrences.sum(axis=1)).ravel()
+    scale = sparse.diags(1 / np.sqrt(np.maximum(counts, 1)))
+    return (scale @ cooccurrences @ scale).tocsr()
+
+def __head_matrix(terms):
+    """
+    Matrix with 1 for all pairs of terms with the same compound head (in groups of at most
+    MAX_HEAD_GROUP terms).
+    The head of a compound is its longest ending that is also the part after "Klima" of another
+    term, e.g. "leugner" for Klimawandelleugner. Female forms belong to the male head, e.g.
+    Klimaskeptikerin -> "skeptiker". Terms without such an ending are their own head.
+
+    Args:
+        terms (list(str)): Terms in row order.
+
+    Returns:
+        scipy.sparse.csr_matrix: len(terms) x len(terms).
+    """
+
+    stems = [normalize(t)[len(PREFIX):] for t in terms]
+    known = set(stems)
+    groups = dict()     # head -> group index
+    rows, columns = [], []
+    for i, stem in enumerate(stems):
+        head = stem
+        if stem.endswith("in") and stem[:-2] in known:
+            head = stem[:-2]
+        else:
+            head = next((stem[s:] for s in range(1, len(stem) - MIN_HEAD_LENGTH + 1)
+                         if stem[s:] in known), stem)
+        rows.append(i)
+        columns.append(groups.setdefault(head, len(groups)))
+
+    membership = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, columns)),
+                                   shape=(len(terms), len(groups)))
+    # drop groups that are too large to mean anything
+    sizes = np.asarray(membership.sum(axis=0)).ravel()
+    membership = membership @ sparse.diags((sizes <= MAX_HEAD_GROUP).astype(np.float32))
+    return (membership @ membership.T).tocsr()
+
+def __top_k(similarities, k):
+    """
+    Indices of the k most similar terms per row, most similar first.
+
+    Args:
+        similarities (scipy.sparse.csr_matrix): Terms x terms matrix.
+        k (int): Number of neighbors.
+
+    Returns:
+        list(list(int)): Column indices per row.
+    """
+
+    neighbors = []
+    for i in range(similarities.shape[0]):
+        start, end = similarities.indptr[i], similarities.indptr[i + 1]
+        scores, columns = similarities.data[start:end], similarities.indices[start:end]
+        if len(scores) > k:
+            best = np.argpartition(-scores, k)[:k]
+            scores, columns = scores[best], columns[best]
+        # highest score first, ties in glossary order
+        neighbors.append(columns[np.lexsort((columns, -scores))].tolist())
+    return neighbors
+
+def __write(path, text):
+    """Replaces a file atomically."""
+
+    with open(path + ".tmp", mode="w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
+
+
+if __name__ == "__main__":
+    create_related()
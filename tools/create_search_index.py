@@ -0,0 +1,86 @@
+# This script writes the search index that search.js loads once per page to answer searches and
+# alphabet clicks in the browser, without a request to /api (see klimadiskurs/static/js/search.js).
+# search.js only needs to know which terms match and whether they have a definition page, so the
+# index only has the terms, their normalized forms (see normalization.py, the same forms /api
+# searches) and a flag for terms with a definition or sources. Tweeted terms also get a page, but
+# they are only known to the running app, which puts them into the page anyway (tweetedTerms).
+# Terms are sorted, so neighbors share long prefixes ("Klimaleugner", "Klimaleugnung"). Every
+# term and forms string is stored as the length of the prefix it shares with the previous one and
+# the rest (front coding), e.g. ["Klimaleugner", "Klimaleugnung"] -> [0, "Klimaleugner", 10, "ung"].
+# create_downloads.py then compresses the file like the other downloads, and the app sends it at
+# /api/search-index. The index contains the version of the glossary it was built from. search.js
+# only uses it if the app serves the same version, otherwise it falls back to /api.
+# Run it after changing the glossary (add_new_entries.py and bin/post_compile do that).
+
+import json
+import os
+import sys
+from time import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "klimadiskurs"))
+from normalization import TermIndex
+
+# format of the index, must match search.js
+FORMAT = 1
+
+def create_search_index(json_path="../klimadiskurs/static/data/glossary.json",
+                        index_path="../klimadiskurs/static/data/search_index.json"):
+    """
+    Writes the search index of glossary.json, see the description above.
+
+    Args:
+        json_path (str): Path to glossary.json.
+        index_path (str): Output path.
+    """
+
+    t0 = time()
+    with open(json_path, encoding="utf-8") as f:
+        glossary = json.load(f)
+        source = os.fstat(f.fileno())
+    terms = sorted(glossary)
+    forms = TermIndex(glossary).forms
+
+    index = {"format": FORMAT,
+             # same as the app's db.version, see source_version() in klimadiskurs/glossary.py
+             "version": f"{source.st_size:x}-{source.st_mtime_ns:x}",
+             "terms": front_code(terms),
+             "forms": front_code(forms[t] for t in terms),
+             # "1" if the term has a definition page
+             "pages": "".join("1" if glossary[t]["definition"] or glossary[t]["sources"] else "0"
+                              for t in terms)}
+
+    with open(index_path + ".tmp", mode="w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(index_path + ".tmp", index_path)
+    print(f"Wrote search index of {len(terms)} terms to {index_path} "
+          f"({os.path.getsize(index_path)/1024:.0f} KB) in {time()-t0:.2f} seconds")
+
+def front_code(strings):
+    """
+    Front coding of a sequence of strings: each one as the length of the prefix it shares with
+    the previous one (in UTF-16 code units, like JavaScript strings) and the remaining characters.
+
+    Args:
+        strings (iterable(str)): The strings, ideally sorted.
+
+    Returns:
+        list: Flat list [shared length, rest, shared length, rest, ...].
+    """
+
+    coded = []
+    previous = ""
+    for s in strings:
+        shared = 0
+        limit = min(len(s), len(previous))
+        while shared < limit and s[shared] == previous[shared]:
+            shared += 1
+        # search.js slices the previous string in UTF-16 code units, characters outside the BMP
+        # (e.g. emoji) are two of them
+        units = shared if s.isascii() else len(s[:shared].encode("utf-16-le")) // 2
+        coded += [units, s[shared:]]
+        previous = s
+    return coded
+
+
+if __name__ == "__main__":
+    create_search_index()
@@ -0,0 +1,69 @@
+# This script converts glossary.json into a read-only binary snapshot that the app can memory-map.
+# All gunicorn workers map the same file, so the glossary is only stored once in physical memory,
+# and opening it doesn't parse any JSON. Entries are decoded when a worker accesses them.
+# Run it after every change to glossary.json, the app falls back to glossary.json if the snapshot
+# is missing or older than glossary.json. Set GLOSSARY_SNAPSHOT in .env to enable it.
+#
+# The file layout is defined in klimadiskurs/snapshot.py, the app reads snapshots with the same module.
+
+import json
+import os
+import sys
+from time import time
+
+# the app doesn't validate snapshots when it opens them, so they are validated here
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "klimadiskurs"))
+from schema import InvalidGlossaryError, validate_glossary
+# same format as the app, snapshot.py doesn't import the app either
+from snapshot import FIELDS, HEADER, MAGIC, RECORD, VERSION, flags
+
+def create_snapshot(json_path="../klimadiskurs/static/data/glossary.json",
+                    snapshot_path="../klimadiskurs/static/data/glossary.snapshot"):
+    """
+    Writes a binary snapshot of the glossary. An existing snapshot is replaced atomically,
+    so running workers keep reading the old file until they restart.
+    The glossary is validated against glossary.schema.json first, no snapshot is written if an
+    entry is invalid.
+
+    Args:
+        json_path (str): Path to glossary.json.
+        snapshot_path (str): Path to the snapshot.
+    """
+
+    t0 = time()
+    source = os.stat(json_path)
+    with open(json_path, encoding="utf-8", errors="replace") as f:
+        glossary = json.load(f)
+    errors = validate_glossary(glossary)
+    if errors:
+        raise InvalidGlossaryError(json_path, errors)
+
+    keys = sorted(glossary, key=lambda k: k.encode("utf-8"))
+    index, key_blob, entry_blob = [], bytearray(), bytearray()
+    for key in keys:
+        entry = glossary[key]
+        encoded_key = key.encode("utf-8")
+        encoded_entry = json.dumps({k: v for k, v in entry.items() if k in FIELDS},
+                                   ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        index.append(RECORD.pack(len(key_blob), len(encoded_key), len(entry_blob),
+                                 len(encoded_entry), entry["id"], flags(entry)))
+        key_blob += encoded_key
+        entry_blob += encoded_entry
+
+    keys_offset = HEADER.size + RECORD.size * len(keys)
+    header = HEADER.pack(MAGIC, VERSION, len(keys), source.st_size, source.st_mtime_ns,
+                         keys_offset, keys_offset + len(key_blob))
+
+    temp_path = snapshot_path + ".tmp"
+    with open(temp_path, mode="wb") as f:
+        f.write(header)
+        f.writelines(index)
+        f.write(key_blob)
+        f.write(entry_blob)
+    os.replace(temp_path, snapshot_path)
+
+    print(f"Wrote {len(keys)} entries to {snapshot_path} "
+          f"({os.path.getsize(snapshot_path)/2**20:.1f} MB) in {time()-t0:.2f} seconds")
+
+if __name__ == "__main__":
+    create_snapshot()
@@ -0,0 +1,113 @@
+# This script computes corpus statistics for the about page and writes them to
+# klimadiskurs/static/data/stats.json, which the app only reads (see klimadiskurs/app/stats.py).
+# For every term it counts the sentences of the pro and contra master text files (the corpus of
+# create_json.py) that contain it, and compares the groups with the log-odds ratio with an
+# informative Dirichlet prior (Monroe et al. 2008, "Fightin' Words"): the z-score of a term is
+# positive if the pro group uses it more than expected and negative for the contra group.
+# Terms are matched like in create_related.py, all statistics are computed with NumPy on the
+# terms x groups count matrix.
+# Run it after changing the glossary or the corpus, and commit stats.json (the corpus is not
+# available on Heroku). Needs NumPy and SciPy (pip install numpy scipy).
+
+import json
+import os
+from datetime import datetime
+from time import time
+
+import numpy as np
+
+from create_json import __tokenize_file as tokenize_file
+from create_related import __occurrence_matrix as occurrence_matrix
+
+# format version of stats.json, must match klimadiskurs/app/stats.py
+VERSION = 1
+# number of terms per list on the about page
+TOP_N = 10
+# terms in fewer sentences are not listed as distinctive
+MIN_COUNT = 5
+# strength of the prior (the combined counts of both groups) relative to the corpus
+PRIOR_SHARE = 0.1
+# group names in the order of the master text files (association ids)
+GROUPS = ("contra", "pro")
+
+def create_stats(json_path="../klimadiskurs/static/data/glossary.json",
+                 groups_texts_paths=["raw_data/texts_contra.txt", "raw_data/texts_pro.txt"],
+                 stats_path="../klimadiskurs/static/data/stats.json", top_n=TOP_N):
+    """
+    Computes the corpus statistics and writes them to stats_path.
+
+    Args:
+        json_path (str): Path to glossary.json.
+        groups_texts_paths (list(str)): Master text files, contra first, as in create_json.py.
+        stats_path (str): Output path.
+        top_n (int): Number of terms per list. Defaults to TOP_N.
+    """
+
+    t0 = time()
+    with open(json_path, encoding="utf-8") as f:
+        glossary = json.load(f)
+    terms = list(glossary)
+
+    groups_texts = [tokenize_file(fn) for fn in groups_texts_paths]
+    words = [sum(len(s.split()) for s in texts) for texts in groups_texts]
+    occurrences = occurrence_matrix(glossary, terms, [s for texts in groups_texts for s in texts])
+    # terms x groups: number of sentences per group that contain the term
+    bounds = np.cumsum([0] + [len(texts) for texts in groups_texts])
+    counts = np.column_stack([np.asarray(occurrences[:, a:b].sum(axis=1)).ravel()
+                              for a, b in zip(bounds[:-1], bounds[1:])])
+    z = log_odds(counts)
+    total = counts.sum(axis=1)
+
+    # most frequent first, ties alphabetically
+    frequent = [terms[i] for i in np.lexsort((terms, -total))[:top_n] if total[i]]
+    # z-scores of rare terms are unreliable
+    z_listed = np.where(total >= MIN_COUNT, z, 0)
+    order = np.argsort(z_listed)
+    distinctive = {"contra": [terms[i] for i in order[:top_n] if z_listed[i] < 0],
+                   "pro": [terms[i] for i in order[::-1][:top_n] if z_listed[i] > 0]}
+
+    source = os.stat(json_path)
+    stats = {"version": VERSION,
+             "created": datetime.now().isoformat(timespec="seconds"),
+             "glossary": {"size": source.st_size, "mtime_ns": source.st_mtime_ns},
+             "corpus": {group: {"sentences": len(texts), "words": n}
+                        for group, texts, n in zip(GROUPS, groups_texts, words)},
+             "frequent": frequent,
+             "distinctive": distinctive,
+             # term -> [sentences contra, sentences pro, z-score]
+             "terms": {term: [int(c[0]), int(c[1]), round(float(s), 2)]
+                       for term, c, s in zip(terms, counts, z) if c.any()}}
+
+    with open(stats_path + ".tmp", mode="w", encoding="utf-8") as f:
+        json.dump(stats, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(stats_path + ".tmp", stats_path)
+    print(f"Wrote {stats_path} ({len(stats['terms'])}/{len(terms)} terms found in the corpus) "
+          f"in {time()-t0:.1f} seconds")
+
+def log_odds(counts):
+    """
+    Log-odds ratios of the pro vs. the contra group with an informative Dirichlet prior,
+    divided by their standard deviation (z-scores).
+
+    Args:
+        counts (numpy.ndarray): terms x 2 matrix of counts (contra, pro).
+
+    Returns:
+        numpy.ndarray: z-score per term, > 0 if typical of the pro group.
+    """
+
+    counts = counts.astype(np.float64)
+    total = counts.sum()
+    # prior: the combined counts, scaled to PRIOR_SHARE of the corpus (at least 1 per term)
+    prior = np.maximum(counts.sum(axis=1) * PRIOR_SHARE, 1) if total else np.ones(len(counts))
+    prior_total = prior.sum()
+    group_totals = counts.sum(axis=0)
+    smoothed = counts + prior[:, None]
+    log_odds = np.log(smoothed) - np.log(group_totals + prior_total - smoothed)
+    delta = log_odds[:, 1] - log_odds[:, 0]
+    variance = (1 / smoothed).sum(axis=1)
+    return delta / np.sqrt(variance)
+
+
+if __name__ == "__main__":
+    create_stats()
@@ -108,7 +108,8 @@ def __read_file(path_wordlist):
 
 path_wordlist = "raw_data/wordlist.txt"
 
-find_most_frequent_all()
-find_most_frequent_wordlist()
-find_most_tweeted()
-investigate_spelling()
+if __name__ == "__main__":
+    find_most_frequent_all()
+    find_most_frequent_wordlist()
+    find_most_tweeted()
+    investigate_spelling()
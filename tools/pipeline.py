@@ -0,0 +1,367 @@
+# This script runs the other scripts in this directory as the stages of one build:
+#   texts (create_master_text_file.py) -> wordlists (preprocess_wordlists.py, one stage per step)
+#   -> glossary (create_json.py) -> enrichment (create_dwds.py, create_related.py)
+#   -> artifacts (create_stats.py, create_snapshot.py, create_search_index.py, create_downloads.py)
+# Every stage declares the files it reads and writes (STAGES below). A stage depends on the stages
+# before it that write its inputs, and stages that don't depend on each other run in parallel
+# processes. Stages that update the same file (glossary.json) run in the order of STAGES.
+# The content hashes of the inputs of every stage that ran are stored in raw_data/pipeline_state.json.
+# A stage is skipped if its inputs have the same hashes as last time and its outputs exist, so
+# after a small change only the stages that actually see a different file run again. Files are only
+# hashed again if their size or mtime changed, checking an unchanged pipeline takes a fraction of a
+# second.
+# glossary.json is edited after it was built (add_new_entries.py, create_related.py), so the
+# glossary stage only runs if glossary.json doesn't exist, and then nothing before it is needed.
+# A stage whose inputs don't exist (e.g. the Climate Change Glossary texts are not checked out)
+# is skipped with a warning, the stages after it use the files that are already there.
+# Usage (from tools/):
+#   python pipeline.py                      everything the app needs that is out of date
+#   python pipeline.py wordlists            preprocess the word list (queries Twitter and Duden)
+#   python pipeline.py artifacts            only the artifacts and the stages they need
+#   python pipeline.py related --force      run related and the stages it needs, even if up to date
+#   python pipeline.py --dry-run            show what would run
+#   python pipeline.py --only snapshot      only the snapshot, not the stages it needs
+# Stage scripts are only imported when their stage runs, so e.g. NumPy is only needed for
+# create_related.py and create_stats.py.
+
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import sys
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from time import perf_counter
+
+STATE_PATH = "raw_data/pipeline_state.json"
+# files are hashed in chunks of this size
+HASH_CHUNK_SIZE = 1 << 20
+
+DATA = "../klimadiskurs/static/data/"
+GLOSSARY = DATA + "glossary.json"
+CCG_TEXTS = "../../climate_change_glossary/text_files/"
+TEXTS = ["raw_data/texts_contra.txt", "raw_data/texts_pro.txt"]
+WORDLIST = "raw_data/wordlist.txt"
+WORDLIST_STEPS = ["raw_data/wordlist_1corpus.txt", "raw_data/wordlist_2twitter.txt",
+                  "raw_data/wordlist_3duden.txt"]
+RELATED_GENERATED = "raw_data/related_generated.json"
+DWDS_CACHE = "raw_data/dwds_cache.json"
+SEARCH_INDEX = DATA + "search_index.json"
+NORMALIZATION = "../klimadiskurs/normalization.py"
+SNAPSHOT_FORMAT = "../klimadiskurs/snapshot.py"
+
+
+class Stage():
+    """A step of the build: a function of one of the scripts and the files it reads and writes."""
+
+    def __init__(self, name, group, inputs, outputs, module, function, kwargs=None, keep=False):
+        """Constructor.
+
+        Args:
+            name (str): Name of the stage, used on the command line.
+            group (str): Group of stages it belongs to, e.g. "artifacts", also usable as a target.
+            inputs (list(str)): Files and directories the stage reads, including its script.
+                Files the stage also writes (e.g. glossary.json for create_related.py) may be
+                missing.
+            outputs (list(str)): Files the stage writes.
+            module (str): Script with the function, e.g. "create_stats".
+            function (str): Name of the function.
+            kwargs (dict, optional): Arguments of the function. Defaults to None (no arguments).
+            keep (bool, optional): Whether the outputs are edited after they were built, then the
+                stage only runs if they don't exist (or with --force). Defaults to False.
+        """
+
+        self.name = name
+        self.group = group
+        self.inputs = inputs
+        self.outputs = outputs
+        self.module = module
+        self.function = function
+        self.kwargs = kwargs or dict()
+        self.keep = keep
+
+    def outputs_exist(self):
+        return all(os.path.exists(path) for path in self.outputs)
+
+    def missing_inputs(self):
+        """Inputs that don't exist, except those the stage writes itself."""
+
+        return [path for path in self.inputs
+                if path not in self.outputs and not os.path.exists(path)]
+
+
+# in order of the dependencies
+STAGES = [
+    Stage("texts_contra", "texts", [CCG_TEXTS + "contra", "create_master_text_file.py"],
+          ["raw_data/texts_contra.txt"], "create_master_text_file", "create_master_text_file",
+          {"source_path": CCG_TEXTS + "contra", "target_filename": "raw_data/texts_contra.txt"}),
+    Stage("texts_pro", "texts", [CCG_TEXTS + "pro", "create_master_text_file.py"],
+          ["raw_data/texts_pro.txt"], "create_master_text_file", "create_master_text_file",
+          {"source_path": CCG_TEXTS + "pro", "target_filename": "raw_data/texts_pro.txt"}),
+    Stage("corpus", "wordlists", [WORDLIST, *TEXTS, "preprocess_wordlists.py"],
+          WORDLIST_STEPS[:1], "preprocess_wordlists", "search_corpus"),
+    Stage("twitter", "wordlists", [WORDLIST, WORDLIST_STEPS[0], "preprocess_wordlists.py"],
+          WORDLIST_STEPS[1:2], "preprocess_wordlists", "search_twitter"),
+    Stage("duden", "wordlists", [*WORDLIST_STEPS[:2], "preprocess_wordlists.py"],
+          WORDLIST_STEPS[2:], "preprocess_wordlists", "search_duden"),
+    Stage("glossary", "glossary", [WORDLIST_STEPS[2], *TEXTS, "create_json.py"], [GLOSSARY],
+          "create_json", "create_json", {"json_path": GLOSSARY, "wordlist_path": WORDLIST_STEPS[2]},
+          keep=True),
+    # queries DWDS for the terms that are not cached yet
+    Stage("dwds", "enrichment", [GLOSSARY, DWDS_CACHE, "create_dwds.py"], [GLOSSARY, DWDS_CACHE],
+          "create_dwds", "create_dwds"),
+    Stage("related", "enrichment",
+          [GLOSSARY, *TEXTS, RELATED_GENERATED, "create_related.py", NORMALIZATION],
+          [GLOSSARY, RELATED_GENERATED], "create_related", "create_related"),
+    Stage("stats", "artifacts", [GLOSSARY, *TEXTS, "create_stats.py"], [DATA + "stats.json"],
+          "create_stats", "create_stats"),
+    Stage("snapshot", "artifacts", [GLOSSARY, "create_snapshot.py", SNAPSHOT_FORMAT],
+          [DATA + "glossary.snapshot"], "create_snapshot", "create_snapshot"),
+    Stage("search_index", "artifacts", [GLOSSARY, "create_search_index.py", NORMALIZATION],
+          [SEARCH_INDEX], "create_search_index", "create_search_index"),
+    Stage("downloads", "artifacts", [GLOSSARY, WORDLIST, SEARCH_INDEX, "create_downloads.py"],
+          [DATA + "downloads/manifest.json"], "create_downloads", "create_downloads"),
+]
+
+
+def run_pipeline(targets=(), force=False, dry_run=False, jobs=None, only=False,
+                 state_path=STATE_PATH):
+    """
+    Runs the stages of the targets that are out of date, see the description above.
+
+    Args:
+        targets (iterable(str), optional): Names of stages or groups. The stages they need are run
+            as well. Defaults to () (everything the app needs).
+        force (bool, optional): Run the targets even if they are up to date. Defaults to False.
+        dry_run (bool, optional): Only print what would run. Defaults to False.
+        jobs (int, optional): Maximum number of stages run in parallel. Defaults to None (number
+            of CPUs).
+        only (bool, optional): Don't run the stages the targets need. Defaults to False.
+        state_path (str, optional): Where the hashes are stored. Defaults to STATE_PATH.
+
+    Returns:
+        bool: False if a stage failed.
+    """
+
+    t0 = perf_counter()
+    by_name = {stage.name: stage for stage in STAGES}
+    groups = {stage.group for stage in STAGES}
+    unknown = [t for t in targets if t not in by_name and t not in groups]
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(unknown)} "
+                         f"(stages: {', '.join(by_name)}, groups: {', '.join(sorted(groups))})")
+    # by default the stages whose outputs no other stage reads, and everything they need
+    requested = [s for s in STAGES if s.name in targets or s.group in targets
+                 or not targets and not any(set(s.outputs) & set(c.inputs)
+                                            for c in STAGES if c is not s)]
+    stages = requested if only else __select(requested)
+    forced = {s.name for s in requested} if force else set()
+    dependencies = {s.name: {p.name for p in __producers(s) if p in stages} for s in stages}
+
+    state = __read_state(state_path)
+    files = state.setdefault("files", dict())
+    done = dict()       # stage name -> status
+    running = dict()    # future -> (stage, input hashes)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        while len(done) < len(stages):
+            for stage in stages:
+                if stage.name in done or stage in (s for s, _ in running.values()) \
+                   or not dependencies[stage.name] <= done.keys():
+                    continue
+                status, hashes = __check(stage, state, files, forced, dependencies, done)
+                if status != "run":
+                    done[stage.name] = status
+                    print(f"[{stage.name}] {status}")
+                elif dry_run:
+                    done[stage.name] = "would run"
+                    print(f"[{stage.name}] would run")
+                else:
+                    print(f"[{stage.name}] running {stage.module}.{stage.function}()")
+                    future = executor.submit(run_stage, stage.module, stage.function, stage.kwargs)
+                    running[future] = (stage, hashes)
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, hashes = running.pop(future)
+                try:
+                    seconds = future.result()
+                except BaseException:
+                    # SystemExit too, e.g. create_json.py exits if glossary.json exists
+                    traceback.print_exc()
+                    done[stage.name] = "failed"
+                    print(f"[{stage.name}] failed")
+                    continue
+                # files the stage changed itself are stored as they are now, otherwise the
+                # stage would run again next time
+                for path in set(stage.inputs) & set(stage.outputs):
+                    hashes[path] = __digest(path, files)
+                state.setdefault("stages", dict())[stage.name] = hashes
+                __write_state(state_path, state)
+                done[stage.name] = f"done in {seconds:.1f} seconds"
+                print(f"[{stage.name}] done in {seconds:.1f} seconds")
+
+    if not dry_run:
+        # hashes of files that were only checked
+        __write_state(state_path, state)
+    ran = sum(status.startswith("done") for status in done.values())
+    failed = [name for name, status in done.items() if status in ("failed", "blocked")]
+    print(f"Ran {ran}/{len(stages)} stages in {perf_counter()-t0:.1f} seconds"
+          + (f", not built: {', '.join(failed)}" if failed else ""))
+    return not failed
+
+def run_stage(module, function, kwargs):
+    """
+    Runs the function of a stage, in a worker process.
+
+    Args:
+        module (str): Script with the function.
+        function (str): Name of the function.
+        kwargs (dict): Arguments of the function.
+
+    Returns:
+        float: Seconds it took.
+    """
+
+    t0 = perf_counter()
+    getattr(importlib.import_module(module), function)(**kwargs)
+    return perf_counter() - t0
+
+def __select(requested):
+    """
+    The requested stages and all stages they need, in the order of STAGES.
+    The inputs of a kept stage (see Stage) whose outputs exist are not needed.
+
+    Args:
+        requested (list(Stage)): The stages to run.
+
+    Returns:
+        list(Stage): Stages to check.
+    """
+
+    selected = set()
+    todo = list(requested)
+    while todo:
+        stage = todo.pop()
+        if stage.name in selected:
+            continue
+        selected.add(stage.name)
+        if stage.keep and stage.outputs_exist():
+            continue
+        todo += __producers(stage)
+    return [stage for stage in STAGES if stage.name in selected]
+
+def __producers(stage):
+    """The stages before a stage that write its inputs."""
+
+    return [p for p in STAGES[:STAGES.index(stage)] if set(p.outputs) & set(stage.inputs)]
+
+def __check(stage, state, files, forced, dependencies, done):
+    """
+    Decides whether a stage has to run. Its dependencies are done.
+
+    Args:
+        stage (Stage): The stage.
+        state (dict): The stored state.
+        files (dict): The stored hashes of all files, updated with the files that changed.
+        forced (set(str)): Stages that run even if they are up to date.
+        dependencies (dict): Stage name -> names of the stages it depends on.
+        done (dict): Stage name -> status of the stages that are done.
+
+    Returns:
+        str: "run" or why the stage doesn't run.
+        dict: Path -> hash of the inputs if the stage runs.
+    """
+
+    if stage.keep and stage.outputs_exist() and stage.name not in forced:
+        return f"kept, {', '.join(stage.outputs)} exists", None
+    if any(done[d] in ("failed", "blocked") for d in dependencies[stage.name]):
+        return "blocked", None
+    # in a dry run, the outputs of the stages before that would run are not there yet
+    pending = {path for p in STAGES if done.get(p.name) == "would run" for path in p.outputs}
+    missing = [path for path in stage.missing_inputs() if path not in pending]
+    if missing:
+        if stage.outputs_exist():
+            return f"skipped, missing {', '.join(missing)} (using the existing outputs)", None
+        return f"skipped, missing {', '.join(missing)}", None
+    if set(stage.inputs) & pending:
+        return "run", None
+    hashes = {path: __digest(path, files) for path in stage.inputs}
+    if stage.name not in forced and stage.outputs_exist() \
+       and state.get("stages", dict()).get(stage.name) == hashes:
+        return "up to date", None
+    return "run", hashes
+
+def __digest(path, files):
+    """
+    BLAKE2 hash of a file, or of the names and hashes of all files in a directory.
+    The hash of a file is only computed again if its size or mtime changed.
+
+    Args:
+        path (str): Path to the file or directory.
+        files (dict): Path -> [size, mtime, hash] of all files hashed before, updated.
+
+    Returns:
+        str: Hex digest, None if the path doesn't exist.
+    """
+
+    if os.path.isdir(path):
+        digest = hashlib.blake2b()
+        for root, dirs, names in os.walk(path):
+            dirs.sort()
+            for name in sorted(names):
+                file_path = os.path.join(root, name)
+                digest.update(f"{os.path.relpath(file_path, path)}\0"
+                              f"{__digest(file_path, files)}\n".encode("utf-8"))
+        return digest.hexdigest()
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    known = files.get(path)
+    if known and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+        return known[2]
+    digest = hashlib.blake2b()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    files[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+    return files[path][2]
+
+def __read_state(state_path):
+    """The stored hashes, empty if the pipeline never ran."""
+
+    try:
+        with open(state_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return dict()
+
+def __write_state(state_path, state):
+    """Replaces the state file atomically."""
+
+    with open(state_path + ".tmp", mode="w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(state_path + ".tmp", state_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the glossary and the files of the app, "
+                                                 "only the stages whose inputs changed")
+    parser.add_argument("targets", nargs="*",
+                        help="stages or groups to build (default: all), "
+                             f"stages: {', '.join(s.name for s in STAGES)}")
+    parser.add_argument("--force", action="store_true",
+                        help="run the targets even if they are up to date")
+    parser.add_argument("--dry-run", action="store_true", help="only show what would run")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="maximum number of stages run in parallel (default: number of CPUs)")
+    parser.add_argument("--only", action="store_true",
+                        help="only run the targets, not the stages they need")
+    args = parser.parse_args()
+    try:
+        ok = run_pipeline(args.targets, args.force, args.dry_run, args.jobs, args.only)
+    except ValueError as e:
+        parser.error(str(e))
+    sys.exit(0 if ok else 1)
@@ -9,6 +9,7 @@
 #    3.1 Terms that appear in the Duden are discarded
 #    3.2 Compounds whose second part is NOT in the duden are discarded
 # Each step creates a .txt for its result
+# pipeline.py runs the steps as separate stages, so a step is only repeated if its inputs changed
 
 from dotenv import load_dotenv
 from os import environ
@@ -18,6 +19,9 @@ import requests
 import string
 import tweepy
 
+# list of (potential) terms that is preprocessed
+ORIGINAL_LIST = "raw_data/wordlist.txt"
+
 def read_file(path):
     """Reads a list from a plain text file into a Python list
 
@@ -47,15 +51,22 @@ def write_file(path, wordlist):
         for word in wordlist:
             f.write(word + "\n")
 
-def search_corpus():
+def search_corpus(wordlist_path=ORIGINAL_LIST, 
+                  texts_paths=("raw_data/texts_pro.txt", "raw_data/texts_contra.txt"),
+                  output_path="raw_data/wordlist_1corpus.txt"):
     """Step 1. Searches each term in the corpus (texts_pro.txt and texts_contra.txt). 
     Also does some light preprocessing like removing - and * from terms and deduplicating.
     Follows the same heuristic as __get_examples() in create_json.py.
     Terms that do not appear at least 2x in the corpus are discarded.
-    Writes resulting list to raw_data/wordlist_1corpus.txt
+    Writes resulting list to output_path
+
+    Args:
+        wordlist_path (str, optional): The original list. Defaults to ORIGINAL_LIST.
+        texts_paths (tuple(str), optional): Master text files of the groups.
+        output_path (str, optional): Path to the resulting list.
     """
 
-    wordlist = read_file(original_list)
+    wordlist = read_file(wordlist_path)
     print(f"Found {len(wordlist)} words in original list")
 
     # delete all hyphens since we only want non-hyphenated words in the final list
@@ -69,7 +80,7 @@ def search_corpus():
     # read the full texts and tokenize
     # same code as in create_json.py so example sentences can actually be found later
     full_text = ""
-    for path in ("raw_data/texts_pro.txt", "raw_data/texts_contra.txt"):
+    for path in texts_paths:
         with open(path, encoding="utf-8", errors="replace") as f:
             full_text += f.read()
     full_text = full_text.translate(str.maketrans("", "", string.punctuation+"‚„“”‛’‘"))
@@ -95,15 +106,21 @@ def search_corpus():
     print(f"Found {len(words_in_text)} words with >1 occurences in the corpus")
 
     # backup
-    write_file("raw_data/wordlist_1corpus.txt", words_in_text)
+    write_file(output_path, words_in_text)
 
-def search_twitter():
+def search_twitter(wordlist_path=ORIGINAL_LIST, corpus_path="raw_data/wordlist_1corpus.txt",
+                   output_path="raw_data/wordlist_2twitter.txt"):
     """Step 2. Searches Twitter for the terms that were NOT found in the corpus.
     Terms that were tweeted at least 2x are added to the list.
+
+    Args:
+        wordlist_path (str, optional): The original list. Defaults to ORIGINAL_LIST.
+        corpus_path (str, optional): Result of step 1.
+        output_path (str, optional): Path to the resulting list.
     """
 
-    words_in_text = read_file("raw_data/wordlist_1corpus.txt")
-    wordlist = read_file(original_list)
+    words_in_text = read_file(corpus_path)
+    wordlist = read_file(wordlist_path)
     wordlist = [w.replace("-", "") for w in wordlist]
     wordlist = [w.replace("*", "") for w in wordlist]   # * breaks Twitter API calls
 
@@ -129,18 +146,25 @@ def search_twitter():
         if tweets and len(tweets) > 1:
             words_on_twitter.append(word)
 
-    write_file("raw_data/wordlist_2twitter.txt", words_on_twitter)
+    write_file(output_path, words_on_twitter)
     print(f"Found {len(words_on_twitter)} words with >1 tweets")
     print(f"Total list: {len(words_in_text) + len(words_on_twitter)} words")
 
-def search_duden():
+def search_duden(corpus_path="raw_data/wordlist_1corpus.txt", 
+                 twitter_path="raw_data/wordlist_2twitter.txt",
+                 output_path="raw_data/wordlist_3duden.txt"):
     """Step 3. Search the terms in the Duden dictionary.
     Terms that appear in the Duden are discarded (no need to put them in a glossary).
     Compounds whose second parts are NOT in the Duden are discarded (likely typos or too obscure).
+
+    Args:
+        corpus_path (str, optional): Result of step 1.
+        twitter_path (str, optional): Result of step 2.
+        output_path (str, optional): Path to the resulting list.
     """
     
-    wordlist = read_file("raw_data/wordlist_1corpus.txt")
-    wordlist += read_file("raw_data/wordlist_2twitter.txt")
+    wordlist = read_file(corpus_path)
+    wordlist += read_file(twitter_path)
 
     words_in_duden = []
 
@@ -165,12 +189,11 @@ def search_duden():
             words_in_duden.append(word)
 
     words_in_duden = sorted(words_in_duden)
-    write_file("raw_data/wordlist_3duden.txt", words_in_duden)
-    print(f"Final result: {len(words_in_duden)} words, list is in /raw_data")
-
+    write_file(output_path, words_in_duden)
+    print(f"Final result: {len(words_in_duden)} words, list is in {output_path}")
 
-original_list = "raw_data/wordlist.txt"
 
-search_corpus()
-search_twitter()
-search_duden()
+if __name__ == "__main__":
+    search_corpus()
+    search_twitter()
+    search_duden()